@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Control socket against a running monitor daemon
+Starts monitor.py --daemon on a watchlist served by the FirstCry simulator and
+drives it through control.py: forced check, cache warm and flush, config reload,
+stats and stop, checking that each takes effect without restarting the process
+(same pid, same cycle count). Also times finding the process through its
+pidfile against scanning every process on the host with psutil, as stop_bot.py
+used to
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+import monitor
+from control import ControlError, read_pidfile, send
+from fake_firstcry import FirstCrySimulator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PINCODES = ["400001", "110001"]
+
+
+def watchlist(sim, products):
+    return [{"id": f"ctl{i}_{pincode}", "title": product["title"], "url": sim.product_url(product, sim.base_url),
+             "pincode": pincode}
+            for i, product in enumerate(sim.catalog[:products]) for pincode in PINCODES]
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    return None
+
+
+def psutil_scan(pattern):
+    """PID of the first process whose command line mentions pattern, found the old way"""
+    import psutil
+    for proc in psutil.process_iter(["pid", "cmdline"]):
+        if proc.info["cmdline"] and pattern in " ".join(proc.info["cmdline"]):
+            return proc.info["pid"]
+    return None
+
+
+def timed_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a monitor daemon through its control socket")
+    parser.add_argument("--products", type=int, default=20, help="Products, each watched at %d pincodes" % len(PINCODES))
+    parser.add_argument("--repeat", type=int, default=200, help="Timed lookups per method")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    sim = FirstCrySimulator(products=args.products + 1, in_stock_ratio=0.5, seed=5).serve()
+    results = []
+
+    def report(ok, label):
+        results.append(ok)
+        print(f"{'✅' if ok else '❌'} {label}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_dir = os.path.join(tmp, "run")
+        cfg = {"products": watchlist(sim, args.products), "delay_between_requests": 0}
+        monitor.save_yaml(cfg, os.path.join(tmp, "config.yaml"))
+        env = dict(os.environ, FIRSTCRY_BASE_URL=sim.base_url, FIRSTCRY_CACHE=os.path.join(tmp, "cache.db"),
+                   HOTWHEELS_RUN_DIR=run_dir, TELEGRAM_BOT_TOKEN="", TELEGRAM_CHAT_ID="")
+        daemon = subprocess.Popen([sys.executable, os.path.join(HERE, "monitor.py"), "--daemon", "--interval", "3600"],
+                                  cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        ctl = lambda cmd, **kw: send("monitor", cmd, run_dir=run_dir, **kw)
+        try:
+            info = wait_for(lambda: read_pidfile("monitor", run_dir))
+            first = info and wait_for(lambda: ctl("stats")["cycles"] >= 1)
+            report(bool(first) and info["pid"] == daemon.pid, "daemon wrote its pidfile and finished its first cycle")
+            if not first:
+                raise ControlError("daemon did not come up")
+
+            pidfile_us = timed_us(lambda: read_pidfile("monitor", run_dir), args.repeat)
+            ping_us = timed_us(lambda: ctl("ping"), args.repeat)
+            try:
+                scan_us = timed_us(lambda: psutil_scan("--daemon --interval 3600"), max(1, args.repeat // 10))
+            except ImportError:
+                scan_us = None
+
+            # Forced check: restock a watched product, check it now, past the HTTP cache
+            with open(os.path.join(tmp, "state.json"), encoding="utf-8") as f:
+                state = json.load(f)
+            target = next(p for p in sim.catalog[:args.products] if not p["in_stock"])
+            sim.set_stock(target["pid"], True)
+            before = sim.stats["product"]
+            checked = ctl("check", url=sim.product_url(target, sim.base_url))
+            with open(os.path.join(tmp, "state.json"), encoding="utf-8") as f:
+                saved = json.load(f)
+            key = f"{target['pid']}_{PINCODES[0]}"
+            report(len(checked) == len(PINCODES) and all(r["in_stock"] for r in checked)
+                   and sim.stats["product"] - before == len(PINCODES)
+                   and not state[key]["in_stock"] and saved[key]["in_stock"],
+                   f"check fetched the restocked product at its {len(PINCODES)} pincodes and saved the verdict")
+
+            warmed = ctl("warm", pages=2)
+            cached = ctl("stats")["http_cache"]["entries"]
+            report(warmed["pages"] == 2 * len(PINCODES) and cached >= warmed["pages"],
+                   f"warm filled the HTTP cache ({cached} entries)")
+
+            cfg["products"] += watchlist(sim, args.products + 1)[-len(PINCODES):]
+            monitor.save_yaml(cfg, os.path.join(tmp, "config.yaml"))
+            reloaded = ctl("reload")
+            report(reloaded["watched"] == (args.products + 1) * len(PINCODES), "reload picked up a new product")
+
+            flushed = ctl("flush", cache="http")
+            report(flushed["http"] == cached and ctl("stats")["http_cache"]["entries"] == 0,
+                   f"flush emptied the HTTP cache ({flushed['http']} entries)")
+
+            try:
+                ctl("flush", cache="everything")
+                refused = False
+            except ControlError as e:
+                refused = "unknown cache" in str(e)
+            report(refused, "a bad argument comes back as an error and the daemon keeps running")
+
+            stats = ctl("stats")
+            report(stats["pid"] == daemon.pid and stats["cycles"] == 1 and stats["state_records"] == len(saved),
+                   "all of it ran in the same process, between cycles, without a restart")
+
+            ctl("stop")
+            code = daemon.wait(timeout=30)
+            report(code == 0 and read_pidfile("monitor", run_dir) is None and not os.listdir(run_dir),
+                   "stop shut the daemon down cleanly and removed its pidfile and socket")
+        except (ControlError, OSError, subprocess.TimeoutExpired) as e:
+            report(False, f"control failed: {e}")
+        finally:
+            if daemon.poll() is None:
+                daemon.kill()
+            errors = daemon.stderr.read()
+            sim.stop()
+        if not all(results) and errors:
+            print(errors[-2000:])
+
+    if all(results):
+        print(f"\nFinding the daemon: pidfile {pidfile_us:.0f} µs, ping over the socket {ping_us:.0f} µs"
+              + (f", psutil scan {scan_us / 1000:.1f} ms" if scan_us is not None else ""))
+    print(("\n✅ " if all(results) else "\n❌ ") + "control socket drove the daemon without restarting it")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
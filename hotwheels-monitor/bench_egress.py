@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Throughput through an egress pool under per-address throttling
+The FirstCry simulator allows each client address --ip-rate requests per
+second and answers 429 beyond that, like FirstCry's per-IP throttling. The
+same product pages (spread over several pincodes) are fetched from one
+address, then through a pool of fake proxies and local source addresses with
+a budget each, then through the pool while one proxy dies mid-run. Reports
+pages per second, failures, 429s and whether each pincode stayed on one address.
+"""
+
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from egress import EgressPool
+from fake_proxy import FakeProxy
+from fake_firstcry import FirstCrySimulator
+from firstcry_scraper import FirstCryScraper
+
+# Loopback aliases: Linux routes all of 127.0.0.0/8 to lo, so each is a separate client address
+PROXY_SOURCES = ["127.0.0.11", "127.0.0.12"]
+LOCAL_SOURCES = ["127.0.0.21", "127.0.0.22"]
+
+
+def run(sim, scraper, jobs, threads, during=None):
+    """Fetch every (url, pincode); `during(done_so_far)` runs after each completed fetch"""
+    sim.clients.clear()
+    sim.buckets.clear()
+    before = dict(sim.stats)
+    done = failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for html in pool.map(lambda job: scraper.fetch_html(*job), jobs):
+            done += 1
+            failed += html is None
+            if during:
+                during(done)
+    elapsed = time.perf_counter() - started
+    moved = sum(1 for pincode in {p for _, p in jobs}
+                if sum(pincode in seen["pincodes"] for seen in sim.clients.values()) > 1)
+    return {"rate": len(jobs) / elapsed, "failed": failed, "throttled": sim.stats["throttled"] - before["throttled"],
+            "addresses": len(sim.clients), "moved": moved, "seconds": elapsed,
+            "busiest": max(seen["requests"] for seen in sim.clients.values()) / len(jobs)}
+
+
+def build_pool(proxies, interval):
+    return EgressPool.from_config([{"proxy": p.url, "interval": interval} for p in proxies] +
+                                  [{"source_address": a, "interval": interval} for a in LOCAL_SOURCES])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch throughput from one address vs an egress pool")
+    parser.add_argument("--fetches", type=int, default=200)
+    parser.add_argument("--pincodes", type=int, default=40,
+                        help="Sticky assignment balances better across endpoints with more pincodes")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ip-rate", type=float, default=10, help="Requests per second the simulator allows per address")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)  # the unpaced run's 429s are expected
+    sim = FirstCrySimulator(products=50, latency_ms=args.latency_ms, ip_rate=args.ip_rate).serve()
+    pincodes = [str(400001 + i) for i in range(args.pincodes)]
+    jobs = [(sim.product_url(sim.catalog[i % len(sim.catalog)], sim.base_url), pincodes[i % len(pincodes)])
+            for i in range(args.fetches)]
+    interval = 1 / args.ip_rate
+
+    rows = []
+    rows.append(("one address, unpaced", run(sim, FirstCryScraper(base_url=sim.base_url, cache=None), jobs, args.threads)))
+    rows.append(("one address, paced", run(sim, FirstCryScraper(interval, base_url=sim.base_url, cache=None),
+                                            jobs, args.threads)))
+
+    proxies = [FakeProxy(source).serve() for source in PROXY_SOURCES]
+    pool = build_pool(proxies, interval)
+    rows.append((f"pool of {len(pool.endpoints)}", run(sim, FirstCryScraper(base_url=sim.base_url, cache=None, egress=pool),
+                                                      jobs, args.threads)))
+
+    # Same pool shape, fresh health; the first proxy dies a third of the way in
+    proxies = [FakeProxy(source).serve() for source in PROXY_SOURCES]
+    pool = build_pool(proxies, interval)
+    dead = proxies[0]
+
+    def kill(done):
+        if done == len(jobs) // 3 and not dead.down:
+            dead.stop()
+
+    rows.append(("pool, a proxy dies", run(sim, FirstCryScraper(base_url=sim.base_url, cache=None, egress=pool),
+                                           jobs, args.threads, kill)))
+    ejected = [name for name, (_, back_in) in pool.stats().items() if back_in > 0]
+    for proxy in proxies[1:]:
+        proxy.stop()
+    sim.stop()
+
+    print(f"{args.fetches} product pages over {args.pincodes} pincodes, {args.threads} threads, "
+          f"FirstCry allows {args.ip_rate:g} req/s per address\n")
+    print(f"{'':<24}{'pages/s':>9}{'failed':>8}{'429s':>7}{'addresses':>11}{'busiest':>9}{'pincodes moved':>16}")
+    for label, r in rows:
+        print(f"{label:<24}{r['rate']:>9.1f}{r['failed']:>8}{r['throttled']:>7}{r['addresses']:>11}"
+              f"{r['busiest']:>9.0%}{r['moved']:>16}")
+    print(f"\nEjected after the proxy died: {', '.join(ejected) or 'none'}")
+
+    single, spread, failover = rows[1][1], rows[2][1], rows[3][1]
+    ok = (spread["rate"] > 2.5 * single["rate"] and spread["throttled"] == 0 and spread["moved"] == 0
+          and failover["failed"] == 0 and f"proxy:127.0.0.1:{dead.server.server_address[1]}" in ejected)
+    print(("✅ " if ok else "❌ ") + f"Pool: {spread['rate'] / single['rate']:.1f}x one paced address, "
+          f"sticky pincodes, dead proxy ejected with {failover['failed']} failed fetches")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
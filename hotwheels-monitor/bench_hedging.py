@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Per-product latency with and without hedged requests
+The FirstCry simulator answers most product pages quickly but stalls a few
+(--tail-rate of them, by --tail-ms), like FirstCry's occasional slow responses.
+The same product checks (fetch and parse) run with hedging off and on; reports
+the p50/p95/p99 check latency of each, and how many extra requests the hedges cost.
+Requests are not spaced out: at the default delay_between_requests no hedge can go out
+"""
+
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from hedging import Hedger
+from parsers import check_stock
+from fake_firstcry import FirstCrySimulator
+from firstcry_scraper import FirstCryScraper
+
+WARMUP = 50
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def check(scraper, url):
+    started = time.perf_counter()
+    html = scraper.fetch_html(url, "400001")
+    in_stock = check_stock(html) if html else None
+    return time.perf_counter() - started, in_stock
+
+
+def run(sim, budget, urls, threads):
+    scraper = FirstCryScraper(base_url=sim.base_url, hedger=Hedger(budget))
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda url: check(scraper, url), urls[:WARMUP]))  # percentiles to hedge by
+        host = sim.base_url.split("//")[1].split(":")[0]
+        hedges_before = {r: metrics.FETCH_HEDGES.get(host=host, result=r) for r in ("won", "lost", "no budget")}
+        before = sim.stats["product"]
+        checks = list(pool.map(lambda url: check(scraper, url), urls))
+    made = sim.stats["product"] - before
+    latencies = [seconds for seconds, _ in checks]
+    return {
+        "p50": percentile(latencies, 50) * 1000, "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000, "max": max(latencies) * 1000,
+        "failed": sum(in_stock is None for _, in_stock in checks),
+        "extra": made / len(urls) - 1,
+        "hedges": {r: metrics.FETCH_HEDGES.get(host=host, result=r) - n for r, n in hedges_before.items()},
+        "timeout": scraper.hedger.tracker.timeout(host),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p99 product check latency with and without hedged requests")
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent checks, like monitor.py --fetchers")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--tail-rate", type=float, default=0.02, help="Fraction of responses that stall")
+    parser.add_argument("--tail-ms", type=float, default=1000)
+    parser.add_argument("--budget", type=float, default=0.05, help="Hedges per request")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    sim = FirstCrySimulator(products=200, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            tail_rate=args.tail_rate, tail_ms=args.tail_ms).serve()
+    urls = [sim.product_url(sim.catalog[i % len(sim.catalog)], sim.base_url) for i in range(args.checks)]
+    try:
+        off = run(sim, 0, urls, args.threads)
+        on = run(sim, args.budget, urls, args.threads)
+    finally:
+        sim.stop()
+
+    print(f"{args.checks} product checks, {args.threads} at a time; {args.tail_rate:.0%} of responses "
+          f"stall {args.tail_ms:.0f} ms\n")
+    print(f"{'':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'failed':>8}{'extra requests':>16}")
+    for label, r in (("no hedging", off), (f"hedging ({args.budget:.0%})", on)):
+        print(f"{label:<16}{r['p50']:>9.0f}{r['p95']:>9.0f}{r['p99']:>9.0f}{r['max']:>9.0f}{r['failed']:>8}"
+              f"{r['extra']:>16.1%}")
+    hedges = on["hedges"]
+    print(f"\nHedges: {hedges['won']} answered first, {hedges['lost']} lost to the original, "
+          f"{hedges['no budget']} slow requests over budget; adaptive timeout {on['timeout']:.1f} s (was 15 s)")
+
+    ok = on["p99"] <= off["p99"] / 2 and on["extra"] <= args.budget + 0.01 and not on["failed"]
+    print(("\n✅ " if ok else "\n❌ ") + f"hedging cut p99 check latency {off['p99'] / on['p99']:.1f}x "
+          f"for {on['extra']:.1%} more requests")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Shared on-disk HTTP cache across processes
+Several processes (think monitor, bot and a manual scraper run) fetch the same
+listing and product pages from the FirstCry simulator, first without a cache
+and then sharing one ResponseCache file, and the report shows upstream
+fetches, wall time, failed fetches and the cache file's size against its limit
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+from fake_firstcry import FirstCrySimulator
+from firstcry_scraper import FirstCryScraper
+from httpcache import ResponseCache
+
+
+def worker(sim_url, urls, pincodes, cache_path, max_bytes, seed):
+    """Fetch every (url, pincode) in a shuffled order; returns (fetches, failures, body bytes)"""
+    cache = ResponseCache(cache_path, max_bytes) if cache_path else None
+    scraper = FirstCryScraper(base_url=sim_url, cache=cache)
+    pairs = [(url, pincode) for url in urls for pincode in pincodes]
+    random.Random(seed).shuffle(pairs)
+    failures = body_bytes = 0
+    for url, pincode in pairs:
+        html = scraper.fetch_html(url, pincode)
+        if html is None:
+            failures += 1
+        else:
+            body_bytes += len(html.encode("utf-8"))
+    return len(pairs), failures, body_bytes
+
+
+def run(args, sim, urls, pincodes, cache_path):
+    before = dict(sim.stats)
+    started = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(worker, [(sim.base_url, urls, pincodes, cache_path, args.max_mb * 2**20, seed)
+                                        for seed in range(args.processes)])
+    elapsed = time.perf_counter() - started
+    upstream = (sim.stats["product"] - before["product"]) + (sim.stats["listing"] - before["listing"])
+    return {
+        "fetches": sum(r[0] for r in results),
+        "failures": sum(r[1] for r in results),
+        "body_bytes": sum(r[2] for r in results),
+        "upstream": upstream,
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare processes fetching alone vs through a shared HTTP cache")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--pincodes", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=30, help="Simulated FirstCry latency")
+    parser.add_argument("--max-mb", type=float, default=64, help="Cache size limit; set it small to exercise eviction")
+    args = parser.parse_args()
+
+    sim = FirstCrySimulator(products=args.products, latency_ms=args.latency_ms).serve()
+    scraper = FirstCryScraper(base_url=sim.base_url, cache=None)
+    urls = [scraper.listing_url(1)] + [sim.product_url(p, sim.base_url) for p in sim.catalog]
+    pincodes = [str(400001 + i) for i in range(args.pincodes)]
+    distinct = len(urls) * len(pincodes)
+    os.environ.pop("FIRSTCRY_CACHE", None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "http_cache.sqlite")
+        rows = [("no cache", run(args, sim, urls, pincodes, None)),
+                ("shared cache", run(args, sim, urls, pincodes, cache_path))]
+        stats = ResponseCache(cache_path, args.max_mb * 2**20).stats()
+    sim.stop()
+
+    print(f"{args.processes} processes × {distinct} distinct pages ({len(urls)} URLs × {len(pincodes)} pincodes)")
+    print(f"{'':<14}{'fetches':>9}{'upstream':>10}{'failed':>8}{'seconds':>9}")
+    for label, r in rows:
+        print(f"{label:<14}{r['fetches']:>9}{r['upstream']:>10}{r['failures']:>8}{r['elapsed']:>9.1f}")
+    shared = rows[1][1]
+    raw_per_page = shared["body_bytes"] / max(1, shared["fetches"])
+    print(f"Cache: {stats['entries']} entries, {stats['bytes'] / 1024:.0f} KiB stored "
+          f"({raw_per_page * stats['entries'] / max(1, stats['bytes']):.1f}x compression), limit {args.max_mb:g} MiB")
+
+    # Processes that miss the same page at the same moment both fetch it; the cache doesn't lock across fetches
+    ok = (shared["failures"] == 0 and stats["bytes"] <= args.max_mb * 2**20
+          and shared["upstream"] < rows[0][1]["upstream"])
+    print(("✅ " if ok else "❌ ") + f"{shared['upstream']} upstream fetches for {distinct} distinct pages "
+          f"({max(0, shared['upstream'] - distinct)} beyond one each, from simultaneous misses or eviction)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
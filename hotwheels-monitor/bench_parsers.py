@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Parser micro-benchmarks over the fixture corpus in fixtures/
+Measures time, allocations and peak memory of each parser, checks every
+result against fixtures/expected.json and fails on regressions against
+bench_baseline.json. Every case runs once per parser backend (htmlparse.py)
+so their per-page parse times can be compared side by side.
+
+Times are compared as multiples of a reference parse (the stdlib HTMLParser over
+one fixture) timed in the same run, best of --repeat calls each, so the baseline
+holds on machines faster or slower than the one that recorded it. Timing is still
+too noisy on shared machines to gate on, so slowdowns are only reported unless
+--strict-time is given; wrong results and memory growth always fail
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+import tracemalloc
+from html.parser import HTMLParser
+
+import parsers
+import htmlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, "fixtures")
+EXPECTED_FILE = os.path.join(FIXTURES_DIR, "expected.json")
+BASELINE_FILE = os.path.join(HERE, "bench_baseline.json")
+REFERENCE_FIXTURE = "listing_grid.html"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def build_cases(backend):
+    """(case name, fixture, expected key, callable) for every parser/fixture pair, parsing with backend"""
+    dom = htmlparse.set_backend(backend)
+    cases = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if not name.endswith(".html"):
+            continue
+        html = load_fixture(name)
+        if name.startswith("product_"):
+            # monitor.check_stock and FirstCryScraper.get_product_details
+            cases.append((f"{backend}/check_stock:{name}", name, "check_stock",
+                          lambda html=html: parsers.check_stock(html)))
+            cases.append((f"{backend}/parse_product_page:{name}", name, "parse_product_page",
+                          lambda html=html: parsers.parse_product_page(html)))
+        elif name.startswith("listing_"):
+            # FirstCryScraper.search_hotwheels extraction
+            cases.append((f"{backend}/parse_listing:{name}", name, "parse_listing",
+                          lambda html=html: parsers.parse_listing(html)))
+            containers = parsers.find_containers(dom, dom.parse(html))
+            if containers:
+                # FirstCryScraper._extract_product_info over every container on the page
+                cases.append((f"{backend}/extract_product_info:{name}", name, "extract_product_info",
+                              lambda containers=containers: [parsers.extract_product_info(c) for c in containers]))
+    return cases
+
+
+def best_time(fn, repeat):
+    """Fastest of `repeat` calls, in seconds: the least disturbed by other load on the machine"""
+    best = float("inf")
+    gc.disable()  # a collection landing in one call is noise, not parser cost
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def reference_parse():
+    """The yardstick: the stdlib HTMLParser over one fixture"""
+    html = load_fixture(REFERENCE_FIXTURE)
+    return lambda: HTMLParser().feed(html)
+
+
+def measure(fn, repeat, reference):
+    """Best wall time (also as a multiple of the reference parse), allocated blocks and peak traced memory of one call"""
+    result = fn()  # warm up
+    # Time the reference in slices between the case's, so both see the same machine speed
+    best, unit = float("inf"), float("inf")
+    for _ in range(5):
+        unit = min(unit, best_time(reference, max(1, repeat // 5)))
+        best = min(best, best_time(fn, max(1, repeat // 5)))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+
+    return result, {
+        "best_us": best * 1e6,
+        "relative": best / unit,
+        "allocations": allocations,
+        "peak_kib": (peak - baseline) / 1024,
+    }
+
+
+def check_result(expected, fixture, key, result):
+    if key == "extract_product_info":
+        # Per-container extraction must add up to the listing result
+        key = "parse_listing"
+        result = [p for p in result if p]
+    want = expected.get(fixture, {}).get(key)
+    if want is None:
+        return "no expectation"
+    if result != want:
+        return "MISMATCH"
+    return None
+
+
+def compare(baseline, case, stats, time_tolerance, memory_tolerance):
+    """(problems, slowdowns) against the baseline; slowdowns only fail with --strict-time"""
+    base = baseline.get(case)
+    if not base:
+        return [], []
+    problems, slowdowns = [], []
+    if "relative" in base and stats["relative"] > base["relative"] * (1 + time_tolerance):
+        slowdowns.append(f"time {stats['relative']:.3f}x > {base['relative']:.3f}x reference")
+    if stats["peak_kib"] > base["peak_kib"] * (1 + memory_tolerance):
+        problems.append(f"peak {stats['peak_kib']:.0f}KiB > {base['peak_kib']:.0f}KiB")
+    return problems, slowdowns
+
+
+def record_fixture(url, name, pincode):
+    """Save a live FirstCry page into the corpus"""
+    from firstcry_scraper import FirstCryScraper
+    html = FirstCryScraper().fetch_html(url, pincode)
+    if not html:
+        sys.exit(f"❌ Could not fetch {url}")
+    with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+        f.write(html)
+    print(f"✅ Recorded {url} [{pincode}] → fixtures/{name}; add its results to fixtures/expected.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case")
+    parser.add_argument("--filter", default="", help="Only run cases containing this text")
+    parser.add_argument("--time-tolerance", type=float, default=0.30, help="Allowed slowdown vs baseline, relative to the reference parse (0.30 = 30%%)")
+    parser.add_argument("--strict-time", action="store_true", help="Fail on slowdowns too (use on a quiet, dedicated machine)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="Allowed peak memory growth vs baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run's numbers to bench_baseline.json")
+    parser.add_argument("--record", nargs=2, metavar=("URL", "NAME"), help="Record a live page into fixtures/")
+    parser.add_argument("--pincode", default="400001", help="Pincode cookie used with --record")
+    parser.add_argument("--backend", action="append", choices=htmlparse.BACKENDS,
+                        help="Parser backend to run (repeatable; default: every one installed)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.record:
+        record_fixture(args.record[0], args.record[1], args.pincode)
+        return
+
+    with open(EXPECTED_FILE, encoding="utf-8") as f:
+        expected = json.load(f)
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    backends = args.backend or htmlparse.available()
+    reference = reference_parse()
+    reference_us = best_time(reference, args.repeat) * 1e6
+    failures = slow = 0
+    numbers = {}
+    page_us = {}
+    print(f"{'case':<60}{'best us':>11}{'x ref':>8}{'allocs':>9}{'peak KiB':>10}  status")
+    for backend in backends:
+        for case, fixture, key, fn in build_cases(backend):
+            if args.filter not in case:
+                continue
+            result, stats = measure(fn, args.repeat, reference)
+            numbers[case] = stats
+            if key != "extract_product_info":  # the others parse a whole page per call
+                page_us.setdefault(backend, []).append(stats["best_us"])
+            problems, slowdowns = [], []
+            error = check_result(expected, fixture, key, result)
+            if error:
+                problems.append(error)
+            if not args.update_baseline:
+                regressions, slowdowns = compare(baseline, case, stats, args.time_tolerance, args.memory_tolerance)
+                problems += regressions
+                if args.strict_time:
+                    problems, slowdowns = problems + slowdowns, []
+            failures += bool(problems)
+            slow += bool(slowdowns)
+            if problems:
+                status = "❌ " + "; ".join(problems + slowdowns)
+            else:
+                status = "⚠️ " + "; ".join(slowdowns) if slowdowns else "✅"
+            print(f"{case:<60}{stats['best_us']:>11.0f}{stats['relative']:>8.3f}{stats['allocations']:>9}"
+                  f"{stats['peak_kib']:>10.0f}  {status}")
+
+    if page_us:
+        print(f"\n{'backend':<10}{'mean us/page':>14}{'vs bs4':>9}")
+        bs4_mean = statistics.mean(page_us["bs4"]) if "bs4" in page_us else None
+        for backend, times in page_us.items():
+            mean = statistics.mean(times)
+            speedup = f"{bs4_mean / mean:.1f}x" if bs4_mean else "-"
+            print(f"{backend:<10}{mean:>14.0f}{speedup:>9}")
+
+    print(f"\nReference parse ({REFERENCE_FIXTURE}, stdlib HTMLParser): {reference_us:.0f} us")
+
+    if args.update_baseline:
+        baseline.update(numbers)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {os.path.basename(BASELINE_FILE)}")
+
+    if slow:
+        print(f"\n⚠️ {slow} case(s) slower than the baseline (advisory; rerun, or pass --strict-time to fail on it)")
+    if failures:
+        print(f"\n❌ {failures} case(s) failed")
+        sys.exit(1)
+    print("\n✅ All cases passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Photo alerts through the file_id cache
+Fans restock alerts with product photos out to many chats via the monitor's
+send_telegram_batch, against the FirstCry simulator's images and the fake
+Bot API, and counts image downloads, uploads and sends by cached file_id
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import monitor
+from fake_firstcry import FirstCrySimulator
+from fake_telegram import FakeTelegram
+from firstcry_scraper import FirstCryScraper
+
+TOKEN = "123456:PHOTOBENCH"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count photo downloads and uploads for alert fan-out")
+    parser.add_argument("--products", type=int, default=5, help="Restocked products, one photo each")
+    parser.add_argument("--chats", type=int, default=50, help="Subscribers per product")
+    parser.add_argument("--rounds", type=int, default=2, help="Alert rounds (later rounds hit the cache file)")
+    args = parser.parse_args()
+
+    sim = FirstCrySimulator(products=max(20, args.products)).serve()
+    fake = FakeTelegram().start()
+    monitor.TELEGRAM_API_URL = fake.base_url[:-len("/bot")]
+    listing = FirstCryScraper(base_url=sim.base_url, cache=None).fetch_listing("400001")[:args.products]
+    chats = [str(700000 + i) for i in range(args.chats)]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # photo_cache.json lands here
+        try:
+            print(f"{args.products} products × {args.chats} chats per round")
+            print(f"{'round':<7}{'downloads':>10}{'uploads':>9}{'by file_id':>12}{'failed':>8}{'ms/send':>9}")
+            for round_no in range(1, args.rounds + 1):
+                before = (sim.stats["image"], fake.photo_uploads, fake.photo_reuses)
+                started, failed = time.perf_counter(), 0
+                for product in listing:
+                    message = f"✅ {product['title']} is AVAILABLE!\nPincode: 400001\n{product['url']}"
+                    failed += len(monitor.send_telegram_batch(TOKEN, chats, message, product["image_url"]))
+                elapsed = time.perf_counter() - started
+                downloads, uploads, reuses = (sim.stats["image"] - before[0], fake.photo_uploads - before[1],
+                                              fake.photo_reuses - before[2])
+                print(f"{round_no:<7}{downloads:>10}{uploads:>9}{reuses:>12}{failed:>8}"
+                      f"{elapsed * 1e3 / (len(listing) * len(chats)):>9.2f}")
+        finally:
+            os.chdir(cwd)
+    fake.stop()
+    sim.stop()
+
+    sends = args.products * args.chats * args.rounds
+    ok = (failed == 0 and fake.photo_uploads == args.products and sim.stats["image"] == args.products
+          and fake.photo_reuses == sends - args.products)
+    print(("✅ " if ok else "❌ ") + f"{sim.stats['image']} downloads and {fake.photo_uploads} uploads "
+          f"for {sends} photo alerts")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
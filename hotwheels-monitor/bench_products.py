@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Memory and speed of the bot's cached listings
+Compares per-product dicts (what search_hotwheels returns) with ProductTable
+for the same catalog cached under several pincodes, and times an
+"in stock, under ₹X, cheapest first" query on both
+"""
+
+import gc
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+
+from products import ProductTable, parse_price
+
+
+def scraped_listing(n, seed):
+    """Listing dicts as the parser builds them: fresh string objects on every scrape"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        pid = 20000000 + i
+        title = f"Hot Wheels Sim Car {i:05d} Die Cast Free Wheel"
+        products.append({
+            "id": "%d" % pid,
+            "title": "%s" % title,
+            "url": f"https://www.firstcry.com/hot-wheels/hot-wheels-sim-car-{i:05d}/{pid}/product-detail",
+            "price": f"₹{199 + (i * 37) % 2800:,}",
+            "in_stock": rng.random() < 0.5,
+            "image_url": f"https://cdn.fcglcdn.com/brainbees/images/products/219x265/{pid}a.webp",
+        })
+    return products
+
+
+def traced(build):
+    """(result, bytes allocated by build() that are still alive)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def query_dicts(products, max_paise):
+    # Without typed prices, every query re-parses the display strings
+    matching = [p for p in products if p["in_stock"] and 0 <= parse_price(p["price"]) <= max_paise]
+    return sorted(matching, key=lambda p: parse_price(p["price"]))
+
+
+def query_table(table, max_paise):
+    return table.select(in_stock=True, max_price=max_paise, sort="price")
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict vs ProductTable listing cache")
+    parser.add_argument("--products", type=int, default=10000, help="Products per listing")
+    parser.add_argument("--pincodes", type=int, default=5, help="Pincodes the same catalog is cached for")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # Each side owns its strings: the scraped dicts are dropped once a table is built
+    listings, dict_bytes = traced(lambda: [scraped_listing(args.products, seed) for seed in range(args.pincodes)])
+    tables, table_bytes = traced(lambda: [ProductTable.from_dicts(scraped_listing(args.products, seed))
+                                          for seed in range(args.pincodes)])
+
+    max_paise = 100000
+    assert [p["id"] for p in query_dicts(listings[0], max_paise)] == [tables[0].ids[r] for r in query_table(tables[0], max_paise)]
+    dict_ms = timed(lambda: query_dicts(listings[0], max_paise), args.repeat)
+    table_ms = timed(lambda: query_table(tables[0], max_paise), args.repeat)
+
+    total = args.products * args.pincodes
+    print(f"{args.products} products × {args.pincodes} pincodes")
+    print(f"{'':<14}{'MiB':>8}{'bytes/product':>15}{'query ms':>10}")
+    print(f"{'dicts':<14}{dict_bytes / 2**20:>8.1f}{dict_bytes / total:>15.0f}{dict_ms:>10.2f}")
+    print(f"{'ProductTable':<14}{table_bytes / 2**20:>8.1f}{table_bytes / total:>15.0f}{table_ms:>10.2f}")
+    print(f"Memory {dict_bytes / table_bytes:.1f}x smaller, query {dict_ms / table_ms:.1f}x faster "
+          f"(in stock, under ₹{max_paise // 100}, cheapest first)")
+
+
+if __name__ == "__main__":
+    main()
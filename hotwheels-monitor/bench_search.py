@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Latency of the bot's title search
+Indexes a synthetic 10k-title HotWheels catalog and times exact, multi-word,
+prefix, typo and catch-all queries; fails if the slowest query is over budget
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+
+from products import ProductTable
+from search import TitleIndex
+
+SERIES = ["Mario Kart", "Fast & Furious", "Car Culture", "Team Transport", "Boulevard", "Premium", "Mainline",
+          "Treasure Hunt", "Pop Culture", "Retro Entertainment", "HW Exotics", "HW Dream Garage", "Track Builder"]
+CARS = ["Yoshi", "B-Dasher", "Pipe Frame", "Standard Kart", "Bone Shaker", "Twin Mill", "Deora II", "Nissan Skyline GT-R",
+        "Toyota Supra", "Porsche 911 GT3", "Lamborghini Countach", "Volkswagen Beetle", "Ford Mustang Mach 1",
+        "Honda Civic Type R", "Mazda RX-7", "Datsun 510", "Chevrolet Camaro", "Dodge Charger", "Batmobile",
+        "Koenigsegg Jesko", "McLaren Senna", "Rodger Dodger", "Sharkruiser", "Rocket Fire", "Tesla Cybertruck"]
+COLOURS = ["Red", "Blue", "Black", "White", "Silver", "Green", "Yellow", "Orange", "Purple", "Gold"]
+
+# (label, query, title words the top result must contain)
+QUERIES = [
+    ("exact", "yoshi", ["yoshi"]),
+    ("multi-word", "mario kart yoshi", ["mario", "kart", "yoshi"]),
+    ("prefix", "koenig", ["koenigsegg"]),
+    ("typo", "lamborgini countach", ["lamborghini", "countach"]),
+    ("swapped letters", "porsche 911 gt3 silevr", ["porsche", "silver"]),
+    ("number", "#4217", ["4217"]),
+    ("catch-all", "hot wheels", ["hot", "wheels"]),
+    ("no match", "zzzz qqqq", None),
+]
+
+
+def catalog(n, seed=7):
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        title = (f"Hot Wheels {rng.choice(SERIES)} {rng.choice(CARS)} {rng.choice(COLOURS)} "
+                 f"Die Cast Car #{i:04d}")
+        products.append({"id": str(30000000 + i), "title": title, "url": f"https://www.firstcry.com/hot-wheels/{30000000 + i}/product-detail",
+                         "price": f"₹{199 + (i * 37) % 2800}", "in_stock": rng.random() < 0.5})
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time title searches over a cached catalog")
+    parser.add_argument("--titles", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="Fail if any query's p99 is slower")
+    args = parser.parse_args()
+
+    table = ProductTable.from_dicts(catalog(args.titles))
+    index = TitleIndex()
+    started = time.perf_counter()
+    index.add_listing("400001", table)
+    build_ms = (time.perf_counter() - started) * 1e3
+    # Re-caching a listing only maps rows: its titles are already tokenised
+    started = time.perf_counter()
+    index.add_listing("400001", table)
+    reindex_ms = (time.perf_counter() - started) * 1e3
+    # Another pincode with a partly different catalog, so searches have to stay within 400001's titles
+    index.add_listing("110001", ProductTable.from_dicts(catalog(args.titles, seed=8)[::2]))
+    print(f"{args.titles} titles, {len(index.postings)} words: index {build_ms:.0f} ms, "
+          f"re-index after a refresh {reindex_ms:.0f} ms, {len(index)} titles across 2 pincodes\n")
+
+    print(f"{'query':<40}{'hits':>6}{'p50 ms':>9}{'p99 ms':>9}  top result")
+    ok = True
+    for label, query, expect in QUERIES:
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rows = index.search("400001", query, table)
+            times.append((time.perf_counter() - started) * 1e3)
+        times.sort()
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        top = table.titles[rows[0]] if rows else "-"
+        found = (not rows) if expect is None else bool(rows) and all(w in top.lower() for w in expect)
+        slow = p99 > args.budget_ms
+        ok = ok and found and not slow
+        print(f"{label + ': ' + query:<40}{len(rows):>6}{statistics.median(times):>9.2f}{p99:>9.2f}  "
+              f"{top[:60]}{'' if found else '  ❌ wrong result'}{'  ❌ over budget' if slow else ''}")
+
+    print(f"\n{'✅ All queries' if ok else '❌ Some queries'} within {args.budget_ms:g} ms with the expected top result")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
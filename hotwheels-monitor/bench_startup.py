@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Runs the entry points under `python -X importtime` (plain imports and a real
+`monitor.py --ci` cycle against the FirstCry simulator), checks that modules
+a code path doesn't use are never imported, and fails on regressions against
+bench_startup_baseline.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "bench_startup_baseline.json")
+
+# Never needed by a --ci run; telegram/twilio/github only on the bot, WhatsApp and Issues paths
+CI_UNUSED = ["telegram", "twilio", "github", "pipeline", "sharding", "concurrent.futures",
+             "http.server", "cProfile", "psutil"]
+
+# (case, python arguments, modules that must not be imported)
+CASES = [
+    ("import monitor", ["-c", "import monitor"], CI_UNUSED + ["bs4", "lxml", "dotenv"]),
+    # Importing the scraper must not configure logging for the importer
+    ("import firstcry_scraper", ["-c", "import firstcry_scraper, logging, sys; sys.exit(bool(logging.getLogger().handlers))"],
+     CI_UNUSED + ["bs4", "lxml"]),
+    ("import telegram_bot", ["-c", "import telegram_bot"], ["twilio", "github", "sharding", "bs4", "lxml", "http.server"]),
+    ("monitor.py --ci", [os.path.join(HERE, "monitor.py"), "--ci"], CI_UNUSED),
+]
+
+
+def import_rows(stderr):
+    """(depth, cumulative us, module) for every line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((depth, int(cumulative), name.strip()))
+    return rows
+
+
+def interpreter_modules():
+    """Top-level imports made by the interpreter itself, left out of every total"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    return {name for depth, _, name in import_rows(result.stderr) if depth == 0}
+
+
+def run_case(argv, cwd, env, startup):
+    result = subprocess.run([sys.executable, "-X", "importtime"] + argv, cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=120)
+    rows = import_rows(result.stderr)
+    total = sum(us for depth, us, name in rows if depth == 0 and name not in startup)
+    modules = {name for _, _, name in rows}
+    return result.returncode, total / 1000, modules
+
+
+def ci_workdir(sim_url, products=3):
+    """Directory with a small config.yaml pointing at the simulator, for `monitor.py --ci`"""
+    workdir = tempfile.mkdtemp(prefix="hotwheels-startup-")
+    cfg = {"products": [{"id": f"startup{n}", "title": f"Hot Wheels Sim Car {n:05d}",
+                         "url": f"{sim_url}/hot-wheels/hot-wheels-sim-car-{n:05d}/{20000000 + n}/product-detail",
+                         "pincode": "400001"} for n in range(products)],
+           "delay_between_requests": 0}
+    with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    return workdir
+
+
+def compare(base, stats, time_tolerance, module_tolerance):
+    if not base:
+        return []
+    problems = []
+    if stats["import_ms"] > base["import_ms"] * (1 + time_tolerance):
+        problems.append(f"imports {stats['import_ms']:.0f}ms > {base['import_ms']:.0f}ms")
+    if stats["modules"] > base["modules"] * (1 + module_tolerance):
+        problems.append(f"{stats['modules']} modules > {base['modules']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import-time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per case; the median is compared")
+    parser.add_argument("--filter", default="", help="Only run cases containing this text")
+    parser.add_argument("--time-tolerance", type=float, default=0.30, help="Allowed import time growth vs baseline (0.30 = 30%%)")
+    parser.add_argument("--module-tolerance", type=float, default=0.05, help="Allowed growth in the number of imported modules")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run's numbers to bench_startup_baseline.json")
+    args = parser.parse_args()
+
+    from loadtest_monitor import start_simulator
+    sim_args = argparse.Namespace(latency_ms=0, jitter_ms=0, error_rate=0, throttle_rate=0, in_stock_ratio=0)
+    sim, sim_url = start_simulator(sim_args, 10)
+    workdir = ci_workdir(sim_url)
+    # Keep a developer's .env from enabling real notification channels
+    env = dict(os.environ, FIRSTCRY_BASE_URL=sim_url, TELEGRAM_BOT_TOKEN="", TELEGRAM_CHAT_ID="",
+               SMTP_HOST="", TWILIO_ACCOUNT_SID="", PYTHONDONTWRITEBYTECODE="1")
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    startup = interpreter_modules()
+    failures = 0
+    numbers = {}
+    try:
+        print(f"{'case':<26}{'median ms':>11}{'min ms':>9}{'modules':>9}  status")
+        for case, argv, unused in CASES:
+            if args.filter not in case:
+                continue
+            cwd = workdir if "--ci" in argv else HERE
+            times, problems = [], []
+            for _ in range(args.runs):
+                code, import_ms, modules = run_case(argv, cwd, env, startup)
+                times.append(import_ms)
+                if code:
+                    problems.append(f"exit status {code}")
+                    break
+            loaded = sorted(m for m in modules if any(m == u or m.startswith(u + ".") for u in unused))
+            if loaded:
+                problems.append("imports " + ", ".join(sorted({m.split(".")[0] for m in loaded})))
+            stats = {"import_ms": statistics.median(times), "modules": len(modules)}
+            numbers[case] = stats
+            if not args.update_baseline:
+                problems += compare(baseline.get(case), stats, args.time_tolerance, args.module_tolerance)
+            failures += bool(problems)
+            status = "✅" if not problems else "❌ " + "; ".join(problems)
+            print(f"{case:<26}{stats['import_ms']:>11.1f}{min(times):>9.1f}{stats['modules']:>9}  {status}")
+    finally:
+        sim.terminate()
+        sim.wait()
+
+    if args.update_baseline:
+        baseline.update(numbers)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {os.path.basename(BASELINE_FILE)}")
+
+    if failures:
+        print(f"\n❌ {failures} case(s) failed")
+        sys.exit(1)
+    print("\n✅ All cases passed")
+
+
+if __name__ == "__main__":
+    main()
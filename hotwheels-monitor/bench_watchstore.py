@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+config.yaml products list vs the SQLite watchlist store
+Times one bot subscription (load, change, save) and one pass of the monitor
+over every watched pair with each backend at a large watchlist size, then has
+several processes subscribe at once and counts the subscriptions that were
+lost, and checks that import followed by export keeps every pair and subscriber
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+import yaml
+
+import monitor
+from watchlist import SubscriptionIndex, subscribe
+from watchstore import WatchlistStore
+
+OWNER_CHAT = "1000"
+
+
+def build_products(entries, seed=3):
+    rng = random.Random(seed)
+    products = []
+    for i in range(entries):
+        entry = {"id": f"prod{i + 1}", "title": f"Hot Wheels Die Cast Car #{i:05d}",
+                 "url": f"https://www.firstcry.com/hot-wheels/{30000000 + i}/product-detail",
+                 "pincode": str(400001 + i % 7)}
+        if rng.random() < 0.8:
+            entry["subscribers"] = [str(2000 + rng.randrange(500)) for _ in range(rng.randint(1, 3))]
+        products.append(entry)
+    return products
+
+
+def product(i):
+    return {"title": f"Hot Wheels New Arrival #{i}", "url": f"https://www.firstcry.com/hot-wheels/{40000000 + i}"}
+
+
+def yaml_subscribe(path, i, chat_id):
+    cfg = monitor.load_yaml(path)
+    added = subscribe(cfg["products"], product(i), "400001", chat_id, default_chat=OWNER_CHAT)
+    monitor.save_yaml(cfg, path)
+    return added
+
+
+def writer(backend, path, chat_id, count):
+    """One process subscribing chat_id to `count` products, like a bot user tapping Add"""
+    store = WatchlistStore(path) if backend == "sqlite" else None
+    for i in range(count):
+        if store is not None:
+            store.subscribe(product(i), "400001", chat_id, OWNER_CHAT)
+            continue
+        try:
+            yaml_subscribe(path, i, chat_id)
+        except (yaml.YAMLError, TypeError, KeyError):
+            pass  # read another writer's half-written file; that add is lost
+
+
+def subscriptions(backend, path):
+    """Subscriptions across all pairs, or None if the file no longer parses"""
+    if backend == "sqlite":
+        pairs = WatchlistStore(path).pairs(OWNER_CHAT)
+    else:
+        try:
+            pairs = SubscriptionIndex.from_products(monitor.load_yaml(path)["products"], OWNER_CHAT).pairs()
+        except (yaml.YAMLError, TypeError, KeyError):
+            return None
+    return sum(len(chats) for _, _, chats in pairs)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def peak_kib(fn):
+    """Peak traced memory of one call (a separate run: tracing slows it down several times)"""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the YAML watchlist with the SQLite store")
+    parser.add_argument("--entries", type=int, default=10000, help="Watchlist size for the timings")
+    parser.add_argument("--writers", type=int, default=4, help="Processes subscribing at the same time")
+    parser.add_argument("--adds", type=int, default=10, help="Subscriptions per writer process")
+    parser.add_argument("--contended-entries", type=int, default=1000,
+                        help="Watchlist size for the concurrent writers (the YAML path rewrites it per add)")
+    args = parser.parse_args()
+
+    products = build_products(args.entries)
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        yaml_path, db_path = os.path.join(tmp, "config.yaml"), os.path.join(tmp, "watchlist.sqlite")
+        monitor.save_yaml({"products": products, "delay_between_requests": 3}, yaml_path)
+        store = WatchlistStore(db_path)
+        import_s = timed(lambda: store.import_products(products, OWNER_CHAT))
+
+        print(f"{args.entries} entries ({len(store)} pairs); import into SQLite took {import_s:.1f} s\n")
+        print(f"{'':<34}{'YAML':>12}{'SQLite':>12}")
+        rows = [
+            ("bot: subscribe one user (ms)",
+             lambda: yaml_subscribe(yaml_path, 0, "42"),
+             lambda: store.subscribe(product(0), "400001", "42", OWNER_CHAT)),
+            ("monitor: walk every pair (ms)",
+             lambda: sum(1 for _ in SubscriptionIndex.from_products(monitor.load_yaml(yaml_path)["products"],
+                                                                    OWNER_CHAT).pairs()),
+             lambda: sum(1 for _ in store.pairs(OWNER_CHAT))),
+        ]
+        for label, with_yaml, with_store in rows:
+            print(f"{label:<34}{timed(with_yaml) * 1e3:>12.1f}{timed(with_store) * 1e3:>12.1f}")
+        walk_yaml, walk_store = rows[1][1:]
+        print(f"{'monitor: peak memory (KiB)':<34}{peak_kib(walk_yaml):>12.0f}{peak_kib(walk_store):>12.0f}")
+
+        exported = store.export_products()
+        want = [(pair, chats) for pair, _, chats in SubscriptionIndex.from_products(
+            monitor.load_yaml(yaml_path)["products"], OWNER_CHAT).pairs()]
+        got = [(pair, chats) for pair, _, chats in SubscriptionIndex.from_products(exported, OWNER_CHAT).pairs()]
+        round_trip = sorted(want) == sorted(got)
+        ok = ok and round_trip
+        print(f"\n{'✅' if round_trip else '❌'} export → YAML keeps all {len(want)} pairs and their subscribers")
+
+        print(f"\n{args.writers} processes × {args.adds} subscriptions on a {args.contended_entries}-entry watchlist")
+        ctx = multiprocessing.get_context("spawn")
+        for backend in ("yaml", "sqlite"):
+            path = os.path.join(tmp, f"contended.{backend}")
+            seed = build_products(args.contended_entries)
+            if backend == "sqlite":
+                WatchlistStore(path).import_products(seed, OWNER_CHAT)
+            else:
+                monitor.save_yaml({"products": seed}, path)
+            before = subscriptions(backend, path)
+            procs = [ctx.Process(target=writer, args=(backend, path, str(9000 + w), args.adds))
+                     for w in range(args.writers)]
+            started = time.perf_counter()
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            elapsed = time.perf_counter() - started
+            after = subscriptions(backend, path)
+            if after is None:
+                print(f"  {backend:<8}{elapsed:>6.1f} s, file left corrupt by interleaved writes")
+                continue
+            lost = args.writers * args.adds - (after - before)
+            print(f"  {backend:<8}{elapsed:>6.1f} s, {lost} subscriptions lost")
+            if backend == "sqlite":
+                ok = ok and lost == 0
+
+    print(("\n✅ " if ok else "\n❌ ") + "SQLite store kept every concurrent subscription")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
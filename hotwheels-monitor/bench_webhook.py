@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark webhook vs polling update delivery for the Telegram bot
+Runs HotWheelsBot against the local fake Bot API and reports
+/start round-trip latency and burst throughput for each mode
+"""
+
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import statistics
+
+import requests
+
+from fake_telegram import FakeTelegram
+from telegram_bot import HotWheelsBot, WEBHOOK_PATH
+
+BENCH_TOKEN = "123456:BENCHMARK"
+SECRET = "bench-secret-token"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def start_bot(application, mode, max_connections):
+    await application.initialize()
+    await application.start()
+    if mode == "polling":
+        await application.updater.start_polling(poll_interval=0.0, timeout=10)
+        return None
+    port = free_port()
+    await application.updater.start_webhook(
+        listen="127.0.0.1",
+        port=port,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"http://127.0.0.1:{port}/{WEBHOOK_PATH}",
+        secret_token=SECRET,
+        max_connections=max_connections,
+    )
+    return f"http://127.0.0.1:{port}/{WEBHOOK_PATH}"
+
+
+async def stop_bot(application):
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+
+
+async def bench_mode(mode, sequential, burst, concurrent_updates, max_connections):
+    fake = FakeTelegram().start()
+    bot = HotWheelsBot()
+    bot.bot_token = BENCH_TOKEN
+    application = bot.build_application(base_url=fake.base_url, concurrent_updates=concurrent_updates)
+
+    loop = asyncio.get_running_loop()
+    injected = {}
+    waiters = {}
+
+    def on_call(method, params):
+        if method != "sendMessage":
+            return
+        chat_id = int(params["chat_id"])
+        if chat_id in waiters:
+            latency = time.perf_counter() - injected[chat_id]
+            loop.call_soon_threadsafe(waiters.pop(chat_id).set_result, latency)
+
+    fake.on_call(on_call)
+    webhook_endpoint = await start_bot(application, mode, max_connections)
+
+    def inject(user_id):
+        waiters[user_id] = loop.create_future()
+        injected[user_id] = time.perf_counter()
+        fake.push_text(user_id, "/start")
+        return waiters[user_id]
+
+    # Secret-token validation: a forged delivery must be refused
+    rejected = None
+    if webhook_endpoint:
+        response = await asyncio.to_thread(
+            requests.post, webhook_endpoint, json={"update_id": 0},
+            headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}, timeout=5)
+        rejected = response.status_code == 403
+
+    # Latency: one update in flight at a time
+    latencies = []
+    for i in range(sequential):
+        latencies.append(await asyncio.wait_for(inject(10_000 + i), timeout=30))
+
+    # Throughput: fire a burst and wait for every reply
+    started = time.perf_counter()
+    futures = [inject(100_000 + i) for i in range(burst)]
+    await asyncio.wait_for(asyncio.gather(*futures), timeout=120)
+    elapsed = time.perf_counter() - started
+
+    await stop_bot(application)
+    fake.stop()
+
+    return {
+        "mode": mode,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": burst / elapsed,
+        "secret_rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webhook vs polling")
+    parser.add_argument("--sequential", type=int, default=200, help="Updates sent one at a time for latency")
+    parser.add_argument("--burst", type=int, default=1000, help="Updates sent at once for throughput")
+    parser.add_argument("--concurrent-updates", type=int, default=32)
+    parser.add_argument("--max-connections", type=int, default=40)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    for mode in ("polling", "webhook"):
+        results.append(asyncio.run(bench_mode(
+            mode, args.sequential, args.burst, args.concurrent_updates, args.max_connections)))
+
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'updates/s':>12}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput']:>12.1f}")
+        if r["secret_rejected"] is not None:
+            print(f"  forged webhook request rejected: {'✅' if r['secret_rejected'] else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
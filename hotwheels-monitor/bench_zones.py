@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Serviceability-zone collapsing against the FirstCry simulator
+Watches every product at pincodes that the simulator serves from a few shared
+fulfilment zones, restocks and sells out products per zone between cycles and
+splits one zone halfway through. Runs the same scenario with every pincode
+checked and with monitor --zones, and reports the product pages requested, the
+zone mispredictions caught by re-probes, and how many recorded verdicts
+disagreed with the simulator after each cycle
+"""
+
+import os
+import sys
+import random
+import logging
+import argparse
+import tempfile
+
+import monitor
+from fake_firstcry import FirstCrySimulator
+from firstcry_scraper import FirstCryScraper
+from zones import ZoneMap, MIN_AGREEMENT
+
+OWNER_CHAT = "1000"
+ZONES = {
+    "MUM": ["400001", "400002", "400050", "400070"],
+    "DEL": ["110001", "110002", "110016", "110020"],
+    "BLR": ["560001", "560002", "560034", "560095"],
+}
+# Half of Bangalore moves to a new fulfilment centre mid-run
+SPLIT_ZONE, SPLIT_PINCODES = "BLR2", ["560034", "560095"]
+
+
+def build_watchlist(sim, products):
+    pincodes = [p for members in ZONES.values() for p in members]
+    entries = [{"id": f"zone{i}_{pincode}", "title": product["title"], "url": sim.product_url(product, sim.base_url),
+                "pincode": pincode}
+               for i, product in enumerate(sim.catalog[:products]) for pincode in pincodes]
+    return {"products": entries, "delay_between_requests": 0}
+
+
+def change_stock(sim, rng, products, changes, split):
+    """Flip `changes` products in one zone each; at the split, the new zone starts out differently"""
+    zones = sorted(set(sim.zones.values()))
+    for _ in range(changes):
+        product, zone = rng.choice(sim.catalog[:products]), rng.choice(zones)
+        pincode = next(p for p, z in sim.zones.items() if z == zone)
+        sim.set_zone_stock(product["pid"], zone, not sim.in_stock_at(product, pincode))
+    if split:
+        for product in sim.catalog[:products]:
+            stocked = sim.in_stock_at(product, SPLIT_PINCODES[0])
+            sim.set_zone_stock(product["pid"], SPLIT_ZONE, not stocked if rng.random() < 0.3 else stocked)
+        for pincode in SPLIT_PINCODES:
+            sim.zones[pincode] = SPLIT_ZONE
+
+
+def wrong_verdicts(sim, cfg, state):
+    """Watched pairs whose recorded stock differs from what the simulator serves now"""
+    by_pid = {str(p["pid"]): p for p in sim.catalog}
+    wrong = 0
+    for (product_key, pincode), _, _ in monitor.watched_pairs(cfg, OWNER_CHAT):
+        record = state.get(f"{product_key}_{pincode}")
+        wrong += not record or record["in_stock"] != sim.in_stock_at(by_pid[product_key], pincode)
+    return wrong
+
+
+def run(args, use_zones, tmp):
+    zones = {pincode: zone for zone, members in ZONES.items() for pincode in members}
+    sim = FirstCrySimulator(products=args.products, in_stock_ratio=0.5, zones=zones, seed=args.seed).serve()
+    rng = random.Random(args.seed)
+    try:
+        cfg = build_watchlist(sim, args.products)
+        scraper = FirstCryScraper(min_interval=0, base_url=sim.base_url)
+        path = os.path.join(tmp, f"zones-{use_zones}.json")
+        state, alerts, rows = {}, [0], []
+        on_alert = lambda *a: alerts.__setitem__(0, alerts[0] + 1)
+        for cycle in range(args.cycles):
+            if cycle:
+                change_stock(sim, rng, args.products, args.changes, split=cycle == args.split_at)
+            # One process per cycle, like --ci runs: the zone map goes through zones.json
+            zone_map = ZoneMap.load(path) if use_zones else None
+            before = sim.stats["product"]
+            monitor.run_cycle(cfg, state, scraper, on_alert, default_chat=OWNER_CHAT, zones=zone_map)
+            mispredicted = zone_map.totals["mispredictions"] if zone_map else 0
+            if zone_map:
+                zone_map.save()
+            rows.append({"requests": sim.stats["product"] - before, "wrong": wrong_verdicts(sim, cfg, state),
+                         "mispredictions": mispredicted,
+                         "zones": len(set(zone_map.zone_of.values())) if zone_map else len(zones)})
+        totals = ZoneMap.load(path).totals if use_zones else None
+        return rows, totals, alerts[0], len(cfg["products"])
+    finally:
+        sim.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare checking every pincode with checking one per learned zone")
+    parser.add_argument("--products", type=int, default=40, help="Products, each watched at all %d pincodes"
+                        % sum(len(m) for m in ZONES.values()))
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=6, help="Per-zone stock changes between cycles")
+    parser.add_argument("--split-at", type=int, default=10, help="Cycle before which one zone splits in two")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        every, _, every_alerts, pairs = run(args, False, tmp)
+        zoned, totals, zoned_alerts, _ = run(args, True, tmp)
+
+    print(f"{pairs} watched pairs, {len(ZONES)} zones of {len(ZONES['MUM'])} pincodes; "
+          f"one zone splits before cycle {args.split_at}\n")
+    print(f"{'cycle':>5}{'every pincode':>15}{'zones':>8}{'requests':>10}{'wrong':>7}{'mispredicted':>14}")
+    for cycle, (a, b) in enumerate(zip(every, zoned)):
+        print(f"{cycle:>5}{a['requests']:>15}{b['zones']:>8}{b['requests']:>10}{b['wrong']:>7}"
+              f"{b['mispredictions']:>14}")
+
+    made, saved_from = sum(r["requests"] for r in zoned), sum(r["requests"] for r in every)
+    steady = zoned[MIN_AGREEMENT:]
+    steady_saved = 1 - sum(r["requests"] for r in steady) / sum(r["requests"] for r in every[MIN_AGREEMENT:])
+    wrong = sum(r["wrong"] for r in zoned)
+    miss_rate = totals["mispredictions"] / (totals["reprobes"] or 1)
+    print(f"\nRequests: {saved_from} checking every pincode, {made} with zones "
+          f"({1 - made / saved_from:.0%} fewer; {steady_saved:.0%} once zones were learned)")
+    print(f"Re-probes: {totals['reprobes']}, mispredicted: {totals['mispredictions']} ({miss_rate:.1%})")
+    print(f"Verdicts that disagreed with the simulator: {wrong} of {pairs * args.cycles} "
+          f"({wrong / (pairs * args.cycles):.2%}); every pincode: {sum(r['wrong'] for r in every)}")
+    print(f"Alerts: {every_alerts} checking every pincode, {zoned_alerts} with zones")
+
+    split_seen = totals["mispredictions"] > 0 and zoned[-1]["zones"] == len(ZONES) + 1
+    ok = steady_saved >= 0.4 and split_seen and wrong <= 0.02 * pairs * args.cycles
+    print(("\n✅ " if ok else "\n❌ ") + "zones cut requests, noticed the split and kept verdicts within 2% of the simulator")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Catalog snapshots
+Index of the HotWheels listing per pincode, keyed by canonical product id with
+a content hash per product, so each crawl yields a diff (added, removed,
+price and stock changes) and a routine refresh stops at the first listing
+page that holds nothing new
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from watchlist import canonical_key
+
+# Listing order with the newest products first
+NEWEST_FIRST = "new"
+# A crawl that stops early can't see removals or changes further down; do a full one this often
+FULL_CRAWL_INTERVAL = 24 * 3600
+
+
+def content_hash(product):
+    """Short hash of the fields a diff reports on"""
+    data = json.dumps([product.get("title"), product.get("price"), bool(product.get("in_stock"))])
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+class CatalogDiff:
+    """Changes found by one crawl; `removed` is only filled in by full crawls"""
+
+    def __init__(self):
+        self.added = []          # product dicts
+        self.removed = []        # snapshot records
+        self.price_changed = []  # (record, old price)
+        self.stock_changed = []  # (record, was in stock)
+        self.pages = 0
+        self.complete = False
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.price_changed or self.stock_changed)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.removed)} removed, {len(self.price_changed)} price "
+                f"and {len(self.stock_changed)} stock changes in {self.pages} page(s)"
+                f"{'' if self.complete else ' (stopped early)'}")
+
+
+class CatalogSnapshot:
+    """Last known listing for one pincode, persisted as JSON"""
+
+    def __init__(self, pincode, path=None):
+        self.pincode = str(pincode)
+        self.path = path or f"catalog_{self.pincode}.json"
+        self.products = {}    # canonical key -> record
+        self.crawled_at = None
+        self.full_crawl_at = None
+
+    @classmethod
+    def load(cls, pincode, path=None):
+        snapshot = cls(pincode, path)
+        if os.path.exists(snapshot.path):
+            with open(snapshot.path, encoding="utf-8") as f:
+                data = json.load(f)
+            snapshot.products = data.get("products", {})
+            snapshot.crawled_at = data.get("crawled_at")
+            snapshot.full_crawl_at = data.get("full_crawl_at")
+        return snapshot
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pincode": self.pincode, "crawled_at": self.crawled_at,
+                       "full_crawl_at": self.full_crawl_at, "products": self.products}, f)
+        os.replace(tmp, self.path)
+
+    def needs_full_crawl(self, now=None):
+        return not self.full_crawl_at or (now or time.time()) - self.full_crawl_at > FULL_CRAWL_INTERVAL
+
+    def merge_page(self, products, diff, now):
+        """Fold one listing page into the snapshot; True if nothing on it was new or changed"""
+        unchanged = True
+        for product in products:
+            key = canonical_key(product.get("url"))
+            digest = content_hash(product)
+            record = self.products.get(key)
+            if record is None:
+                diff.added.append(product)
+                record = self.products[key] = {"first_seen": now}
+                unchanged = False
+            elif record["hash"] != digest:
+                if record.get("price") != product.get("price"):
+                    diff.price_changed.append((record, record.get("price")))
+                if record.get("in_stock") != bool(product.get("in_stock")):
+                    diff.stock_changed.append((record, record.get("in_stock")))
+                unchanged = False
+            record.update(id=key, title=product.get("title"), url=product.get("url"), price=product.get("price"),
+                          in_stock=bool(product.get("in_stock")), image_url=product.get("image_url", ""),
+                          hash=digest, last_seen=now)
+        return unchanged
+
+    def drop_unseen(self, seen, diff):
+        for key in [key for key in self.products if key not in seen]:
+            diff.removed.append(self.products.pop(key))
+
+
+def crawl(scraper, snapshot, max_pages=100, full=None, deadline=None):
+    """Crawl the listing newest first into `snapshot` and return the CatalogDiff
+
+    Unless `full`, the crawl stops after the first page whose products are all
+    known and unchanged. `full=None` does a full crawl when one is due. With a
+    monotonic deadline, it also stops before a page that (at the last page's pace)
+    would end past it; like a failed fetch, that leaves the crawl incomplete.
+    """
+    now = int(time.time())
+    full = snapshot.needs_full_crawl(now) if full is None else full
+    diff = CatalogDiff()
+    seen = set()
+    pace = 0
+    for page in range(1, max_pages + 1):
+        started = time.monotonic()
+        if deadline and started + pace > deadline:
+            break
+        products = scraper.fetch_listing(snapshot.pincode, page, sort=NEWEST_FIRST)
+        pace = time.monotonic() - started
+        if products is None:
+            break  # fetch failed: keep what we have, nothing is reported as removed
+        diff.pages = page
+        if not products:
+            diff.complete = True
+            break
+        seen.update(canonical_key(p.get("url")) for p in products)
+        unchanged = snapshot.merge_page(products, diff, now)
+        if unchanged and not full:
+            break
+    if full and diff.complete:
+        snapshot.drop_unseen(seen, diff)
+        snapshot.full_crawl_at = now
+    snapshot.crawled_at = now
+    logging.info("Catalog [%s]: %s", snapshot.pincode, diff.summary())
+    return diff
+
+
+def main():
+    import argparse
+    from firstcry_scraper import FirstCryScraper
+
+    parser = argparse.ArgumentParser(description="Refresh the HotWheels catalog snapshot and print what changed")
+    parser.add_argument("--pincode", default="400001")
+    parser.add_argument("--full", action="store_true", help="Crawl every page (also finds removed products)")
+    parser.add_argument("--max-pages", type=int, default=100)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    snapshot = CatalogSnapshot.load(args.pincode)
+    first = not snapshot.products
+    diff = crawl(FirstCryScraper(), snapshot, args.max_pages, full=True if args.full else None)
+    snapshot.save()
+    if first:
+        print(f"📦 Snapshot created with {len(snapshot.products)} products")
+        return
+    for product in diff.added:
+        print(f"🆕 {product['title']} {product['price']} {product['url']}")
+    for record, old in diff.price_changed:
+        print(f"💰 {record['title']}: {old} → {record['price']}")
+    for record, was in diff.stock_changed:
+        print(f"{'✅' if record['in_stock'] else '❌'} {record['title']} now {'in' if record['in_stock'] else 'out of'} stock")
+    for record in diff.removed:
+        print(f"🗑️ {record['title']} removed")
+    print(diff.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Control socket
+Long-running processes (the bot, monitor.py --daemon) listen on a Unix domain
+socket and record it in a pidfile, so tools reach them directly instead of
+scanning the host's processes. Commands run inside the process, next to its
+in-memory caches. One JSON request per line, one JSON reply per request:
+    {"cmd": "check", "url": "...", "pincode": "400001"}
+    {"ok": true, "result": ...}    or    {"ok": false, "error": "..."}
+
+    python control.py bot stats
+    python control.py monitor check url=https://www.firstcry.com/... pincode=400001
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+
+# Pidfiles and sockets go here; keep the path short, socket paths are capped at ~100 bytes
+RUN_DIR = os.getenv("HOTWHEELS_RUN_DIR", "run")
+# Longest a request line may be
+MAX_REQUEST = 64 * 1024
+
+
+class ControlError(Exception):
+    """The process isn't running, or it refused a command"""
+
+
+def paths(name, run_dir=None):
+    run_dir = run_dir or RUN_DIR
+    return os.path.join(run_dir, f"{name}.pid"), os.path.join(run_dir, f"{name}.sock")
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def read_pidfile(name, run_dir=None):
+    """{"pid", "socket", "started"} of the running process, or None if there is none"""
+    pidfile, _ = paths(name, run_dir)
+    try:
+        with open(pidfile, encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return info if alive(info.get("pid", 0)) else None
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """Serves `commands` (name -> function taking the request's other fields) on a Unix socket"""
+
+    def __init__(self, name, commands, run_dir=None):
+        self.name = name
+        self.commands = dict(commands)
+        self.commands.setdefault("ping", lambda: {"pid": os.getpid(), "uptime": round(time.time() - self.started)})
+        self.pidfile, self.socket_path = paths(name, run_dir)
+        self.started = time.time()
+        self.server = None
+
+    def start(self):
+        running = read_pidfile(self.name, os.path.dirname(self.pidfile))
+        if running and running["pid"] != os.getpid():
+            raise ControlError(f"{self.name} is already running (pid {running['pid']})")
+        os.makedirs(os.path.dirname(self.pidfile) or ".", mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left by a process that died without cleaning up
+
+        control = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in iter(lambda: self.rfile.readline(MAX_REQUEST), b""):
+                    reply = control.dispatch(line)
+                    self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+
+        umask = os.umask(0o177)  # socket only for this user
+        try:
+            self.server = _Server(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        tmp = self.pidfile + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "socket": os.path.abspath(self.socket_path), "started": self.started}, f)
+        os.replace(tmp, self.pidfile)
+        logging.info("Control socket for %s on %s", self.name, self.socket_path)
+        return self
+
+    def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            command = self.commands.get(request.pop("cmd", None))
+            if command is None:
+                return {"ok": False, "error": f"unknown command; try one of {', '.join(sorted(self.commands))}"}
+            return {"ok": True, "result": command(**request)}
+        except Exception as e:
+            logging.warning("Control command %s failed: %s", line[:200], e)
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        # Another instance may have taken over the name; only remove what is ours
+        info = read_pidfile(self.name, os.path.dirname(self.pidfile))
+        if info and info["pid"] == os.getpid():
+            for path in (self.pidfile, self.socket_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+class Inbox:
+    """Calls handed from control connections to the thread that owns the state they touch"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run fn on the owning thread and return its result (or raise its exception)"""
+        future = Future()
+        self.queue.put((future, fn, args, kwargs))
+        return future.result(timeout)
+
+    def wake(self):
+        """Return from a run_pending() that is waiting, without running anything"""
+        self.queue.put(None)
+
+    def run_pending(self, timeout=0):
+        """Run queued calls, waiting up to `timeout` seconds for the first; True if any ran"""
+        try:
+            item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+        except queue.Empty:
+            return False
+        while item is not None:
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                item = None
+        return True
+
+
+def send(name, cmd, timeout=30, run_dir=None, **args):
+    """Send one command to the named process and return its result"""
+    info = read_pidfile(name, run_dir)
+    if info is None:
+        raise ControlError(f"{name} is not running (no live pidfile in {run_dir or RUN_DIR})")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(info["socket"])
+        except OSError as e:
+            raise ControlError(f"{name} (pid {info['pid']}) is not answering on {info['socket']}: {e}")
+        sock.sendall(json.dumps(dict(args, cmd=cmd)).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ControlError(f"{name} closed the connection without replying")
+    reply = json.loads(line)
+    if not reply["ok"]:
+        raise ControlError(reply["error"])
+    return reply["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a command to the running bot or monitor daemon")
+    parser.add_argument("name", choices=("bot", "monitor"))
+    parser.add_argument("cmd", help="ping, stats, stop, reload, flush, warm or check")
+    parser.add_argument("args", nargs="*", metavar="key=value", help="Command arguments, e.g. url=... pincode=400001")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+    try:
+        result = send(args.name, args.cmd, timeout=args.timeout, **dict(a.split("=", 1) for a in args.args))
+    except ControlError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Local FirstCry simulator for load tests
+Serves synthetic HotWheels product and listing pages that honour the
+FC_PINCODE cookie, with configurable latency, errors, 429 throttling
+(random, or per client IP like FirstCry's own), restock events and
+fulfilment zones that share stock between pincodes
+"""
+
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LISTING_PATH = "/hotwheels/5/0/113"
+PAGE_SIZE = 20
+IMAGE_PATH = "/images/"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FirstCrySimulator:
+    """Synthetic catalog plus the knobs a load test needs"""
+
+    def __init__(self, products=1000, latency_ms=0, jitter_ms=0, error_rate=0.0, throttle_rate=0.0,
+                 in_stock_ratio=0.5, restock_rate=0.0, unserviceable=(), seed=1, ip_rate=0.0, zones=None,
+                 tail_rate=0.0, tail_ms=0):
+        self.random = random.Random(seed)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        # Fraction of responses held back an extra tail_ms, like FirstCry's occasional stalls
+        self.tail_rate = tail_rate
+        self.tail = tail_ms / 1000
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.restock_rate = restock_rate
+        self.unserviceable = {str(p) for p in unserviceable}
+        # Pincode -> fulfilment zone; (pid, zone) -> in_stock overrides the product's own flag there
+        self.zones = {str(p): zone for p, zone in (zones or {}).items()}
+        self.zone_stock = {}
+        # Requests per second each client address may make before getting 429s (0 = unlimited)
+        self.ip_rate = ip_rate
+        self.buckets = {}
+        # Client address -> {"requests": n, "pincodes": set()}, to see how traffic was spread
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.catalog = []
+        self.by_pid = {}
+        for i in range(products):
+            self.add_product(in_stock=self.random.random() < in_stock_ratio)
+        self.events = []
+        self.stats = {"requests": 0, "product": 0, "listing": 0, "image": 0, "errors": 0, "throttled": 0}
+        self.stopped = threading.Event()
+
+    # ---------- Catalog ----------
+    def add_product(self, in_stock=True, price=None):
+        """Append a product; the newest product is listed first under sort=new"""
+        with self.lock:
+            i = len(self.catalog)
+            pid = 20000000 + i
+            product = {
+                "pid": pid,
+                "title": f"Hot Wheels Sim Car {i:05d} Die Cast Free Wheel",
+                "slug": f"hot-wheels-sim-car-{i:05d}",
+                "price": price or 199 + (i * 37) % 2800,
+                "in_stock": in_stock,
+            }
+            self.catalog.append(product)
+            self.by_pid[pid] = product
+            return product
+
+    def product_url(self, product, base_url=""):
+        return f"{base_url}/hot-wheels/{product['slug']}/{product['pid']}/product-detail"
+
+    def set_stock(self, pid, in_stock):
+        with self.lock:
+            product = self.by_pid[pid]
+            if in_stock and not product["in_stock"]:
+                self.events.append({"pid": pid, "type": "restock", "at": time.time()})
+            product["in_stock"] = in_stock
+
+    def set_zone_stock(self, pid, zone, in_stock):
+        """Stock a product differently in one zone (None: follow the product again)"""
+        with self.lock:
+            if in_stock is None:
+                self.zone_stock.pop((pid, zone), None)
+            else:
+                self.zone_stock[(pid, zone)] = in_stock
+
+    def in_stock_at(self, product, pincode):
+        if pincode in self.unserviceable:
+            return False
+        return self.zone_stock.get((product["pid"], self.zones.get(pincode)), product["in_stock"])
+
+    def set_price(self, pid, price):
+        with self.lock:
+            self.by_pid[pid]["price"] = price
+
+    def restock_loop(self):
+        """Flip random out-of-stock products back in stock at restock_rate events/second"""
+        while not self.stopped.wait(1 / self.restock_rate):
+            with self.lock:
+                candidates = [p["pid"] for p in self.catalog if not p["in_stock"]]
+            if candidates:
+                self.set_stock(self.random.choice(candidates), True)
+
+    # ---------- Pages ----------
+    def render_product(self, product, pincode):
+        if pincode in self.unserviceable:
+            actions = f'<div class="pin_err">Sorry! This product is currently unavailable at {pincode}.</div>'
+        elif self.in_stock_at(product, pincode):
+            actions = '<span class="ga_bn_btn_addcart">ADD TO CART</span><span class="ga_bn_btn_buynow">BUY NOW</span>'
+        else:
+            actions = '<div class="oos_lbl">OUT OF STOCK</div><span class="notify_btn">NOTIFY ME</span>'
+        return (f'<!DOCTYPE html><html><head><title>{product["title"]} | FirstCry.com</title></head><body>'
+                f'<div class="pincode_box">Deliver to {pincode}</div>'
+                f'<div class="prod_cont" data-pid="{product["pid"]}"><h1 class="prod-name">{product["title"]}</h1>'
+                f'<div class="prod_price"><span class="prc">&#8377;{product["price"]:,}</span></div>{actions}'
+                f'<div class="desc"><p>{product["title"]} collectible 1:64 scale die-cast vehicle.</p></div>'
+                f'</div></body></html>')
+
+    def render_listing(self, page, sort, pincode):
+        with self.lock:
+            ordered = list(reversed(self.catalog)) if sort == "new" else list(self.catalog)
+        items = []
+        for product in ordered[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]:
+            in_stock = self.in_stock_at(product, pincode)
+            oos = "" if in_stock else '<div class="out_of_stock">Out of Stock</div>'
+            url = self.product_url(product)
+            items.append(
+                f'<div class="li_cont li_cont1 lft"><div class="list_img"><a href="{url}">'
+                f'<img data-original="{IMAGE_PATH}{product["pid"]}a.webp"></a></div>'
+                f'<div class="li_txt1"><a class="li_title" href="{url}" title="{product["title"]}">{product["title"]}</a></div>'
+                f'<div class="rupee"><span class="r1 B">&#8377;{product["price"]:,}</span></div>{oos}</div>')
+        return ('<!DOCTYPE html><html><head><title>Hot Wheels | FirstCry.com</title></head><body>'
+                f'<div class="list_cont">{"".join(items)}</div></body></html>')
+
+    # ---------- HTTP ----------
+    def over_ip_rate(self, client):
+        """Token bucket per client address, refilled at ip_rate with a one-second burst"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(client, (self.ip_rate, now))
+        tokens = min(self.ip_rate, tokens + (now - last) * self.ip_rate)
+        if tokens < 1:
+            self.buckets[client] = (tokens, now)
+            return True
+        self.buckets[client] = (tokens - 1, now)
+        return False
+
+    def handle(self, path, query, pincode, client=None):
+        """(status, headers, body) for one request"""
+        with self.lock:
+            self.stats["requests"] += 1
+            seen = self.clients.setdefault(client, {"requests": 0, "pincodes": set()})
+            seen["requests"] += 1
+            seen["pincodes"].add(pincode)
+            throttled = bool(self.ip_rate) and self.over_ip_rate(client)
+            if throttled:
+                self.stats["throttled"] += 1
+        if throttled:
+            return 429, {"Retry-After": "1"}, b"Too Many Requests"
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if self.tail_rate and self.random.random() < self.tail_rate:
+            delay += self.tail
+        if delay > 0:
+            time.sleep(delay)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            with self.lock:
+                self.stats["throttled"] += 1
+            return 429, {"Retry-After": "1"}, b"Too Many Requests"
+        if self.error_rate and self.random.random() < self.error_rate:
+            with self.lock:
+                self.stats["errors"] += 1
+            return 503, {}, b"Service Unavailable"
+
+        if path == LISTING_PATH:
+            page = int(query.get("page", ["1"])[0])
+            with self.lock:
+                self.stats["listing"] += 1
+            return 200, {}, self.render_listing(page, query.get("sort", ["popularity"])[0], pincode).encode()
+
+        parts = path.strip("/").split("/")
+        if len(parts) >= 3 and parts[2].isdigit() and int(parts[2]) in self.by_pid:
+            with self.lock:
+                self.stats["product"] += 1
+            return 200, {}, self.render_product(self.by_pid[int(parts[2])], pincode).encode()
+        return 404, {}, b"Not Found"
+
+    def handle_image(self, path):
+        """A small stand-in thumbnail per product, so photo downloads can be counted"""
+        pid = path[len(IMAGE_PATH):].split("a.", 1)[0]
+        if not pid.isdigit() or int(pid) not in self.by_pid:
+            return 404, {}, b"Not Found"
+        with self.lock:
+            self.stats["image"] += 1
+        return 200, {}, b"RIFF\x00\x10\x00\x00WEBPVP8 " + pid.encode() * 400
+
+    def serve(self, host="127.0.0.1", port=0):
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle plus
+            # delayed ACKs add ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, headers, body, content_type="text/html; charset=utf-8"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/__sim/stats":
+                    with sim.lock:
+                        payload = dict(sim.stats, products=len(sim.catalog))
+                    return self._send(200, {}, json.dumps(payload).encode(), "application/json")
+                if url.path == "/__sim/events":
+                    since = float(query.get("since", ["0"])[0])
+                    with sim.lock:
+                        events = [e for e in sim.events if e["at"] >= since]
+                    return self._send(200, {}, json.dumps(events).encode(), "application/json")
+                if url.path.startswith(IMAGE_PATH):
+                    return self._send(*sim.handle_image(url.path), "image/webp")
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                pincode = cookie["FC_PINCODE"].value if "FC_PINCODE" in cookie else "400001"
+                self._send(*sim.handle(url.path, query, pincode, self.client_address[0]))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/__sim/stock":
+                    pid, in_stock = int(query["pid"][0]), query.get("in_stock", ["1"])[0] == "1"
+                    if "zone" in query:
+                        sim.set_zone_stock(pid, query["zone"][0], in_stock)
+                    else:
+                        sim.set_stock(pid, in_stock)
+                    return self._send(200, {}, b"{}", "application/json")
+                if url.path == "/__sim/add":
+                    product = sim.add_product(in_stock=query.get("in_stock", ["1"])[0] == "1")
+                    return self._send(200, {}, json.dumps(product).encode(), "application/json")
+                self._send(404, {}, b"Not Found")
+
+        self.server = _Server((host, port), Handler)
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.restock_rate:
+            threading.Thread(target=self.restock_loop, daemon=True).start()
+        logging.info("FirstCry simulator with %d products on %s", len(self.catalog), self.base_url)
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local FirstCry simulator")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of responses delayed by --tail-ms")
+    parser.add_argument("--tail-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--ip-rate", type=float, default=0.0, help="Requests per second per client address before 429s")
+    parser.add_argument("--in-stock-ratio", type=float, default=0.5)
+    parser.add_argument("--restock-rate", type=float, default=0.0, help="Restock events per second")
+    parser.add_argument("--unserviceable", default="", help="Comma separated pincodes that are never serviceable")
+    parser.add_argument("--zones", default="", help="Comma separated pincode=zone; POST /__sim/stock?zone= stocks a zone")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sim = FirstCrySimulator(
+        products=args.products, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, in_stock_ratio=args.in_stock_ratio,
+        restock_rate=args.restock_rate, unserviceable=[p for p in args.unserviceable.split(",") if p],
+        ip_rate=args.ip_rate, tail_rate=args.tail_rate, tail_ms=args.tail_ms, zones=dict(z.split("=", 1) for z in args.zones.split(",") if z),
+    ).serve(port=args.port)
+    print(f"READY {sim.base_url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
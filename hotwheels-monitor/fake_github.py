@@ -0,0 +1,164 @@
+"""
+Local stand-in for the GitHub REST API
+Serves the repository, issue, comment and contents endpoints that
+scripts/issue_handler.py uses, and records comments and commits so the
+issue handler can be tested without a real repository
+"""
+
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def _sha(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class FakeGitHub:
+    """In-process fake of one repository on the GitHub API"""
+
+    def __init__(self, repo="owner/repo", host="127.0.0.1", port=0):
+        self.repo = repo
+        self.server = _Server((host, port), self._make_handler())
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self.repo_url = f"{self.base_url}/repos/{repo}"
+
+        self.lock = threading.Lock()
+        self.issues = {}
+        self.comments = {}    # issue number -> [comment bodies]
+        self.files = {}       # path -> bytes
+        self.commits = []     # (message, path)
+        self.calls = []
+        self.conflicts = 0    # answer this many content updates with 409, as if someone pushed first
+        self.issue_numbers = itertools.count(1)
+        self.ids = itertools.count(1000)
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info("Fake GitHub API listening on %s", self.base_url)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ---------- Test setup ----------
+    def add_issue(self, body, title="Watchlist command"):
+        number = next(self.issue_numbers)
+        self.issues[number] = {"number": number, "title": title, "body": body, "state": "open"}
+        self.comments[number] = []
+        return number
+
+    def set_file(self, path, text):
+        self.files[path] = text.encode("utf-8")
+
+    def file_text(self, path):
+        return self.files[path].decode("utf-8")
+
+    # ---------- JSON shapes ----------
+    def _repo_json(self):
+        owner, name = self.repo.split("/")
+        return {"id": 1, "name": name, "full_name": self.repo, "url": self.repo_url,
+                "owner": {"login": owner, "id": 1, "type": "User"}, "default_branch": "main"}
+
+    def _issue_json(self, issue):
+        url = f"{self.repo_url}/issues/{issue['number']}"
+        return dict(issue, id=issue["number"], url=url, comments_url=f"{url}/comments",
+                    comments=len(self.comments[issue["number"]]), user={"login": "someone", "id": 2})
+
+    def _content_json(self, path):
+        data = self.files[path]
+        return {"type": "file", "encoding": "base64", "path": path, "name": path.rsplit("/", 1)[-1],
+                "size": len(data), "sha": _sha(data), "content": base64.b64encode(data).decode(),
+                "url": f"{self.repo_url}/contents/{path}"}
+
+    # ---------- Routing ----------
+    def handle(self, method, path, query, body):
+        """(status, JSON payload) for one API call"""
+        self.calls.append((method, path))
+        if path == f"/repos/{self.repo}" and method == "GET":
+            return 200, self._repo_json()
+
+        prefix = f"/repos/{self.repo}/"
+        if not path.startswith(prefix):
+            return 404, {"message": "Not Found"}
+        parts = path[len(prefix):].split("/")
+
+        with self.lock:
+            if parts[0] == "issues":
+                return self._issues(method, parts[1:], query, body)
+            if parts[0] == "contents":
+                return self._contents(method, unquote("/".join(parts[1:])), body)
+        return 404, {"message": "Not Found"}
+
+    def _issues(self, method, parts, query, body):
+        if not parts and method == "GET":
+            state = query.get("state", ["open"])[0]
+            issues = sorted(self.issues.values(), key=lambda i: i["number"],
+                            reverse=query.get("direction", ["desc"])[0] == "desc")
+            return 200, [self._issue_json(i) for i in issues if state == "all" or i["state"] == state]
+        issue = self.issues.get(int(parts[0])) if parts[0].isdigit() else None
+        if issue is None:
+            return 404, {"message": "Not Found"}
+        if len(parts) == 1 and method == "GET":
+            return 200, self._issue_json(issue)
+        if len(parts) == 1 and method == "PATCH":
+            issue.update({k: v for k, v in body.items() if k in ("state", "title", "body")})
+            return 200, self._issue_json(issue)
+        if parts[1:] == ["comments"] and method == "POST":
+            self.comments[issue["number"]].append(body["body"])
+            return 201, {"id": next(self.ids), "body": body["body"], "user": {"login": "bot", "id": 3},
+                         "url": f"{self.repo_url}/issues/comments/{next(self.ids)}"}
+        return 404, {"message": "Not Found"}
+
+    def _contents(self, method, path, body):
+        if method == "GET":
+            if path not in self.files:
+                return 404, {"message": "Not Found"}
+            return 200, self._content_json(path)
+        if method == "PUT":
+            current = _sha(self.files[path]) if path in self.files else None
+            if body.get("sha") != current or self.conflicts:
+                self.conflicts = max(0, self.conflicts - 1)
+                return 409, {"message": f"{path} does not match {body.get('sha')}"}
+            self.files[path] = base64.b64decode(body["content"])
+            self.commits.append((body["message"], path))
+            commit = {"sha": _sha(f"{len(self.commits)}{time.time()}".encode()), "message": body["message"]}
+            return (201 if current is None else 200), {"content": self._content_json(path), "commit": commit}
+        return 404, {"message": "Not Found"}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                status, payload = fake.handle(self.command, url.path, parse_qs(url.query), body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_PUT = _respond
+
+        return Handler
+
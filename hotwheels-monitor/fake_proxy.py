@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local HTTP forward proxy for egress tests
+Stands in for a real proxy in an egress pool: forwards plain-HTTP GETs
+(the simulator's pages) from its own source address, so the FirstCry
+simulator's per-address throttling sees each proxy as a separate client.
+Stopping it makes it look like a dead proxy (connection refused).
+"""
+
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from egress import SourceAddressAdapter
+
+# Response headers passed back to the client
+FORWARDED_HEADERS = ("Content-Type", "Retry-After")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeProxy:
+    """Forward proxy with request counts and an optional extra latency"""
+
+    def __init__(self, source_address=None, latency_ms=0):
+        self.source_address = source_address
+        self.latency = latency_ms / 1000
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+        self.down = False
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.trust_env = False  # never chain through the environment's proxy
+            if self.source_address:
+                adapter = SourceAddressAdapter(self.source_address)
+                session.mount("http://", adapter)
+        return session
+
+    def forward(self, url, headers):
+        """(status, headers, body) from the origin, 502 if it can't be reached"""
+        with self.lock:
+            self.stats["requests"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            response = self.session().get(url, headers=headers, timeout=30, allow_redirects=False)
+        except requests.RequestException as e:
+            with self.lock:
+                self.stats["errors"] += 1
+            return 502, {}, f"Bad Gateway: {e}".encode()
+        return response.status_code, {k: response.headers[k] for k in FORWARDED_HEADERS if k in response.headers}, \
+            response.content
+
+    def serve(self, host="127.0.0.1", port=0):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if proxy.down:
+                    # Dead proxy: drop kept-alive connections without answering
+                    self.close_connection = True
+                    return
+                if not self.path.startswith("http://"):
+                    status, headers, body = 400, {}, b"Absolute http:// URLs only"
+                else:
+                    forward = {k: v for k, v in self.headers.items() if k.lower() in ("cookie", "user-agent")}
+                    status, headers, body = proxy.forward(self.path, forward)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = _Server((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info("Fake proxy on %s (source address %s)", self.url, self.source_address or "default")
+        return self
+
+    def stop(self):
+        self.down = True
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP forward proxy")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--source-address", help="Local address to connect from, e.g. 127.0.0.11")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    proxy = FakeProxy(args.source_address, args.latency_ms).serve(port=args.port)
+    print(f"READY {proxy.url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        proxy.stop()
+
+
+if __name__ == "__main__":
+    main()
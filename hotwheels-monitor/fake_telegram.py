@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Telegram Bot API
+Serves getUpdates/setWebhook and records the bot's replies so the bot
+can be benchmarked without talking to api.telegram.org. Optional
+per-chat and global send limits answer with 429 retry_after like the
+real API does. sendPhoto accepts uploads and returns file_ids that later
+sends can reuse, counting both so photo caching can be checked
+"""
+
+import json
+import math
+import time
+import logging
+import threading
+import itertools
+from email import message_from_bytes
+from email.policy import HTTP
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import requests
+
+BOT_INFO = {
+    "id": 1000000001,
+    "is_bot": True,
+    "first_name": "HotWheels Test Bot",
+    "username": "hotwheels_test_bot",
+}
+
+
+class ApiError(Exception):
+    """A Bot API error reply (400 wrong file identifier and the like)"""
+
+    def __init__(self, code, description):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+# Methods that count against Telegram's flood limits
+SEND_METHODS = ("sendMessage", "editMessageText", "sendPhoto")
+
+
+class _Bucket:
+    """Token bucket: `rate` sends per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """0 if a send may go now, else seconds until it may"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeTelegram:
+    """In-process fake of the Bot API endpoints the bot uses"""
+
+    def __init__(self, host="127.0.0.1", port=0, chat_rate=None, global_rate=None):
+        self.server = _Server((host, port), self._make_handler())
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}/bot"
+
+        self.cond = threading.Condition()
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.callback_ids = itertools.count(1)
+        self.calls = []
+        self.listeners = []
+
+        # Flood control; Telegram allows about 1 message/s per chat and 30/s overall
+        self.chat_rate = chat_rate
+        self.global_bucket = _Bucket(global_rate, global_rate) if global_rate else None
+        self.chat_buckets = {}
+        self.limit_lock = threading.Lock()
+        self.throttled = 0
+
+        # Photos: uploads make new file_ids, sends by a known file_id are reuses
+        self.file_ids = set()
+        self.photo_uploads = 0
+        self.photo_reuses = 0
+
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_pool = None
+        self.local = threading.local()
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info("Fake Telegram API listening on %s", self.base_url)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.webhook_pool:
+            self.webhook_pool.shutdown(wait=False)
+
+    # ---------- Update injection ----------
+    def push_update(self, update):
+        """Queue an update for getUpdates, or deliver it to the webhook"""
+        update = dict(update, update_id=next(self.update_ids))
+        if self.webhook_url:
+            self.webhook_pool.submit(self._deliver, update)
+        else:
+            with self.cond:
+                self.updates.append(update)
+                self.cond.notify_all()
+        return update["update_id"]
+
+    def push_text(self, user_id, text):
+        entities = []
+        if text.startswith("/"):
+            entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return self.push_update({"message": {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": _user(user_id),
+            "text": text,
+            "entities": entities,
+        }})
+
+    def push_callback(self, user_id, data, message_id=1):
+        """Simulate the user pressing an inline button with callback_data `data`"""
+        return self.push_update({"callback_query": {
+            "id": str(next(self.callback_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_INFO,
+                "text": "menu",
+            },
+        }})
+
+    def _deliver(self, update):
+        headers = {}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        # Telegram keeps delivery connections open, so reuse one per worker
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        try:
+            self.local.session.post(self.webhook_url, json=update, headers=headers, timeout=30)
+        except Exception as e:
+            logging.warning("Webhook delivery failed: %s", e)
+
+    # ---------- Reply tracking ----------
+    def on_call(self, callback):
+        """Register callback(method, params) invoked for every API call"""
+        self.listeners.append(callback)
+
+    def _record(self, method, params):
+        self.calls.append((time.perf_counter(), method, params))
+        for callback in self.listeners:
+            callback(method, params)
+
+    # ---------- Flood control ----------
+    def retry_after(self, method, params):
+        """Seconds the caller must wait (429) before this call is accepted, else 0"""
+        if method not in SEND_METHODS or not (self.chat_rate or self.global_bucket):
+            return 0
+        with self.limit_lock:
+            wait = 0
+            if self.chat_rate:
+                chat = params.get("chat_id")
+                bucket = self.chat_buckets.get(chat)
+                if bucket is None:
+                    bucket = self.chat_buckets[chat] = _Bucket(self.chat_rate, max(1, self.chat_rate * 3))
+                wait = bucket.take()
+            if not wait and self.global_bucket:
+                wait = self.global_bucket.take()
+            if wait:
+                self.throttled += 1
+            return wait
+
+    # ---------- API methods ----------
+    def _message(self, params):
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": BOT_INFO,
+            "text": params.get("text", ""),
+        }
+
+    def handle(self, method, params):
+        if method == "getMe":
+            return BOT_INFO
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_secret = params.get("secret_token")
+            max_connections = int(params.get("max_connections", 40))
+            self.webhook_pool = ThreadPoolExecutor(max_workers=max_connections)
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            return True
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params)
+        if method == "sendPhoto":
+            return self._send_photo(params)
+        if method in ("answerCallbackQuery", "close", "logOut", "setMyCommands"):
+            return True
+        return None
+
+    def _send_photo(self, params):
+        photo = params.get("photo")
+        with self.limit_lock:
+            if isinstance(photo, bytes):
+                self.photo_uploads += 1
+                file_id = f"fake-photo-{self.photo_uploads}"
+                self.file_ids.add(file_id)
+            elif photo in self.file_ids:
+                self.photo_reuses += 1
+                file_id = photo
+            else:
+                raise ApiError(400, "Bad Request: wrong file identifier/HTTP URL specified")
+        message = self._message(params)
+        message.pop("text")
+        message["caption"] = params.get("caption", "")
+        message["photo"] = [{"file_id": file_id, "file_unique_id": f"u{file_id}", "width": w, "height": w}
+                            for w in (90, 320)]
+        return message
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return list(self.updates[:int(params.get("limit") or 100)])
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                params = _parse_params(self.headers.get("Content-Type", ""), body)
+                wait = fake.retry_after(method, params)
+                try:
+                    result = None if wait else fake.handle(method, params)
+                except ApiError as e:
+                    fake._reply(self, e.code, {"ok": False, "error_code": e.code, "description": e.description})
+                    return
+                if not wait:
+                    fake._record(method, params)
+                if wait:
+                    retry_after = max(1, math.ceil(wait))
+                    payload = {"ok": False, "error_code": 429,
+                               "description": f"Too Many Requests: retry after {retry_after}",
+                               "parameters": {"retry_after": retry_after}}
+                    status = 429
+                elif result is None:
+                    payload = {"ok": False, "error_code": 404, "description": "Not Found"}
+                    status = 404
+                else:
+                    payload = {"ok": True, "result": result}
+                    status = 200
+                fake._reply(self, status, payload)
+
+            do_GET = do_POST
+
+        return Handler
+
+    def _reply(self, handler, status, payload):
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+
+def _parse_params(content_type, body):
+    """Decode JSON, form-encoded or multipart Bot API parameters; uploaded files stay bytes"""
+    if not body:
+        return {}
+    if "application/json" in content_type:
+        return json.loads(body)
+    if "multipart/form-data" in content_type:
+        return _parse_multipart(content_type, body)
+    params = {}
+    for name, values in parse_qs(body.decode("utf-8")).items():
+        try:
+            params[name] = json.loads(values[0])
+        except ValueError:
+            params[name] = values[0]
+    return params
+
+
+def _parse_multipart(content_type, body):
+    message = message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=HTTP)
+    params = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        value = part.get_payload(decode=True)
+        if part.get_filename() is None:
+            value = value.decode("utf-8")
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[name] = value
+    return params
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-rate", type=float, help="Sends per second allowed per chat before 429s")
+    parser.add_argument("--global-rate", type=float, help="Sends per second allowed overall before 429s")
+    args = parser.parse_args()
+    fake = FakeTelegram(port=args.port, chat_rate=args.chat_rate, global_rate=args.global_rate).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
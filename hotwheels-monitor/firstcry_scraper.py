@@ -4,95 +4,215 @@ FirstCry HotWheels Product Scraper
 Scrapes all HotWheels products from FirstCry website
 """
 
+import os
 import requests
-from bs4 import BeautifulSoup
 import json
 import time
 import logging
+import threading
+from urllib.parse import urlsplit
+import metrics
+import profiling
+from hedging import Hedger, HEDGE_BUDGET
+from parsers import parse_listing, parse_product_page, extract_product_info
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# How long a page cached on disk (FIRSTCRY_CACHE) serves other fetches
+LISTING_TTL = 5 * 60
+PRODUCT_TTL = 60
+
+class RateLimiter:
+    """Spaces out requests so at most one starts every `interval` seconds"""
+    
+    def __init__(self, interval=0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+    
+    def wait(self):
+        """Block until the caller may send its request"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+    
+    def try_acquire(self):
+        """Take the next request slot if it is free now, without waiting; False if it isn't"""
+        with self.lock:
+            now = time.monotonic()
+            if self.next_time > now:
+                return False
+            self.next_time = now + self.interval
+            return True
+
+def cached_response(url, body, encoding):
+    """A requests.Response for a body served from the HTTP cache"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = encoding
+    return response
 
 class FirstCryScraper:
-    def __init__(self):
-        self.base_url = "https://www.firstcry.com"
-        self.hotwheels_url = "https://www.firstcry.com/hotwheels/5/0/113"
+    def __init__(self, min_interval=0, parser_pool=None, base_url=None, cache=None, egress=None, hedger=None):
+        # FIRSTCRY_BASE_URL points the scraper at a local simulator (fake_firstcry.py)
+        self.base_url = (base_url or os.getenv("FIRSTCRY_BASE_URL") or "https://www.firstcry.com").rstrip("/")
+        self.hotwheels_url = f"{self.base_url}/hotwheels/5/0/113"
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': USER_AGENT
         })
+        self.rate_limiter = RateLimiter(min_interval)
+        # Optional ProcessPoolExecutor: parsing is CPU-bound and would otherwise hold the GIL
+        self.parser_pool = parser_pool
+        # FIRSTCRY_CACHE=<file> shares fetched pages with every other process using the same file
+        if cache is None and os.getenv("FIRSTCRY_CACHE"):
+            from httpcache import ResponseCache
+            cache = ResponseCache(os.environ["FIRSTCRY_CACHE"], int(os.getenv("FIRSTCRY_CACHE_MB", "64")) * 2**20)
+        self.cache = cache
+        # Optional egress.EgressPool: requests leave through its endpoints, each with its own rate budget
+        self.egress = egress
+        # Timeouts follow each host's latency; slow requests get a duplicate within FIRSTCRY_HEDGE_BUDGET
+        if hedger is None:
+            hedger = Hedger(float(os.getenv("FIRSTCRY_HEDGE_BUDGET", HEDGE_BUDGET)))
+        self.hedger = hedger
+        if hedger.budget.fraction and egress is None and min_interval:
+            # The primary just took the only slot, and a hedge never waits for the next one
+            logging.info("Hedging is on, but with %s s between requests a hedge can only go out once a request "
+                         "has taken that long; expect adaptive timeouts only. Lower delay_between_requests or "
+                         "configure an egress pool to hedge", min_interval)
+    
+    def _parse(self, parse, *args):
+        """Run a parsers.* function, on the parser pool when one is configured"""
+        if self.parser_pool is None:
+            with metrics.PARSE_SECONDS.time(parser=parse.__name__), profiling.span("parse", parser=parse.__name__):
+                return parse(*args)
+        result, seconds = self.parser_pool.submit(metrics.timed_call, parse, *args).result()
+        metrics.PARSE_SECONDS.observe(seconds, parser=parse.__name__)
+        profiling.add("parse", seconds, parser=parse.__name__)
+        return result
+    
+    def _get(self, url, pincode, fresh=False):
+        """GET a FirstCry page for a pincode through the shared session or egress pool, or from the HTTP cache"""
+        if self.cache is not None and not fresh:
+            hit = self._cache_get(url, pincode)
+            metrics.CACHE_REQUESTS.inc(cache="http", result="miss" if hit is None else "hit")
+            if hit is not None:
+                return cached_response(url, *hit)
+        if self.egress is not None:
+            endpoint = self.egress.acquire(pincode)
+        else:
+            self.rate_limiter.wait()
+        host = urlsplit(url).hostname
+        started = time.perf_counter()
+        with profiling.span("fetch", url=url, pincode=pincode) as span:
+            try:
+                # Per-request cookie: the session is shared between threads and pincodes
+                # When profiling, stream so the body download can be timed apart from TTFB
+                cookies, stream = {'FC_PINCODE': str(pincode)}, span is not None
+                if self.egress is not None:
+                    send = lambda timeout: self.egress.get(endpoint, url, pincode, cookies=cookies,
+                                                           timeout=timeout, stream=stream)
+                else:
+                    send = lambda timeout: self.session.get(url, cookies=cookies, timeout=timeout, stream=stream)
+                
+                def hedge():
+                    # A duplicate is a request like any other: only sent if a rate budget has a slot free now,
+                    # through another endpoint of the egress pool when there is one
+                    if self.egress is None:
+                        return send if self.rate_limiter.try_acquire() else None
+                    other = self.egress.pick(pincode, avoid=endpoint)
+                    if not other.limiter.try_acquire():
+                        return None
+                    return lambda timeout: self.egress.get(other, url, pincode, cookies=cookies,
+                                                           timeout=timeout, stream=stream)
+                
+                response = self.hedger.get(host, send, hedge)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                metrics.FETCH_ERRORS.inc(host=host, reason=e.response.status_code)
+                raise
+            except Exception as e:
+                metrics.FETCH_ERRORS.inc(host=host, reason=type(e).__name__)
+                raise
+            if span is not None:
+                headers_at = time.perf_counter()
+                span.phase("ttfb", span.last_end, headers_at)
+                span.args["bytes"] = len(response.content)
+                span.phase("download", headers_at, time.perf_counter())
+        metrics.FETCH_SECONDS.observe(time.perf_counter() - started, host=host)
+        metrics.FETCH_BYTES.inc(len(response.content), host=host)
+        if self.cache is not None:
+            ttl = LISTING_TTL if url.startswith(self.hotwheels_url) else PRODUCT_TTL
+            self._cache_put(url, pincode, response, ttl)
+        return response
+    
+    def _cache_get(self, url, pincode):
+        try:
+            return self.cache.get(url, pincode)
+        except Exception as e:
+            logging.warning("HTTP cache read failed for %s: %s", url, e)
+            return None
+    
+    def _cache_put(self, url, pincode, response, ttl):
+        # A cache that can't be written only costs later fetches, never this one
+        try:
+            self.cache.put(url, pincode, response.content, response.encoding, ttl)
+        except Exception as e:
+            logging.warning("HTTP cache write failed for %s: %s", url, e)
+    
+    def fetch_html(self, url, pincode, fresh=False):
+        """Fetch a page's HTML, or None if the request failed; `fresh` skips the HTTP cache"""
+        try:
+            return self._get(url, pincode, fresh).text
+        except Exception as e:
+            logging.warning("Failed to fetch %s: %s", url, e)
+            return None
+    
+    def fetch_bytes(self, url, pincode):
+        """Fetch a page's raw body, or None if the request failed"""
+        try:
+            return self._get(url, pincode).content
+        except Exception as e:
+            logging.warning("Failed to fetch %s: %s", url, e)
+            return None
+    
+    def listing_url(self, page=1, sort="popularity"):
+        """HotWheels category listing page; sort="new" lists the newest products first"""
+        url = f"{self.hotwheels_url}?sort={sort}&q=ard-hotwheels&ref2=q_ard_hotwheels&asid=53241"
+        return url if page == 1 else f"{url}&page={page}"
+    
+    def fetch_listing(self, pincode, page=1, sort="popularity"):
+        """Products on one listing page, or None if it could not be fetched or parsed"""
+        try:
+            response = self._get(self.listing_url(page, sort), pincode)
+        except Exception as e:
+            logging.warning(f"Failed to fetch listing page {page}: {e}")
+            return None
+        try:
+            return self._parse(parse_listing, response.content, self.base_url)
+        except Exception as e:
+            # Same as a failed fetch: the page tells us nothing, it doesn't mean an empty listing
+            logging.warning(f"Failed to parse listing page {page}: {e}")
+            return None
     
     def search_hotwheels(self, pincode="400001", max_pages=5):
         """Search for HotWheels products on FirstCry"""
         products = []
         
         try:
-            # Set pincode cookie
-            self.session.cookies.set('FC_PINCODE', str(pincode))
-            
-            # Use the actual HotWheels category page
-            base_url = f"{self.hotwheels_url}?sort=popularity&q=ard-hotwheels&ref2=q_ard_hotwheels&asid=53241"
-            
             for page in range(1, max_pages + 1):
                 logging.info(f"Scraping HotWheels page {page}...")
-                
-                # Construct URL with pagination
-                if page == 1:
-                    url = base_url
-                else:
-                    url = f"{base_url}&page={page}"
+                url = self.listing_url(page)
                 
                 try:
-                    response = self.session.get(url, timeout=15)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Look for product containers - try multiple selectors
-                    selectors = [
-                        'div[class*="li_cont"]',
-                        'div[class*="product"]',
-                        'div[class*="item"]',
-                        'div[class*="card"]',
-                        'div[class*="li_"]',
-                        'div[data-testid*="product"]',
-                        'div[class*="grid-item"]'
-                    ]
+                    response = self._get(url, pincode)
                     
-                    product_containers = []
-                    for selector in selectors:
-                        containers = soup.select(selector)
-                        if containers and len(containers) > 1:  # More than 1 to avoid single elements
-                            product_containers = containers
-                            logging.info(f"Found {len(containers)} products with selector: {selector}")
-                            break
-                    
-                    if not product_containers:
-                        # Try to find product links directly
-                        product_links = soup.find_all('a', href=True)
-                        hotwheels_links = []
-                        for link in product_links:
-                            href = link.get('href', '')
-                            text = link.get_text(strip=True).lower()
-                            if ('hot' in text and 'wheels' in text) or '/hotwheels/' in href or '/hot-wheels/' in href:
-                                hotwheels_links.append(link)
-                        
-                        if hotwheels_links:
-                            logging.info(f"Found {len(hotwheels_links)} HotWheels product links")
-                            for i, link in enumerate(hotwheels_links[:20]):  # Limit to 20
-                                product = {
-                                    'id': f"link_{i}",
-                                    'title': link.get_text(strip=True) or f"Hot Wheels Product {i+1}",
-                                    'url': self.base_url + link.get('href', '') if not link.get('href', '').startswith('http') else link.get('href', ''),
-                                    'price': "Price not available",
-                                    'in_stock': True,
-                                    'image_url': ''
-                                }
-                                products.append(product)
-                    else:
-                        for container in product_containers:
-                            product = self._extract_product_info(container)
-                            if product:
-                                products.append(product)
+                    products.extend(self._parse(parse_listing, response.content, self.base_url))
                     
                     # If we found products, break after first page for now
                     if products:
@@ -189,130 +309,13 @@ class FirstCryScraper:
     
     def _extract_product_info(self, container):
         """Extract product information from a product container"""
-        try:
-            # Try multiple selectors for title
-            title_elem = None
-            title_selectors = [
-                'a[class*="li_title"]',
-                'a[class*="title"]',
-                'a[class*="product"]',
-                'h3 a',
-                'h4 a',
-                'a[href*="/hotwheels/"]',
-                'a[href*="/hot-wheels/"]'
-            ]
-            
-            for selector in title_selectors:
-                title_elem = container.select_one(selector)
-                if title_elem:
-                    break
-            
-            if not title_elem:
-                return None
-            
-            title = title_elem.get_text(strip=True)
-            if not title or len(title) < 5:  # Skip if title is too short
-                return None
-                
-            product_url = title_elem.get('href', '')
-            if product_url:
-                if product_url.startswith('http'):
-                    pass  # Already a full URL
-                elif product_url.startswith('/'):
-                    product_url = self.base_url + product_url
-                else:
-                    product_url = self.base_url + '/' + product_url
-            else:
-                product_url = "#"
-            
-            # Product ID from URL
-            product_id = product_url.split('/')[-1] if '/' in product_url else f"prod_{hash(title)}"
-            
-            # Try multiple selectors for price
-            price_elem = None
-            price_selectors = [
-                'span[class*="price"]',
-                'div[class*="price"]',
-                'span[class*="cost"]',
-                'div[class*="cost"]',
-                'span[class*="amount"]',
-                'div[class*="amount"]',
-                '.price',
-                '.cost',
-                '.amount'
-            ]
-            
-            for selector in price_selectors:
-                price_elem = container.select_one(selector)
-                if price_elem and price_elem.get_text(strip=True):
-                    break
-            
-            price = price_elem.get_text(strip=True) if price_elem else "Price not available"
-            
-            # If no price found, try to find any text with ₹ symbol
-            if price == "Price not available":
-                text_content = container.get_text()
-                import re
-                price_match = re.search(r'₹\s*[\d,]+', text_content)
-                if price_match:
-                    price = price_match.group()
-            
-            # Stock status - look for out of stock indicators
-            stock_indicators = [
-                'span[class*="out_of_stock"]',
-                'div[class*="out_of_stock"]',
-                'span[class*="sold_out"]',
-                'div[class*="sold_out"]',
-                'span[class*="unavailable"]',
-                'div[class*="unavailable"]'
-            ]
-            
-            in_stock = True
-            for selector in stock_indicators:
-                if container.select_one(selector):
-                    in_stock = False
-                    break
-            
-            # Image URL
-            img_elem = container.find('img')
-            image_url = ''
-            if img_elem:
-                image_url = img_elem.get('data-original') or img_elem.get('src') or ''
-                if image_url and not image_url.startswith('http'):
-                    image_url = self.base_url + image_url
-            
-            return {
-                'id': product_id,
-                'title': title,
-                'url': product_url,
-                'price': price,
-                'in_stock': in_stock,
-                'image_url': image_url
-            }
-            
-        except Exception as e:
-            logging.warning(f"Error extracting product info: {e}")
-            return None
+        return extract_product_info(container, self.base_url)
     
     def get_product_details(self, product_url, pincode="400001"):
         """Get detailed information about a specific product"""
         try:
-            self.session.cookies.set('FC_PINCODE', str(pincode))
-            response = self.session.get(product_url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Check stock status more accurately
-            page_text = soup.get_text(" ", strip=True).lower()
-            in_stock = not any(phrase in page_text for phrase in [
-                "out of stock", "notify me", "sold out", "currently unavailable"
-            ])
-            
-            return {
-                'in_stock': in_stock,
-                'page_text': page_text[:200] + "..." if len(page_text) > 200 else page_text
-            }
+            response = self._get(product_url, pincode)
+            return self._parse(parse_product_page, response.content)
             
         except Exception as e:
             logging.error(f"Error getting product details: {e}")
@@ -338,4 +341,5 @@ def main():
         print("❌ No products found")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     main()
@@ -0,0 +1,242 @@
+"""
+Hedged requests and adaptive timeouts
+Tracks recent request latencies per host. Each request's timeout follows the
+host's p99 instead of a fixed 15 s, and a request still unanswered at the
+host's p95 gets a duplicate (a hedge); whichever answers first is used. Hedges
+come out of a budget earned per request, so they add at most a few percent
+to the load FirstCry sees, and each one also needs a free slot in the
+caller's rate budget. Attempts race on a small thread pool shared by every
+Hedger.
+
+A hedge never waits for a slot: with one rate limiter spacing requests by more
+than a host's p95 (delay_between_requests defaults to 3 s), the primary has
+just taken the only slot and no hedge is ever sent; only the adaptive timeouts
+apply. Hedges fire with a shorter delay or through an egress pool, where they
+leave through another endpoint.
+
+FIRSTCRY_HEDGE_BUDGET=0.05   # hedges per request (0 keeps adaptive timeouts, no hedging)
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+
+import metrics
+
+# Used until a host has MIN_SAMPLES latencies, and never exceeded
+DEFAULT_TIMEOUT = 15
+MIN_TIMEOUT = 2
+# Timeout = this many times the host's p99
+TIMEOUT_FACTOR = 3
+# Latencies kept per host, how many before percentiles are trusted, and how often they're recomputed
+LATENCY_WINDOW = 500
+MIN_SAMPLES = 20
+RECOMPUTE_EVERY = 10
+# Hedges earned per request, and how many may be saved up
+HEDGE_BUDGET = 0.05
+HEDGE_BURST = 5
+# Threads racing attempts, shared by all Hedgers; a request that finds them all busy goes out unhedged
+HEDGE_WORKERS = 32
+
+
+class LatencyTracker:
+    """Recent latencies per host, with p95 and p99 recomputed every few samples"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}      # host -> deque of seconds
+        self.seen = {}         # host -> samples since the last recompute
+        self.percentiles = {}  # host -> (p95, p99)
+
+    def observe(self, host, seconds):
+        with self.lock:
+            samples = self.samples.get(host)
+            if samples is None:
+                samples = self.samples[host] = deque(maxlen=self.window)
+                metrics.FETCH_TIMEOUT.set_function(lambda: self.timeout(host), host=host)
+            samples.append(seconds)
+            self.seen[host] = self.seen.get(host, 0) + 1
+            if len(samples) < MIN_SAMPLES or (self.seen[host] < RECOMPUTE_EVERY and host in self.percentiles):
+                return
+            self.seen[host] = 0
+            ordered = sorted(samples)
+            self.percentiles[host] = tuple(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+                                           for pct in (95, 99))
+
+    def hedge_after(self, host):
+        """Seconds after which a request to host is slow (its p95), or None while there are too few samples"""
+        known = self.percentiles.get(host)
+        return known[0] if known else None
+
+    def timeout(self, host):
+        known = self.percentiles.get(host)
+        if not known:
+            return DEFAULT_TIMEOUT
+        return min(DEFAULT_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * known[1]))
+
+
+class HedgeBudget:
+    """`fraction` hedges earned per request, at most `burst` saved up"""
+
+    def __init__(self, fraction=HEDGE_BUDGET, burst=HEDGE_BURST):
+        self.fraction = fraction
+        self.burst = burst
+        self.tokens = 1.0 if fraction else 0.0
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.fraction)
+
+    def available(self):
+        return self.tokens >= 1
+
+    def spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def refund(self):
+        """Give back a hedge that was paid for but could not be sent"""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class _Workers:
+    """Fixed pool of threads for attempts; `busy` counts those reserved, so nothing ever queues behind them"""
+
+    def __init__(self, size=HEDGE_WORKERS):
+        self.size = size
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.executor = None
+
+    def reserve(self):
+        with self.lock:
+            if self.busy >= self.size:
+                return False
+            self.busy += 1
+            if self.executor is None:
+                # Only runs that get far enough to hedge pay for importing and starting the pool
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(self.size, thread_name_prefix="fetch-attempt")
+            return True
+
+    def release(self):
+        with self.lock:
+            self.busy -= 1
+
+    def submit(self, fn):
+        """Run fn on a thread reserved beforehand; the reservation ends with it"""
+        def run():
+            try:
+                fn()
+            finally:
+                self.release()
+        self.executor.submit(run)
+
+
+WORKERS = _Workers()
+
+
+class _Race:
+    """Attempts of one request report here; the first success wins and later ones are closed"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = queue.Queue()
+        self.settled = False
+
+    def report(self, kind, response, error):
+        with self.lock:
+            if not self.settled:
+                self.results.put((kind, response, error))
+                return
+        if response is not None:
+            response.close()
+
+    def settle(self):
+        with self.lock:
+            self.settled = True
+            while True:
+                try:
+                    _, response, _ = self.results.get_nowait()
+                except queue.Empty:
+                    return
+                if response is not None:
+                    response.close()
+
+
+class Hedger:
+    """Sends requests with adaptive timeouts, hedging the slow ones within the budget"""
+
+    def __init__(self, budget=HEDGE_BUDGET, tracker=None):
+        self.tracker = tracker or LatencyTracker()
+        self.budget = HedgeBudget(budget)
+
+    def _attempt(self, host, send, timeout):
+        started = time.perf_counter()
+        try:
+            return send(timeout)
+        finally:
+            self.tracker.observe(host, time.perf_counter() - started)
+
+    def _start(self, host, send, timeout, race, kind):
+        """Run one attempt on a worker reserved for it"""
+        def run():
+            try:
+                race.report(kind, self._attempt(host, send, timeout), None)
+            except Exception as e:
+                race.report(kind, None, e)
+        WORKERS.submit(run)
+
+    def _duplicate(self, send, hedge):
+        """The hedge's send function if the hedge budget, a worker and a request slot are all free, else None"""
+        if not self.budget.spend():
+            return None
+        if WORKERS.reserve():
+            duplicate = hedge() if hedge else send
+            if duplicate is not None:
+                return duplicate
+            WORKERS.release()
+        self.budget.refund()
+        return None
+
+    def get(self, host, send, hedge=None):
+        """send(timeout) -> response, hedged once if it is slower than the host's p95
+
+        hedge() returns the send function for the duplicate, or None when the caller's
+        rate budget has no slot for it right now; without it the duplicate reuses send.
+        """
+        timeout = self.tracker.timeout(host)
+        self.budget.earn()
+        hedge_after = self.tracker.hedge_after(host)
+        if hedge_after is None or not self.budget.available() or not WORKERS.reserve():
+            return self._attempt(host, send, timeout)
+
+        race = _Race()
+        self._start(host, send, timeout, race, "primary")
+        attempts = 1
+        try:
+            kind, response, error = race.results.get(timeout=hedge_after)
+        except queue.Empty:
+            duplicate = self._duplicate(send, hedge)
+            if duplicate is not None:
+                self._start(host, duplicate, timeout, race, "hedge")
+                attempts = 2
+            else:
+                metrics.FETCH_HEDGES.inc(host=host, result="no budget")
+            kind, response, error = race.results.get()
+        if error is not None and attempts == 2:
+            # The first one back failed; the other may still succeed
+            kind, response, error = race.results.get()
+        race.settle()
+        if attempts == 2:
+            metrics.FETCH_HEDGES.inc(host=host, result="won" if kind == "hedge" and error is None else "lost")
+        if error is not None:
+            raise error
+        return response
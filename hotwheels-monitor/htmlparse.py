@@ -0,0 +1,199 @@
+"""
+HTML parser backends for parsers.py
+The same handful of operations (parse, CSS select, text, attributes) over
+lxml, which is several times faster, or BeautifulSoup's html.parser, which
+needs nothing compiled. FIRSTCRY_PARSER picks one: auto (lxml when it is
+installed), lxml or bs4.
+"""
+
+import os
+import re
+import logging
+
+BACKENDS = ("lxml", "bs4")
+
+# Text inside these never shows up in bs4's get_text, so the lxml backend skips it too
+HIDDEN_TEXT_TAGS = ("script", "style", "template")
+
+_backend = None
+
+
+class Bs4Backend:
+    """BeautifulSoup with the standard library's html.parser"""
+
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self.BeautifulSoup = BeautifulSoup
+
+    def parse(self, html):
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        return self.BeautifulSoup(html, "html.parser")
+
+    def select(self, node, selector):
+        return node.select(selector)
+
+    def select_one(self, node, selector):
+        return node.select_one(selector)
+
+    def text(self, node, separator="", strip=False):
+        return node.get_text(separator, strip=strip)
+
+    def get(self, node, attr, default=None):
+        return node.get(attr, default)
+
+    def find(self, node, tag):
+        return node.find(tag)
+
+    def links(self, node):
+        return node.find_all("a", href=True)
+
+
+# Selector parts parsers.py uses: tag, .class, [attr], [attr="v"], [attr*="v"], [attr^="v"], [attr$="v"]
+_STEP_RE = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:\.[\w-]+|\[[\w-]+(?:[*^$]?=(?:"[^"]*"|\'[^\']*\'|[^\]]*))?\])*)$')
+_PART_RE = re.compile(r'\.([\w-]+)|\[([\w-]+)(?:([*^$]?=)(?:"([^"]*)"|\'([^\']*)\'|([^\]]*)))?\]')
+
+
+def _xpath_string(value):
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return "concat(" + ", '\"', ".join(f'"{part}"' for part in value.split('"')) + ")"
+
+
+def css_to_xpath(selector):
+    """Descendant-combinator CSS selector -> XPath relative to the context node"""
+    steps = []
+    for step in selector.split():
+        match = _STEP_RE.match(step)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector!r}")
+        tag, parts = match.group(1) or "*", match.group(2)
+        conditions = []
+        for cls, attr, op, dq, sq, bare in _PART_RE.findall(parts):
+            if cls:
+                conditions.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')")
+                continue
+            value = _xpath_string(dq or sq or bare.strip())
+            if not op:
+                conditions.append(f"@{attr}")
+            elif op == "=":
+                conditions.append(f"@{attr} = {value}")
+            elif op == "*=":
+                conditions.append(f"contains(@{attr}, {value})")
+            elif op == "^=":
+                conditions.append(f"starts-with(@{attr}, {value})")
+            else:
+                conditions.append(f"substring(@{attr}, string-length(@{attr}) - string-length({value}) + 1) = {value}")
+        steps.append(tag.lower() + "".join(f"[{c}]" for c in conditions))
+    return ".//" + "//".join(steps)
+
+
+class LxmlBackend:
+    """lxml.html (libxml2) with selectors compiled to XPath once"""
+
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        from lxml import etree
+        self.lxml_html = lxml.html
+        self.etree = etree
+        self.compiled = {}
+        hidden = " or ".join(f"parent::{tag}" for tag in HIDDEN_TEXT_TAGS)
+        self.text_nodes = etree.XPath(f".//text()[not({hidden})]")
+        self.link_nodes = etree.XPath(".//a[@href]")
+        # For text we've decoded ourselves: any encoding the page declares is ignored
+        self.utf8_parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    def parse(self, html):
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        if not html or html.isspace():
+            # Empty or whitespace-only page: bs4 gives an empty soup, so an empty document here
+            return self.lxml_html.document_fromstring("<html></html>")
+        try:
+            return self.lxml_html.document_fromstring(html)
+        except ValueError:
+            # lxml refuses str input with an XML encoding declaration; parse it as the UTF-8 it now is.
+            # Anything lxml still can't parse raises, so the check fails instead of reading as out of stock
+            return self.lxml_html.document_fromstring(html.encode("utf-8"), parser=self.utf8_parser)
+
+    def _xpath(self, selector):
+        compiled = self.compiled.get(selector)
+        if compiled is None:
+            compiled = self.compiled[selector] = self.etree.XPath(css_to_xpath(selector))
+        return compiled
+
+    def select(self, node, selector):
+        return self._xpath(selector)(node)
+
+    def select_one(self, node, selector):
+        found = self._xpath(selector)(node)
+        return found[0] if found else None
+
+    def text(self, node, separator="", strip=False):
+        strings = self.text_nodes(node)
+        if strip:
+            strings = [s for s in (s.strip() for s in strings) if s]
+        return separator.join(strings)
+
+    def get(self, node, attr, default=None):
+        return node.get(attr, default)
+
+    def find(self, node, tag):
+        found = self._xpath(tag)(node)
+        return found[0] if found else None
+
+    def links(self, node):
+        return self.link_nodes(node)
+
+
+def create(name):
+    """A backend by name; 'auto' is lxml when it imports, else bs4"""
+    name = (name or "auto").strip().lower()
+    if name == "auto":
+        try:
+            return LxmlBackend()
+        except ImportError:
+            return Bs4Backend()
+    if name == "lxml":
+        return LxmlBackend()
+    if name == "bs4":
+        return Bs4Backend()
+    raise ValueError(f"Unknown parser backend {name!r} (choose auto, {', '.join(BACKENDS)})")
+
+
+def available():
+    """Names of the backends that import here"""
+    names = []
+    for name in BACKENDS:
+        try:
+            create(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def get_backend():
+    """The process-wide backend, chosen from FIRSTCRY_PARSER on first use"""
+    global _backend
+    if _backend is None:
+        wanted = os.getenv("FIRSTCRY_PARSER", "auto")
+        try:
+            _backend = create(wanted)
+        except ImportError as e:
+            logging.warning(f"Parser backend {wanted} unavailable ({e}), using bs4")
+            _backend = Bs4Backend()
+    return _backend
+
+
+def set_backend(name):
+    """Switch backends (benchmarks, tests); returns the new one"""
+    global _backend
+    _backend = create(name)
+    return _backend
@@ -0,0 +1,160 @@
+"""
+On-disk HTTP response cache
+FirstCry pages keyed by (canonical URL, pincode) in one SQLite file that the
+monitor, the bot and ad-hoc scraper runs share: zlib-compressed bodies, a TTL
+per entry and least-recently-used eviction once the file passes its size
+limit. WAL mode lets any number of processes read while one writes. The
+total body size is kept in a one-row table updated with each write, so a put
+never has to sum the whole table while holding the write lock.
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from watchlist import PRODUCT_ID_RE
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+# Reads refresh an entry's LRU position at most this often, so hits rarely need the write lock
+TOUCH_INTERVAL = 60
+# Evicting goes below the limit by this much so the next few writes don't evict again
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT NOT NULL,
+    pincode TEXT NOT NULL,
+    body BLOB NOT NULL,
+    encoding TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (url, pincode)
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT INTO totals (id, bytes) SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM responses)
+    WHERE NOT EXISTS (SELECT 1 FROM totals);
+"""
+
+
+def canonical_url(url):
+    """Cache key for a URL: product pages by host and product id, other pages with sorted query params"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    match = PRODUCT_ID_RE.search(parts.path)
+    if match:
+        return f"{host}/product/{match.group(1)}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+class ResponseCache:
+    """Compressed page bodies in SQLite, safe to share between threads and processes"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        """This thread's connection; a forked child opens its own"""
+        db = getattr(self.local, "db", None)
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+
+    def get(self, url, pincode, now=None):
+        """(body bytes, encoding) of a fresh entry, or None"""
+        now = now or time.time()
+        key = canonical_url(url)
+        db = self._connect()
+        row = db.execute("SELECT body, encoding, expires_at, accessed_at FROM responses WHERE url = ? AND pincode = ?",
+                         (key, str(pincode))).fetchone()
+        if row is None or row[2] <= now:
+            return None
+        body, encoding, _, accessed_at = row
+        if now - accessed_at > TOUCH_INTERVAL:
+            try:
+                db.execute("UPDATE responses SET accessed_at = ? WHERE url = ? AND pincode = ?", (now, key, str(pincode)))
+            except sqlite3.OperationalError as e:
+                logging.debug("HTTP cache touch skipped: %s", e)  # busy: the LRU position can wait
+        return zlib.decompress(body), encoding
+
+    def put(self, url, pincode, body, encoding=None, ttl=60, now=None):
+        now = now or time.time()
+        compressed = zlib.compress(body, 6)
+        key = canonical_url(url)
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            old = db.execute("SELECT size FROM responses WHERE url = ? AND pincode = ?", (key, str(pincode))).fetchone()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, str(pincode), compressed, encoding, len(compressed), now, now + ttl, now))
+            total = self._add(db, len(compressed) - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _add(self, db, delta):
+        """Adjust the running total of body bytes; returns the new total"""
+        db.execute("UPDATE totals SET bytes = bytes + ? WHERE id = 0", (delta,))
+        return db.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def _evict(self, db, now):
+        """Drop expired entries, then the least recently used, until bodies are back under max_bytes"""
+        db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        # Rare (EVICT_TO leaves headroom), so recount here: also corrects any drift in the running total
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        db.execute("UPDATE totals SET bytes = ? WHERE id = 0", (total,))
+        excess = total - self.max_bytes * EVICT_TO
+        if excess <= 0:
+            return
+        victims, freed = [], 0
+        for url, pincode, size in db.execute("SELECT url, pincode, size FROM responses ORDER BY accessed_at"):
+            victims.append((url, pincode))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE url = ? AND pincode = ?", victims)
+        self._add(db, -freed)
+        logging.info("HTTP cache: evicted %d entries (%d KiB)", len(victims), freed // 1024)
+
+    def stats(self):
+        db = self._connect()
+        entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        size = db.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+        return {"entries": entries, "bytes": size}
+
+    def clear(self):
+        """Drop every entry; returns how many there were"""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            dropped = db.execute("DELETE FROM responses").rowcount
+            db.execute("UPDATE totals SET bytes = 0 WHERE id = 0")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return dropped
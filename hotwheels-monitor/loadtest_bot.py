@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Load test of the Telegram bot's browse flow
+Simulates many users clicking browse → pincode → page → filter, typing a
+search, then product → add against the fake Bot API and the FirstCry
+simulator, and reports handler latency per step, upstream scrapes, photo
+downloads and uploads, 429s and bot memory
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+
+import requests
+
+from bench_webhook import start_bot, stop_bot
+from fake_telegram import FakeTelegram
+from loadtest_monitor import start_simulator, percentile
+
+LOADTEST_TOKEN = "123456:LOADTEST"
+PINCODES = ["400001", "110001", "560001", "700001", "600001"]
+
+# (step, what the user sends, API method + text that marks the step as answered)
+FLOW = [
+    ("start", "/start", "sendMessage", "Welcome"),
+    ("browse", "browse", "editMessageText", "Select your pincode"),
+    ("pincode", "pincode_{pincode}", "editMessageText", "HotWheels Products"),
+    ("page", "page_1", "editMessageText", "Page 2"),
+    ("filter", "filter_stock", "editMessageText", "match your filters"),
+    ("search", "sim car {product:05d} die cast", "sendMessage", "results for"),
+    ("product", "product_{product}", "editMessageText", "Price:"),
+    ("add", "add_to_watchlist_{product}", "editMessageText", "Price:"),
+]
+
+
+def rss_mib():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+async def run_load(args, sim_url):
+    fake = FakeTelegram(chat_rate=args.chat_rate, global_rate=args.global_rate).start()
+    # Point the bot's scraper at the simulator before it is constructed
+    os.environ["FIRSTCRY_BASE_URL"] = sim_url
+    from telegram_bot import HotWheelsBot
+    bot = HotWheelsBot()
+    bot.bot_token = LOADTEST_TOKEN
+    application = bot.build_application(base_url=fake.base_url, concurrent_updates=args.concurrent_updates)
+
+    loop = asyncio.get_running_loop()
+    waiters = {}  # chat id -> (method, marker, future)
+
+    def on_call(method, params):
+        chat_id = params.get("chat_id")
+        waiter = waiters.get(chat_id)
+        if waiter and method == waiter[0] and waiter[1] in params.get("text", ""):
+            del waiters[chat_id]
+            loop.call_soon_threadsafe(lambda: waiter[2].done() or waiter[2].set_result(None))
+
+    fake.on_call(on_call)
+    rss_before = rss_mib()
+    scrapes_before = requests.get(f"{sim_url}/__sim/stats", timeout=5).json()
+    await start_bot(application, "polling", 40)
+
+    latencies = {step: [] for step, *_ in FLOW}
+    failures = {step: 0 for step, *_ in FLOW}
+    active = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(1)
+
+    async def user(user_id):
+        choice = {"pincode": rng.choice(PINCODES[:args.pincodes]), "product": rng.randrange(10)}
+        async with active:
+            for step, send, method, marker in FLOW:
+                future = loop.create_future()
+                waiters[user_id] = (method, marker, future)
+                started = time.perf_counter()
+                if send.startswith("/") or " " in send:
+                    fake.push_text(user_id, send.format(**choice))
+                else:
+                    fake.push_callback(user_id, send.format(**choice))
+                try:
+                    await asyncio.wait_for(future, timeout=args.step_timeout)
+                except asyncio.TimeoutError:
+                    waiters.pop(user_id, None)
+                    failures[step] += 1
+                    return  # the rest of the flow depends on this step
+                latencies[step].append(time.perf_counter() - started)
+                if args.think_ms:
+                    await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(500_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    scrapes = requests.get(f"{sim_url}/__sim/stats", timeout=5).json()
+    rss_after = rss_mib()
+    await stop_bot(application)
+    fake.stop()
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "failures": failures,
+        "listing_scrapes": scrapes["listing"] - scrapes_before["listing"],
+        "product_scrapes": scrapes["product"] - scrapes_before["product"],
+        "image_downloads": scrapes["image"] - scrapes_before["image"],
+        "photo_uploads": fake.photo_uploads,
+        "photo_reuses": fake.photo_reuses,
+        "throttled": fake.throttled,
+        "rss_before": rss_before,
+        "rss_after": rss_after,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "cached_listings": len(bot.products_cache),
+        "user_states": len(bot.user_states),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many users browsing the bot")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Users mid-flow at the same time")
+    parser.add_argument("--concurrent-updates", type=int, default=64, help="Bot's concurrent update handling")
+    parser.add_argument("--pincodes", type=int, default=3, help="Distinct pincodes users pick from")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a user's clicks")
+    parser.add_argument("--step-timeout", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, help="Fake API per-chat sends/s before 429 (Telegram: ~1)")
+    parser.add_argument("--global-rate", type=float, help="Fake API overall sends/s before 429 (Telegram: ~30)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Simulated FirstCry latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--in-stock-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger().setLevel(logging.ERROR)
+
+    sim, sim_url = start_simulator(args, 200)
+    workdir = tempfile.mkdtemp(prefix="hotwheels-loadtest-")
+    os.chdir(workdir)  # the bot writes config.yaml to the working directory
+    try:
+        r = asyncio.run(run_load(args, sim_url))
+    finally:
+        sim.terminate()
+        sim.wait()
+
+    completed = len(r["latencies"]["add"])
+    print(f"{args.users} users, {args.concurrency} concurrent, bot concurrent_updates={args.concurrent_updates}; "
+          f"{completed} finished the flow in {r['elapsed']:.1f}s")
+    print(f"{'step':<10}{'done':>7}{'failed':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for step, *_ in FLOW:
+        values = r["latencies"][step]
+        p50 = f"{statistics.median(values) * 1000:.1f}" if values else "-"
+        p99 = f"{percentile(values, 99) * 1000:.1f}" if values else "-"
+        print(f"{step:<10}{len(values):>7}{r['failures'][step]:>8}{p50:>10}{p99:>10}")
+    print(f"Upstream scrapes: {r['listing_scrapes']} listing, {r['product_scrapes']} product pages")
+    print(f"Product photos: {r['image_downloads']} image downloads, {r['photo_uploads']} uploads, "
+          f"{r['photo_reuses']} sent by cached file_id")
+    print(f"Bot API 429s: {r['throttled']}")
+    print(f"Memory: RSS {r['rss_before']:.0f} → {r['rss_after']:.0f} MiB (peak {r['peak_rss']:.0f} MiB); "
+          f"{r['cached_listings']} cached listings, {r['user_states']} user states")
+    if any(r["failures"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the stock monitor
+Starts fake_firstcry.py in a subprocess and the fake Bot API in-process,
+drives run_cycle with synthetic watchlists of increasing size and reports
+cycle time, requests/s, CPU, memory and alert latency
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import statistics
+import subprocess
+import threading
+
+import requests
+
+import monitor
+from fake_telegram import FakeTelegram
+from pipeline import FetchParsePipeline
+from firstcry_scraper import FirstCryScraper
+from watchlist import canonical_key
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOADTEST_TOKEN = "123456:LOADTEST"
+OWNER_CHAT = "1000"
+PINCODES = ["400001", "110001", "560001", "600001", "700001", "500001", "380001", "411001"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def start_simulator(args, products):
+    """Run the simulator out of process so its CPU and memory aren't charged to the monitor"""
+    cmd = [sys.executable, os.path.join(HERE, "fake_firstcry.py"), "--port", "0",
+           "--products", str(products), "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+           "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+           "--in-stock-ratio", str(args.in_stock_ratio)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("READY "):
+        proc.kill()
+        sys.exit("❌ FirstCry simulator failed to start")
+    return proc, line.split()[1]
+
+
+def build_watchlist(sim_url, entries, pincodes):
+    """entries watchlist rows spread over len(pincodes) pincodes per product"""
+    products = []
+    for i in range(entries):
+        n = i // len(pincodes)
+        products.append({
+            "id": f"load{i}",
+            "title": f"Hot Wheels Sim Car {n:05d}",
+            "url": f"{sim_url}/hot-wheels/hot-wheels-sim-car-{n:05d}/{20000000 + n}/product-detail",
+            "pincode": pincodes[i % len(pincodes)],
+        })
+    return {"products": products, "delay_between_requests": 0}
+
+
+def cpu_seconds():
+    """CPU used by this process and its live children (parser processes)"""
+    total = time.process_time()
+    try:
+        import psutil
+        for child in psutil.Process().children():
+            times = child.cpu_times()
+            total += times.user + times.system
+    except Exception:
+        pass
+    return total
+
+
+def restock_during(sim_url, pids, duration, stop):
+    """Restock the given products spread evenly over roughly `duration` seconds"""
+    gap = duration / max(1, len(pids))
+    for pid in pids:
+        if stop.wait(gap):
+            return
+        requests.post(f"{sim_url}/__sim/stock", params={"pid": pid, "in_stock": "1"}, timeout=5)
+
+
+def run_size(args, sim_url, fake, entries):
+    cfg = build_watchlist(sim_url, entries, PINCODES[:args.pincodes])
+    channels = {"telegram_bot": LOADTEST_TOKEN, "telegram_chat": OWNER_CHAT, "smtp": None, "whatsapp": None}
+    scraper = FirstCryScraper(min_interval=args.delay, base_url=sim_url)
+    state = {}
+    detected = {}    # alert message -> when the monitor saw the restock
+    delivered = {}   # alert message -> when the fake Bot API received it
+
+    def on_alert(product, subject, message, subscribers, detected_at):
+        detected[message] = (time.time(), canonical_key(product["url"]))
+        monitor.notify_all(channels, subject, message, subscribers)
+
+    def on_call(method, params):
+        if method == "sendMessage":
+            delivered.setdefault(params.get("text"), time.time())
+    fake.listeners[:] = [on_call]
+
+    pipeline = FetchParsePipeline(scraper, fetchers=args.fetchers, parsers=args.parsers) if args.fetchers > 1 else None
+    if pipeline:
+        pipeline.__enter__()
+    try:
+        # Warm-up cycle: establishes the baseline stock state, nothing is "restocked" yet
+        started = time.perf_counter()
+        monitor.run_cycle(cfg, state, scraper, lambda *a: None, default_chat=OWNER_CHAT, pipeline=pipeline,
+                          listings=args.listings)
+        warmup = time.perf_counter() - started
+        detected.clear()
+
+        out_of_stock = sorted({int(key.split("_")[0]) for key, record in state.items() if not record["in_stock"]})
+        pids = random.Random(entries).sample(out_of_stock, min(args.restocks, len(out_of_stock)))
+
+        cycles = []
+        events_since = time.time()
+        requests_before = requests.get(f"{sim_url}/__sim/stats", timeout=5).json()
+        for cycle in range(args.cycles):
+            stop = threading.Event()
+            restocker = None
+            if cycle == 0 and pids:
+                # Restock during the first measured cycle; late restocks are caught by the next one
+                restocker = threading.Thread(target=restock_during, args=(sim_url, pids, warmup, stop), daemon=True)
+                restocker.start()
+            cpu_before = cpu_seconds()
+            started = time.perf_counter()
+            results = monitor.run_cycle(cfg, state, scraper, on_alert, default_chat=OWNER_CHAT, pipeline=pipeline,
+                                        listings=args.listings)
+            cycles.append((time.perf_counter() - started, cpu_seconds() - cpu_before, len(results)))
+            if restocker:
+                stop.set()
+                restocker.join()
+        stats = requests.get(f"{sim_url}/__sim/stats", timeout=5).json()
+        events = requests.get(f"{sim_url}/__sim/events", params={"since": events_since}, timeout=5).json()
+    finally:
+        if pipeline:
+            pipeline.__exit__(None, None, None)
+
+    restocked_at = {}
+    for event in events:
+        restocked_at[str(event["pid"])] = event["at"]
+    notify_latency, end_to_end = [], []
+    for message, (seen, product_key) in detected.items():
+        if message in delivered:
+            notify_latency.append(delivered[message] - seen)
+            if product_key in restocked_at:
+                end_to_end.append(delivered[message] - restocked_at[product_key])
+
+    wall = sum(c[0] for c in cycles)
+    made = stats["requests"] - requests_before["requests"]
+    return {
+        "entries": entries,
+        "checks": cycles[-1][2],
+        "warmup_s": warmup,
+        "cycle_s": statistics.mean(c[0] for c in cycles),
+        "requests": made,
+        "req_per_s": made / wall if wall else 0,
+        "throttled": stats["throttled"] - requests_before["throttled"],
+        "errors": stats["errors"] - requests_before["errors"],
+        "cpu_pct": 100 * sum(c[1] for c in cycles) / wall if wall else 0,
+        "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "restocks": len(pids),
+        "alerts": len(detected),
+        "delivered": len(notify_latency),
+        "notify_p50_ms": percentile(notify_latency, 50) * 1000 if notify_latency else None,
+        "notify_p99_ms": percentile(notify_latency, 99) * 1000 if notify_latency else None,
+        "restock_to_alert_p50_s": percentile(end_to_end, 50) if end_to_end else None,
+        "restock_to_alert_max_s": max(end_to_end) if end_to_end else None,
+    }
+
+
+def fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end monitor load test against a local FirstCry simulator")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated watchlist sizes (up to 50000)")
+    parser.add_argument("--pincodes", type=int, default=5, help="Pincodes per product (max %d)" % len(PINCODES))
+    parser.add_argument("--cycles", type=int, default=2, help="Measured cycles per size after the warm-up cycle")
+    parser.add_argument("--restocks", type=int, default=10, help="Products restocked during the first measured cycle")
+    parser.add_argument("--fetchers", type=int, default=1, help="Concurrent fetchers (>1 uses the fetch/parse pipeline)")
+    parser.add_argument("--parsers", type=int, help="Parser processes for the pipeline")
+    parser.add_argument("--listings", action="store_true", help="Answer checks from listing pages first (monitor --listings)")
+    parser.add_argument("--delay", type=float, default=0, help="Scraper delay between requests (seconds)")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--in-stock-ratio", type=float, default=0.5)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Failed fetches are counted in the report; don't log each one
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    args.pincodes = max(1, min(args.pincodes, len(PINCODES)))
+    sim, sim_url = start_simulator(args, max(sizes) // args.pincodes + 1)
+    fake = FakeTelegram().start()
+    monitor.TELEGRAM_API_URL = fake.base_url[:-len("/bot")]
+    print(f"FirstCry simulator {sim_url}, latency {args.latency_ms}±{args.jitter_ms}ms, "
+          f"errors {args.error_rate:.0%}, 429s {args.throttle_rate:.0%}, fetchers {args.fetchers}"
+          f"{', listings first' if args.listings else ''}")
+
+    rows = []
+    try:
+        print(f"{'entries':>8}{'checks':>8}{'cycle s':>9}{'requests':>9}{'req/s':>8}{'429':>6}{'5xx':>6}{'CPU %':>7}"
+              f"{'RSS MiB':>9}{'restocks':>9}{'alerts':>7}{'notify p50/p99 ms':>19}{'restock→alert p50/max s':>25}")
+        for entries in sizes:
+            row = run_size(args, sim_url, fake, entries)
+            rows.append(row)
+            print(f"{row['entries']:>8}{row['checks']:>8}{row['cycle_s']:>9.2f}{row['requests'] / args.cycles:>9.0f}{row['req_per_s']:>8.0f}"
+                  f"{row['throttled']:>6}{row['errors']:>6}{row['cpu_pct']:>7.0f}{row['max_rss_mib']:>9.0f}"
+                  f"{row['restocks']:>9}{row['delivered']:>7}"
+                  f"{fmt(row['notify_p50_ms'], '.1f'):>10}/{fmt(row['notify_p99_ms'], '<8.1f')}"
+                  f"{fmt(row['restock_to_alert_p50_s'], '.2f'):>16}/{fmt(row['restock_to_alert_max_s'], '.2f')}", flush=True)
+    finally:
+        fake.stop()
+        sim.terminate()
+        sim.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Metrics
+Counters, gauges and histograms shared by the monitor, scraper and bot.
+Served in Prometheus text format on a local port (/metrics, /metrics.json)
+and dumpable to a JSON file at the end of a run
+"""
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        """(label values, value) pairs"""
+        with self.lock:
+            return list(self.values.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        """Read the value from fn() whenever metrics are collected"""
+        with self.lock:
+            self.functions[self._key(labels)] = fn
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception as e:
+                logging.debug("Gauge %s callback failed: %s", self.name, e)
+        return list(values.items())
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            else:
+                entry["counts"][-1] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            return [(key, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]})
+                    for key, v in self.values.items()]
+
+
+# ---------- Scraper ----------
+FETCH_SECONDS = Histogram("hotwheels_fetch_seconds", "Time to fetch a page, by host", ["host"])
+FETCH_BYTES = Counter("hotwheels_fetch_bytes_total", "Response bytes downloaded, by host", ["host"])
+FETCH_TIMEOUT = Gauge("hotwheels_fetch_timeout_seconds", "Current adaptive request timeout, by host", ["host"])
+FETCH_HEDGES = Counter("hotwheels_fetch_hedges_total", "Slow requests by host and hedge outcome (won, lost, no budget)", ["host", "result"])
+FETCH_ERRORS = Counter("hotwheels_fetch_errors_total", "Failed fetches by host and reason (HTTP status or exception)", ["host", "reason"])
+PARSE_SECONDS = Histogram("hotwheels_parse_seconds", "Time spent parsing a page, by parser", ["parser"],
+                          buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+CACHE_REQUESTS = Counter("hotwheels_cache_requests_total", "Cache lookups by cache and result (hit, miss, joined)", ["cache", "result"])
+QUEUE_DEPTH = Gauge("hotwheels_queue_depth", "Items waiting in a queue", ["queue"])
+EGRESS_REQUESTS = Counter("hotwheels_egress_requests_total", "Requests per egress endpoint by result (ok, failed, throttled, error)", ["endpoint", "result"])
+EGRESS_EJECTIONS = Counter("hotwheels_egress_ejections_total", "Times an egress endpoint was taken out of rotation", ["endpoint"])
+EGRESS_HEALTH = Gauge("hotwheels_egress_health", "Egress endpoint health score (1 = every recent request succeeded)", ["endpoint"])
+
+# ---------- Monitor ----------
+CYCLE_SECONDS = Histogram("hotwheels_cycle_seconds", "Duration of a monitoring cycle",
+                          buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+CYCLE_REQUESTS = Gauge("hotwheels_cycle_requests", "Product pages requested in the last cycle")
+CYCLE_FAILURES = Gauge("hotwheels_cycle_failures", "Product pages that could not be fetched or parsed in the last cycle")
+CYCLE_LISTING_RESOLVED = Gauge("hotwheels_cycle_listing_resolved", "Checks answered from listing pages in the last cycle")
+CYCLE_DEFERRED = Gauge("hotwheels_cycle_deferred", "Checks left for the next cycle when a --deadline run stopped early")
+CYCLE_ZONE_PROPAGATED = Gauge("hotwheels_cycle_zone_propagated", "Checks answered by another pincode of the same zone in the last cycle")
+ZONE_REPROBES = Counter("hotwheels_zone_reprobes_total", "Zone members checked themselves to confirm the zone still holds")
+ZONE_MISPREDICTIONS = Counter("hotwheels_zone_mispredictions_total", "Re-probed zone members whose stock differed from their zone's")
+RESTOCKS = Counter("hotwheels_restocks_total", "Restocks detected")
+
+# ---------- Notifications ----------
+NOTIFY_SECONDS = Histogram("hotwheels_notify_seconds", "Time to deliver one notification, by channel", ["channel"])
+NOTIFY_FAILURES = Counter("hotwheels_notify_failures_total", "Notifications that failed, by channel", ["channel"])
+DETECTION_SECONDS = Histogram("hotwheels_detection_to_alert_seconds",
+                              "From a cycle seeing a product in stock to its alert being delivered")
+
+# ---------- Bot ----------
+HANDLER_SECONDS = Histogram("hotwheels_bot_handler_seconds", "Bot callback handling time, by action", ["action"])
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in metric.samples():
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(metric.labels, key)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric.buckets) + ["+Inf"], value["counts"]):
+                cumulative += count
+                lines.append(f"{metric.name}_bucket{_format_labels(metric.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labels, key)} {value['sum']}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labels, key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """All metrics as a JSON-serialisable dict"""
+    data = {}
+    for metric in REGISTRY:
+        samples = []
+        for key, value in metric.samples():
+            sample = {"labels": dict(zip(metric.labels, key))}
+            if metric.kind == "histogram":
+                sample.update(count=value["count"], sum=value["sum"],
+                              mean=value["sum"] / value["count"] if value["count"] else None,
+                              buckets=dict(zip([str(b) for b in metric.buckets] + ["+Inf"], value["counts"])))
+            else:
+                sample["value"] = value
+            samples.append(sample)
+        data[metric.name] = {"type": metric.kind, "help": metric.help, "samples": samples}
+    return data
+
+
+def dump_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def timed_call(fn, *args):
+    """Run fn(*args) and return (result, seconds); picklable for process pools"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus) and /metrics.json from a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = json.dumps(snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Metrics on http://%s:%s/metrics", host, server.server_address[1])
+    return server
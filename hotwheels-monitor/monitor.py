@@ -1,8 +1,9 @@
-import requests, yaml, json, os, time, logging, sys, argparse
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+import requests, yaml, json, os, time, math, logging, sys, argparse, socket, signal, itertools, threading
+import metrics
+import profiling
+from firstcry_scraper import FirstCryScraper, RateLimiter
+from parsers import check_stock, listing_stock_known
+from watchlist import SubscriptionIndex, canonical_key
 
 CONFIG_FILE = "config.yaml"
 STATE_FILE = "state.json"
@@ -24,24 +25,156 @@ def load_state():
     return {}
 
 def save_state(state):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
+    # Write then rename, so a run killed mid-save keeps the previous state
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+def open_watchlist(cfg):
+    """The SQLite watchlist store when config.yaml names one (watchlist_db), else None for its products list"""
+    if not cfg.get("watchlist_db"):
+        return None
+    from watchstore import open_store
+    return open_store(cfg)
+
+def watched_pairs(cfg, default_chat=None):
+    """(pair, entry, subscribers) once per watched (product, pincode); streamed page by page from a store"""
+    store = open_watchlist(cfg)
+    if store is not None:
+        return store.pairs(default_chat)
+    return SubscriptionIndex.from_products(cfg.get("products") or [], default_chat).pairs()
+
+def product_pairs(cfg, url, pincode=None, default_chat=None):
+    """watched_pairs() for one product (or one product and pincode), looked up rather than scanned"""
+    store = open_watchlist(cfg)
+    if store is not None:
+        return store.pairs_for(url, pincode, default_chat)
+    return SubscriptionIndex.from_products(cfg.get("products") or [], default_chat).pairs_for(url, pincode)
+
+def compact_state(state, pairs):
+    """Drop records of products no longer watched; keep legacy keys until they are migrated"""
+    keep = set()
+    for (product_key, pincode), product, _ in pairs:
+        key = f"{product_key}_{pincode}"
+        keep.add(key)
+        if key not in state:
+            keep.add(f"{product.get('id')}_{pincode}")
+    stale = [key for key in state if key not in keep]
+    for key in stale:
+        del state[key]
+    if stale:
+        logging.info("Compacted state: dropped %d stale records", len(stale))
+    return len(stale)
 
 # ---------- Notifications ----------
+# Overridable so load tests can point alerts at a fake Bot API (fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
 def send_telegram(bot_token, chat_id, message):
     if not bot_token or not chat_id:
         logging.warning("Telegram not configured")
         return False
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        response = requests.post(url, json={"chat_id": chat_id, "text": message}, timeout=10)
-        response.raise_for_status()
+        url = f"{TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
+        with metrics.NOTIFY_SECONDS.time(channel="telegram"):
+            response = requests.post(url, json={"chat_id": chat_id, "text": message}, timeout=10)
+            response.raise_for_status()
         logging.info("Telegram notification sent successfully")
         return True
     except Exception as e:
+        metrics.NOTIFY_FAILURES.inc(channel="telegram")
         logging.error("Failed to send Telegram notification: %s", e)
         return False
 
+# Telegram allows ~30 messages/second per bot across all chats
+TELEGRAM_BATCH_INTERVAL = 1 / 25
+
+# Longest text Telegram accepts as a photo caption
+TELEGRAM_CAPTION_LIMIT = 1024
+
+def _post_telegram(session, url, payload, limiter, attempts=3, files=None):
+    """POST to the Bot API, waiting out 429 retry_after; the result, or None if still throttled"""
+    for _ in range(attempts):
+        limiter.wait()
+        if files:
+            response = session.post(url, data=payload, files=files, timeout=30)
+        else:
+            response = session.post(url, json=payload, timeout=10)
+        if response.status_code != 429:
+            response.raise_for_status()
+            return response.json().get("result", True)
+        time.sleep(response.json().get("parameters", {}).get("retry_after", 1))
+    return None
+
+def _send_photo(session, api, bot_token, chat_id, caption, image_url, limiter, photos, images):
+    """sendPhoto by cached file_id, else upload the image; False if the alert should go out as text"""
+    from photos import fetch_image, largest_file_id
+    file_id = photos.get(bot_token, image_url)
+    payload = {"chat_id": chat_id, "caption": caption}
+    try:
+        if file_id:
+            return _post_telegram(session, f"{api}/sendPhoto", dict(payload, photo=file_id), limiter)
+    except requests.HTTPError as e:
+        if e.response.status_code != 400:
+            raise
+        logging.warning("Telegram rejected the cached photo for %s, uploading it again", image_url)
+        photos.forget(bot_token, image_url)
+    # Downloaded at most once per alert, however many chats it goes to
+    if image_url not in images:
+        images[image_url] = fetch_image(image_url, session)
+    if images[image_url] is None:
+        return False
+    try:
+        sent = _post_telegram(session, f"{api}/sendPhoto", payload, limiter,
+                              files={"photo": ("photo.jpg", images[image_url])})
+    except requests.HTTPError as e:
+        if e.response.status_code != 400:
+            raise
+        logging.warning("Telegram rejected the photo at %s: %s", image_url, e)
+        return False
+    file_id = largest_file_id(sent) if isinstance(sent, dict) else None
+    if file_id:
+        photos.put(bot_token, image_url, file_id)
+    return sent
+
+def send_telegram_batch(bot_token, chat_ids, message, image_url=None):
+    """Fan one message out to many chats over a single connection; returns chats that failed
+
+    With an image_url the message is the caption of the product photo, uploaded on first
+    use and sent by its cached Telegram file_id after that.
+    """
+    if not bot_token or not chat_ids:
+        return list(chat_ids or [])
+    api = f"{TELEGRAM_API_URL}/bot{bot_token}"
+    limiter = RateLimiter(TELEGRAM_BATCH_INTERVAL)
+    photos, images = None, {}
+    if image_url and len(message) <= TELEGRAM_CAPTION_LIMIT:
+        from photos import PhotoCache
+        photos = PhotoCache()
+    failed = []
+    with requests.Session() as session:
+        for chat_id in chat_ids:
+            started = time.perf_counter()
+            try:
+                sent = False
+                if photos is not None:
+                    sent = _send_photo(session, api, bot_token, chat_id, message, image_url, limiter, photos, images)
+                if sent is False:
+                    sent = _post_telegram(session, f"{api}/sendMessage", {"chat_id": chat_id, "text": message}, limiter)
+                if sent is not None:
+                    metrics.NOTIFY_SECONDS.observe(time.perf_counter() - started, channel="telegram")
+                else:
+                    logging.error("Telegram kept throttling chat %s, giving up", chat_id)
+                    failed.append(chat_id)
+            except Exception as e:
+                logging.error("Failed to send Telegram notification to %s: %s", chat_id, e)
+                failed.append(chat_id)
+    for _ in failed:
+        metrics.NOTIFY_FAILURES.inc(channel="telegram")
+    logging.info("Telegram alert fanned out to %d/%d chats", len(chat_ids) - len(failed), len(chat_ids))
+    return failed
+
 def send_email(cfg, subject, body):
     if not cfg or not cfg.get("host"):
         logging.warning("Email not configured")
@@ -54,14 +187,16 @@ def send_email(cfg, subject, body):
         msg["To"] = ",".join(cfg["to_emails"])
         msg["Subject"] = subject
         msg.set_content(body)
-        with smtplib.SMTP(cfg["host"], cfg["port"]) as server:
-            if cfg.get("use_tls", True):
-                server.starttls()
-            server.login(cfg["username"], cfg["password"])
-            server.send_message(msg)
+        with metrics.NOTIFY_SECONDS.time(channel="email"):
+            with smtplib.SMTP(cfg["host"], cfg["port"]) as server:
+                if cfg.get("use_tls", True):
+                    server.starttls()
+                server.login(cfg["username"], cfg["password"])
+                server.send_message(msg)
         logging.info("Email notification sent successfully")
         return True
     except Exception as e:
+        metrics.NOTIFY_FAILURES.inc(channel="email")
         logging.error("Failed to send email notification: %s", e)
         return False
 
@@ -72,53 +207,33 @@ def send_whatsapp(cfg, message):
     try:
         from twilio.rest import Client
         client = Client(cfg["account_sid"], cfg["auth_token"])
-        message_obj = client.messages.create(
-            body=message,
-            from_=cfg["from_number"],
-            to=cfg["to_number"]
-        )
+        with metrics.NOTIFY_SECONDS.time(channel="whatsapp"):
+            message_obj = client.messages.create(
+                body=message,
+                from_=cfg["from_number"],
+                to=cfg["to_number"]
+            )
         logging.info("WhatsApp notification sent successfully: %s", message_obj.sid)
         return True
     except Exception as e:
+        metrics.NOTIFY_FAILURES.inc(channel="whatsapp")
         logging.error("Failed to send WhatsApp notification: %s", e)
         return False
 
-# ---------- Scraper ----------
-def fetch_html(url, pincode):
-    try:
-        cookies = {"FC_PINCODE": str(pincode)}
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, cookies=cookies, timeout=15)
-        r.raise_for_status()
-        return r.text
-    except Exception as e:
-        logging.warning("Failed to fetch %s: %s", url, e)
-        return None
-
-def check_stock(html):
-    soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text(" ", strip=True).lower()
-    if "out of stock" in text or "notify me" in text or "sold out" in text:
-        return False
-    if "add to cart" in text or "buy now" in text or "add to bag" in text:
-        return True
-    return False
-
-# ---------- Monitor ----------
-def run_monitor(test_mode=False):
-    cfg = load_yaml()
-    state = load_state()
-
-    # Load environment variables
+def load_channels(cfg):
+    """Collect notification channel settings from the environment and config"""
+    from dotenv import load_dotenv
     load_dotenv()
+    channels = {}
 
     # Telegram configuration
-    telegram_bot = os.getenv("TELEGRAM_BOT_TOKEN") or (cfg.get("telegram") or {}).get("bot_token")
-    telegram_chat = os.getenv("TELEGRAM_CHAT_ID") or (cfg.get("telegram") or {}).get("chat_id")
+    channels["telegram_bot"] = os.getenv("TELEGRAM_BOT_TOKEN") or (cfg.get("telegram") or {}).get("bot_token")
+    channels["telegram_chat"] = os.getenv("TELEGRAM_CHAT_ID") or (cfg.get("telegram") or {}).get("chat_id")
 
     # Email configuration
-    smtp_cfg = None
+    channels["smtp"] = None
     if os.getenv("SMTP_HOST"):
-        smtp_cfg = {
+        channels["smtp"] = {
             "host": os.getenv("SMTP_HOST"),
             "port": int(os.getenv("SMTP_PORT", "587")),
             "username": os.getenv("SMTP_USERNAME"),
@@ -128,19 +243,329 @@ def run_monitor(test_mode=False):
             "use_tls": os.getenv("SMTP_USE_TLS", "true").lower() == "true"
         }
     elif cfg.get("smtp"):
-        smtp_cfg = cfg["smtp"]
+        channels["smtp"] = cfg["smtp"]
 
     # WhatsApp configuration
-    whatsapp_cfg = None
+    channels["whatsapp"] = None
     if os.getenv("TWILIO_ACCOUNT_SID"):
-        whatsapp_cfg = {
+        channels["whatsapp"] = {
             "account_sid": os.getenv("TWILIO_ACCOUNT_SID"),
             "auth_token": os.getenv("TWILIO_AUTH_TOKEN"),
             "from_number": os.getenv("TWILIO_WHATSAPP_FROM"),
             "to_number": os.getenv("TWILIO_WHATSAPP_TO")
         }
     elif cfg.get("whatsapp"):
-        whatsapp_cfg = cfg["whatsapp"]
+        channels["whatsapp"] = cfg["whatsapp"]
+
+    return channels
+
+def notify_all(channels, subject, message, subscribers=None, telegram=True, image_url=None):
+    """Send an alert to its Telegram subscribers; email/WhatsApp only reach the owner"""
+    owner = channels["telegram_chat"]
+    if subscribers is None:
+        subscribers = [owner] if owner else []
+    if telegram and channels["telegram_bot"] and subscribers:
+        send_telegram_batch(channels["telegram_bot"], subscribers, message, image_url)
+    if owner and str(owner) not in subscribers:
+        return
+    if channels["smtp"]:
+        send_email(channels["smtp"], subject, message)
+    if channels["whatsapp"]:
+        send_whatsapp(channels["whatsapp"], message)
+
+def alert_notifier(channels):
+    """run_cycle on_alert callback: notify every channel and record detection-to-alert latency"""
+    def on_alert(product, subject, message, subscribers, detected_at):
+        notify_all(channels, subject, message, subscribers, image_url=product.get("image_url"))
+        metrics.DETECTION_SECONDS.observe(time.monotonic() - detected_at)
+    return on_alert
+
+# ---------- Scraper ----------
+_scraper = None
+
+def egress_pool(cfg, interval=None):
+    """EgressPool for config.yaml's `egress` list, or None; endpoints without their own interval
+    are paced by `interval` (default: delay_between_requests)"""
+    if not (cfg or {}).get("egress"):
+        return None
+    from egress import EgressPool
+    return EgressPool.from_config(cfg["egress"], cfg.get("delay_between_requests", 3) if interval is None else interval)
+
+def get_scraper(cfg=None):
+    """Shared scraper for module-level fetches, paced by delay_between_requests"""
+    global _scraper
+    if _scraper is None:
+        _scraper = FirstCryScraper(min_interval=(cfg or {}).get("delay_between_requests", 3), egress=egress_pool(cfg))
+    return _scraper
+
+def fetch_html(url, pincode):
+    return get_scraper().fetch_html(url, pincode)
+
+# ---------- Monitor ----------
+def update_status(state, key, record, legacy_key=None):
+    """Store a product's new record and return its previous one"""
+    if hasattr(state, "swap"):
+        return state.swap(key, record, legacy_key)  # shared store: atomic across workers
+    previous = state.get(key) or state.get(legacy_key) or {}
+    state[key] = record
+    return previous
+
+def record_check(state, item, in_stock, on_alert):
+    """Store a (pair, entry, subscribers) item's verdict and alert its subscribers on a restock
+
+    Call it as soon as the verdict is known: the alert's detection-to-delivery latency is timed from here.
+    """
+    detected_at = time.monotonic()
+    (product_key, pincode), product, subscribers = item
+    url, title = product["url"], product["title"]
+    key = f"{product_key}_{pincode}"
+
+    # Fall back to the pre-canonical per-entry key so upgrades don't re-alert
+    legacy_key = f"{product.get('id')}_{pincode}"
+    history = state.get(key) or state.get(legacy_key) or {}
+    restocked = in_stock and not history.get("in_stock", False)
+    record = {"in_stock": in_stock, "checked": int(time.time()), "checks": history.get("checks", 0) + 1,
+              "restocks": history.get("restocks", 0) + restocked}
+    last = update_status(state, key, record, legacy_key)
+    last_status = last.get("in_stock", False)
+
+    if in_stock and not last_status:
+        message = f"✅ {title} is AVAILABLE!\nPincode: {pincode}\n{url}"
+        subject = f"[HotWheels Alert] {title} available"
+        metrics.RESTOCKS.inc()
+        with profiling.span("notify", url=url, pincode=pincode, subscribers=len(subscribers)):
+            on_alert(product, subject, message, subscribers, detected_at)
+        logging.info("Notification sent for %s [%s] to %d subscribers", title, pincode, len(subscribers))
+
+    return {"product": product, "in_stock": in_stock, "subscribers": subscribers}
+
+def check_product(cfg, state, scraper, on_alert, url, pincode=None, default_chat=None):
+    """Check one product now at every pincode it is watched at (or only `pincode`), skipping the HTTP cache
+
+    Verdicts are stored and restocks alerted as in a cycle; a product not watched at
+    `pincode` is only fetched and reported.
+    """
+    product_key = canonical_key(url)
+    items = list(product_pairs(cfg, url, pincode, default_chat))
+    watched = bool(items)
+    if not watched:
+        if pincode is None:
+            raise ValueError(f"{url} is not on the watchlist; give a pincode to check it anyway")
+        items = [((product_key, str(pincode)), {"title": url, "url": url, "pincode": str(pincode)}, [])]
+
+    results = []
+    for item in items:
+        (_, at), product, subscribers = item
+        html = scraper.fetch_html(product["url"], at, fresh=True)
+        in_stock = None
+        if html:
+            try:
+                in_stock = check_stock(html)
+            except Exception as e:
+                # A failed check, as in a cycle
+                logging.warning("Parse failed for %s: %s", product["url"], e)
+        if watched and in_stock is not None:
+            results.append(record_check(state, item, in_stock, on_alert))
+        else:
+            results.append({"product": product, "in_stock": in_stock, "subscribers": subscribers})
+    return results
+
+def check_new_listings(channels, scraper, pincode, deadline=None):
+    """Alert the owner about products listed since the last catalog crawl
+
+    With a monotonic deadline, only the routine newest-first crawl runs, and it stops
+    in time to leave DEADLINE_RESERVE; full crawls (which only add removals) wait for
+    a run without one.
+    """
+    from catalog import CatalogSnapshot, crawl
+    snapshot = CatalogSnapshot.load(pincode)
+    first = not snapshot.products
+    if deadline:
+        diff = crawl(scraper, snapshot, full=False, deadline=deadline - DEADLINE_RESERVE)
+    else:
+        diff = crawl(scraper, snapshot)
+    snapshot.save()
+    if first:
+        logging.info("Catalog snapshot for %s created with %d products", pincode, len(snapshot.products))
+        return diff
+    for product in diff.added:
+        message = f"🆕 New on FirstCry: {product['title']}\nPrice: {product['price']}\n{product['url']}"
+        notify_all(channels, f"[HotWheels New] {product['title']}", message, image_url=product.get("image_url"))
+    return diff
+
+# ---------- Deadline ----------
+# Seconds left free at the end of a --deadline run for in-flight checks, alerts and saving state
+DEADLINE_RESERVE = 5
+
+def check_priority(record, subscribers, now):
+    """Higher runs first: long unchecked, often restocking and widely watched products"""
+    if not record or "checked" not in record:
+        return math.inf
+    staleness = max(0, now - record["checked"])
+    # Restocks per check, smoothed so a new product isn't 0 or 1
+    restock_rate = (record.get("restocks", 0) + 1) / (record.get("checks", 0) + 2)
+    if record.get("in_stock"):
+        restock_rate /= 2  # already alerted; the check only re-arms it when it sells out
+    return staleness * (1 + 10 * restock_rate) * (1 + math.log2(1 + len(subscribers)))
+
+def prioritise(pairs, state, now=None):
+    now = now or time.time()
+    def score(item):
+        (product_key, pincode), _, subscribers = item
+        return check_priority(state.get(f"{product_key}_{pincode}"), subscribers, now)
+    return sorted(pairs, key=score, reverse=True)
+
+def until_deadline(items, deadline, inflight=1, reserve=DEADLINE_RESERVE):
+    """Yield items while the ones in flight (at the recent pace) still finish before the monotonic deadline"""
+    pace = 0
+    last = time.monotonic()
+    for item in items:
+        now = time.monotonic()
+        pace = 0.8 * pace + 0.2 * (now - last) if pace else now - last
+        last = now
+        if now + pace * inflight + reserve > deadline:
+            return
+        yield item
+
+# ---------- Listing checks ----------
+LISTING_MAX_PAGES = 50
+
+def resolve_from_listings(scraper, pairs, max_pages=LISTING_MAX_PAGES, deadline=None):
+    """Answer checks from listing pages (~20 products each)
+
+    Returns ([(item, in_stock)], items that still need their product page): those not
+    on the pages read, or whose listing entries were ambiguous. A pincode reads at most
+    one listing page per two watched products, so it never costs more than product pages.
+    With a monotonic deadline, no page is read that (at the last page's pace) would end
+    inside DEADLINE_RESERVE of it.
+    """
+    wanted = {}
+    for item in pairs:
+        product_key, pincode = item[0]
+        wanted.setdefault(pincode, set()).add(product_key)
+
+    found = {}
+    pages_read = 0
+    pace = 0
+    for pincode, keys in wanted.items():
+        stock, ambiguous = {}, set()
+        for page in range(1, min(max_pages, len(keys) // 2) + 1):
+            started = time.monotonic()
+            if deadline and started + pace + DEADLINE_RESERVE > deadline:
+                break
+            products = scraper.fetch_listing(pincode, page)
+            pace = time.monotonic() - started
+            pages_read += 1
+            if not products:
+                break
+            for product in products:
+                key = canonical_key(product.get("url"))
+                if key not in keys:
+                    continue
+                # Bare-link results only assume stock; a product listed twice must agree with itself
+                if not listing_stock_known(product) or stock.get(key, product["in_stock"]) != product["in_stock"]:
+                    ambiguous.add(key)
+                stock[key] = product["in_stock"]
+            if len(stock) == len(keys):
+                break
+        for key, in_stock in stock.items():
+            if key not in ambiguous:
+                found[(key, pincode)] = in_stock
+
+    resolved = [(item, found[item[0]]) for item in pairs if item[0] in found]
+    rest = [item for item in pairs if item[0] not in found]
+    logging.info("%d listing pages answered %d of %d checks", pages_read, len(resolved), len(pairs))
+    return resolved, rest
+
+def _check_sequentially(scraper, pairs):
+    for item in pairs:
+        (product_key, pincode), product, subscribers = item
+        logging.info("Checking %s (pincode %s, %d subscribers)", product["title"], pincode, len(subscribers))
+        # The scraper's rate limiter spaces requests by delay_between_requests
+        with profiling.span("check", title=product["title"], pincode=pincode):
+            html = scraper.fetch_html(product["url"], pincode)
+            in_stock = None
+            if html:
+                try:
+                    with metrics.PARSE_SECONDS.time(parser="check_stock"), \
+                            profiling.span("parse", url=product["url"], pincode=pincode):
+                        in_stock = check_stock(html)
+                except Exception as e:
+                    # Counted as a failed check, like a parse failure on the pipeline
+                    logging.warning("Parse failed for %s: %s", product["url"], e)
+        yield item, in_stock
+
+def run_cycle(cfg, state, scraper, on_alert, default_chat=None, owns=None, pipeline=None, deadline=None, listings=False,
+              zones=None):
+    """Check each unique (product, pincode) once; on_alert(product, subject, message, subscribers, detected_at)
+    fires on restock, detected_at being the time.monotonic() at which the verdict came in
+
+    With a monotonic deadline, checks run in priority order and stop early; the rest are left for the next cycle.
+    With `listings`, checks are answered from listing pages where possible, product pages otherwise.
+    With a ZoneMap, one pincode per product and learned zone is checked and its verdict shared with the others.
+    """
+    started = time.monotonic()
+    profiling.start_cycle()
+    pairs = (item for item in watched_pairs(cfg, default_chat) if not owns or owns(item[0][0]))
+    total = None
+    from_listings = []
+    followers = {}
+    if zones:
+        pairs, followers = zones.plan(pairs)
+    if deadline:
+        pairs = prioritise(pairs, state)
+        total = len(pairs) + sum(len(items) for items in followers.values())
+    if listings:
+        from_listings, pairs = resolve_from_listings(scraper, list(pairs), deadline=deadline)
+    if deadline:
+        pairs = until_deadline(pairs, deadline, pipeline.max_pending if pipeline else 1)
+    if pipeline:
+        # Fetch on threads, parse on the process pool; results arrive in completion order
+        checks = pipeline.run(((item, item[1]["url"], item[0][1]) for item in pairs), check_stock)
+    else:
+        checks = _check_sequentially(scraper, pairs)
+    checks = itertools.chain(from_listings, checks)
+    if zones:
+        checks = zones.propagate(checks, followers)
+
+    results = []
+    requested = failed = 0
+    for item, in_stock in checks:
+        requested += 1
+        if in_stock is None:
+            failed += 1
+            continue
+        results.append(record_check(state, item, in_stock, on_alert))
+
+    propagated = 0
+    if zones:
+        propagated = zones.propagated
+        zones.learn()
+        logging.info("Zones: %s", zones.summary())
+    metrics.CYCLE_SECONDS.observe(time.monotonic() - started)
+    metrics.CYCLE_REQUESTS.set(requested - len(from_listings) - propagated)
+    metrics.CYCLE_LISTING_RESOLVED.set(len(from_listings))
+    metrics.CYCLE_FAILURES.set(failed)
+    if total is not None:
+        metrics.CYCLE_DEFERRED.set(total - requested)
+        if requested < total:
+            logging.info("Deadline reached after %d of %d checks; %d left for the next run",
+                         requested, total, total - requested)
+    profiling.end_cycle()
+    return results
+
+def _exit_on_sigterm(signum, frame):
+    # Runners stop jobs with SIGTERM; exit normally so pending state is saved
+    sys.exit(128 + signum)
+
+def run_monitor(test_mode=False, fetchers=1, parsers=None, deadline=None, new_listings=None, listings=False, zones=False):
+    """One monitoring cycle; with `deadline` seconds, stop early and resume next run"""
+    stop_by = time.monotonic() + deadline if deadline else None
+    cfg = load_yaml()
+    state = load_state()
+    channels = load_channels(cfg)
+    telegram_bot, telegram_chat = channels["telegram_bot"], channels["telegram_chat"]
+    smtp_cfg, whatsapp_cfg = channels["smtp"], channels["whatsapp"]
 
     # Test mode - send test notifications
     if test_mode:
@@ -171,40 +596,207 @@ def run_monitor(test_mode=False):
         return
 
     # Normal monitoring mode
-    for product in cfg["products"]:
-        url, title, pincode = product["url"], product["title"], product.get("pincode")
-        key = f"{product['id']}_{pincode}"
-        logging.info("Checking %s (pincode %s)", title, pincode)
+    scraper = get_scraper(cfg)
+    on_alert = alert_notifier(channels)
+    zone_map = None
+    if zones:
+        from zones import ZoneMap
+        zone_map = ZoneMap.load()
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        if new_listings:
+            check_new_listings(channels, scraper, new_listings, stop_by)
+        if fetchers > 1:
+            from pipeline import FetchParsePipeline
+            with FetchParsePipeline(scraper, fetchers=fetchers, parsers=parsers) as pipeline:
+                run_cycle(cfg, state, scraper, on_alert, default_chat=telegram_chat, pipeline=pipeline,
+                          deadline=stop_by, listings=listings, zones=zone_map)
+        else:
+            run_cycle(cfg, state, scraper, on_alert, default_chat=telegram_chat, deadline=stop_by, listings=listings,
+                      zones=zone_map)
+        compact_state(state, watched_pairs(cfg, telegram_chat))
+    finally:
+        # Also on interruption: whatever was checked is kept for the next run
+        save_state(state)
+        if zone_map:
+            zone_map.save()
 
-        html = fetch_html(url, pincode)
-        if not html:
-            continue
+def run_worker(shard_db, worker_id=None, lease_seconds=60, interval=60, metrics_json=None):
+    """Monitor this worker's shard of the watchlist until interrupted"""
+    from sharding import ShardStore, ShardWorker
 
-        in_stock = check_stock(html)
-        last_status = state.get(key, {}).get("in_stock", False)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    store = ShardStore(shard_db)
+    store.import_state(load_state())
+    worker = ShardWorker(store, worker_id, lease_seconds)
+    logging.info("Worker %s joining shard store %s", worker_id, shard_db)
+    try:
+        while True:
+            cfg = load_yaml()
+            channels = load_channels(cfg)
+            worker.refresh()
+            results = run_cycle(
+                cfg, store, get_scraper(cfg), alert_notifier(channels),
+                default_chat=channels["telegram_chat"], owns=worker.owns)
+            logging.info("Worker %s checked %d products", worker_id, len(results))
+            if metrics_json:
+                metrics.dump_json(metrics_json)
+            # Keep the lease alive while idle
+            next_cycle = time.monotonic() + interval
+            while time.monotonic() < next_cycle:
+                time.sleep(min(lease_seconds / 3, max(0, next_cycle - time.monotonic())))
+                worker.refresh()
+    finally:
+        worker.stop()
+        logging.info("Worker %s left the shard store", worker_id)
 
-        if in_stock and not last_status:
-            message = f"✅ {title} is AVAILABLE!\nPincode: {pincode}\n{url}"
-            subject = f"[HotWheels Alert] {title} available"
-            
-            # Send notifications to all configured channels
-            if telegram_bot and telegram_chat:
-                send_telegram(telegram_bot, telegram_chat, message)
-            if smtp_cfg:
-                send_email(smtp_cfg, subject, message)
-            if whatsapp_cfg:
-                send_whatsapp(whatsapp_cfg, message)
-            
-            logging.info("Notification sent for %s [%s]", title, pincode)
+# ---------- Daemon ----------
+class MonitorDaemon:
+    """Cycles every `interval` seconds in one long-lived process, so sessions, caches and learned
+    zones survive between cycles; control.py commands reach it through a Unix socket"""
 
-        state[key] = {"in_stock": in_stock}
-        time.sleep(cfg.get("delay_between_requests", 3))
+    def __init__(self, interval=60, listings=False, zones=False):
+        from control import Inbox
+        self.interval = interval
+        self.listings = listings
+        self.pipeline = None
+        self.cfg = load_yaml()
+        self.state = load_state()
+        self.channels = load_channels(self.cfg)
+        self.scraper = get_scraper(self.cfg)
+        self.zones = None
+        if zones:
+            from zones import ZoneMap
+            self.zones = ZoneMap.load()
+        # Commands that touch the watchlist, state or scraper settings run here between cycles
+        self.inbox = Inbox()
+        self.stopping = threading.Event()
+        self.cycles = 0
+        self.last_cycle = None
+        self.next_cycle = time.monotonic()
 
-    save_state(state)
+    def commands(self):
+        return {
+            "stats": self.stats,
+            "stop": self.stop,
+            "reload": lambda: self.inbox.call(self.reload),
+            "flush": lambda cache="all": self.inbox.call(self.flush, cache),
+            "warm": lambda pincode=None, pages=3: self.inbox.call(self.warm, pincode, int(pages)),
+            "check": lambda url, pincode=None: self.inbox.call(self.check, url, pincode),
+        }
+
+    def run(self):
+        while not self.stopping.is_set():
+            if time.monotonic() >= self.next_cycle:
+                self.cycle()
+                self.next_cycle = time.monotonic() + self.interval
+            self.inbox.run_pending(max(0, self.next_cycle - time.monotonic()))
+        self.inbox.run_pending()  # commands that arrived with the stop still get their answer
+
+    def cycle(self):
+        started = time.monotonic()
+        chat = self.channels["telegram_chat"]
+        results = run_cycle(self.cfg, self.state, self.scraper, alert_notifier(self.channels), default_chat=chat,
+                            pipeline=self.pipeline, listings=self.listings, zones=self.zones)
+        compact_state(self.state, watched_pairs(self.cfg, chat))
+        self.save()
+        self.cycles += 1
+        self.last_cycle = {"finished": int(time.time()), "checked": len(results),
+                           "seconds": round(time.monotonic() - started, 1)}
+        logging.info("Daemon cycle %d checked %d products; next in %ds", self.cycles, len(results), self.interval)
+
+    def save(self):
+        save_state(self.state)
+        if self.zones:
+            self.zones.save()
+
+    def stop(self):
+        """Stop after the cycle in progress, if any"""
+        self.stopping.set()
+        self.inbox.wake()
+        return {"stopping": True}
+
+    def stats(self):
+        scraper = self.scraper
+        return {
+            "pid": os.getpid(),
+            "cycles": self.cycles,
+            "last_cycle": self.last_cycle,
+            "next_cycle_in": round(max(0, self.next_cycle - time.monotonic())),
+            "state_records": len(self.state),
+            "http_cache": scraper.cache.stats() if scraper.cache is not None else None,
+            "egress": scraper.egress.stats() if scraper.egress is not None else None,
+            "zones": dict(self.zones.totals) if self.zones else None,
+            "metrics": metrics.snapshot(),
+        }
+
+    def reload(self):
+        """Re-read config.yaml; the scraper keeps its session, caches and, if unchanged, egress pool"""
+        cfg = load_yaml()
+        self.channels = load_channels(cfg)
+        self.scraper.rate_limiter.interval = cfg.get("delay_between_requests", 3)
+        if cfg.get("egress") != self.cfg.get("egress"):
+            self.scraper.egress = egress_pool(cfg)
+        self.cfg = cfg
+        return {"watched": sum(1 for _ in watched_pairs(cfg, self.channels["telegram_chat"])),
+                "delay_between_requests": self.scraper.rate_limiter.interval}
+
+    def flush(self, cache="all"):
+        """Empty the HTTP cache ("http"), forget learned zones ("zones"), or both ("all")"""
+        if cache not in ("http", "zones", "all"):
+            raise ValueError(f"unknown cache {cache!r}; use http, zones or all")
+        flushed = {}
+        if cache in ("http", "all") and self.scraper.cache is not None:
+            flushed["http"] = self.scraper.cache.clear()
+        if cache in ("zones", "all") and self.zones:
+            flushed["zones"] = len(self.zones.pairs)
+            self.zones.pairs = {}
+            self.zones.save()
+        return flushed
+
+    def warm(self, pincode=None, pages=3):
+        """Fetch the first listing pages of each watched pincode into the HTTP cache"""
+        if self.scraper.cache is None:
+            raise ValueError("no HTTP cache to warm; set FIRSTCRY_CACHE")
+        pincodes = [str(pincode)] if pincode else sorted({pair[1] for pair, _, _ in watched_pairs(self.cfg)})
+        fetched = 0
+        for at in pincodes:
+            for page in range(1, pages + 1):
+                if not self.scraper.fetch_listing(at, page):
+                    break
+                fetched += 1
+        return {"pincodes": len(pincodes), "pages": fetched, "http_cache": self.scraper.cache.stats()}
+
+    def check(self, url, pincode=None):
+        results = check_product(self.cfg, self.state, self.scraper, alert_notifier(self.channels), url, pincode,
+                                default_chat=self.channels["telegram_chat"])
+        self.save()
+        return results
+
+def run_daemon(interval=60, fetchers=1, parsers=None, listings=False, zones=False):
+    """Monitor until stopped through the control socket, SIGTERM or Ctrl+C"""
+    from control import ControlServer
+
+    daemon = MonitorDaemon(interval, listings=listings, zones=zones)
+    server = ControlServer("monitor", daemon.commands()).start()
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        if fetchers > 1:
+            from pipeline import FetchParsePipeline
+            with FetchParsePipeline(daemon.scraper, fetchers=fetchers, parsers=parsers) as pipeline:
+                daemon.pipeline = pipeline
+                daemon.run()
+        else:
+            daemon.run()
+    finally:
+        server.stop()
+        daemon.save()
+        logging.info("Monitor daemon stopped after %d cycles", daemon.cycles)
 
 # ---------- CLI ----------
 def menu():
     cfg = load_yaml()
+    store = open_watchlist(cfg)
     while True:
         print("\n==== HotWheels Stock Watcher ====")
         print("1. Add product")
@@ -218,25 +810,35 @@ def menu():
             title = input("Enter product title: ").strip()
             url = input("Enter product URL: ").strip()
             pincode = input("Enter pincode: ").strip()
-            pid = f"prod{len(cfg['products'])+1}"
-            cfg["products"].append({"id": pid, "title": title, "url": url, "pincode": pincode})
-            save_yaml(cfg)
+            if store is not None:
+                store.add({"title": title, "url": url, "pincode": pincode}, new_id=True)
+            else:
+                pid = f"prod{len(cfg['products'])+1}"
+                cfg["products"].append({"id": pid, "title": title, "url": url, "pincode": pincode})
+                save_yaml(cfg)
             print(f"✅ Added {title} [{pincode}]")
         elif choice == "2":
-            for i, p in enumerate(cfg["products"], 1):
+            products = list(store.entries()) if store is not None else cfg["products"]
+            for i, p in enumerate(products, 1):
                 print(f"{i}. {p['title']} [{p['pincode']}]")
             idx = input("Enter product number to remove: ").strip()
-            if idx.isdigit() and 1 <= int(idx) <= len(cfg["products"]):
-                removed = cfg["products"].pop(int(idx)-1)
-                save_yaml(cfg)
+            if idx.isdigit() and 1 <= int(idx) <= len(products):
+                removed = products[int(idx)-1]
+                if store is not None:
+                    store.remove(removed["url"], removed["pincode"])
+                else:
+                    cfg["products"].pop(int(idx)-1)
+                    save_yaml(cfg)
                 print(f"❌ Removed {removed['title']}")
             else:
                 print("Invalid choice")
         elif choice == "3":
-            if not cfg["products"]:
+            if not (len(store) if store is not None else cfg["products"]):
                 print("No products in watchlist.")
             else:
-                for i, p in enumerate(cfg["products"], 1):
+                # Streamed from the store rather than loaded at once
+                products = store.entries() if store is not None else cfg["products"]
+                for i, p in enumerate(products, 1):
                     print(f"{i}. {p['title']} [{p['pincode']}] → {p['url']}")
         elif choice == "4":
             print("🔄 Starting monitor... (Ctrl+C to stop)")
@@ -253,11 +855,41 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="HotWheels Stock Monitor")
     parser.add_argument("--ci", action="store_true", help="Run in CI mode (no interactive menu)")
     parser.add_argument("--test", action="store_true", help="Test mode - send test notifications")
+    parser.add_argument("--deadline", type=float, help="With --ci, stop starting checks before this many seconds; most overdue products go first")
+    parser.add_argument("--new-listings", metavar="PINCODE", help="With --ci, also alert about products newly listed on FirstCry for this pincode")
+    parser.add_argument("--listings", action="store_true", help="With --ci, read stock from listing pages first and fetch product pages only for the rest")
+    parser.add_argument("--zones", action="store_true", help="With --ci, check one pincode per learned serviceability zone and share its result (zones.json)")
+    parser.add_argument("--fetchers", type=int, default=1, help="Concurrent page downloads (>1 enables the fetch/parse pipeline); requests stay spaced by delay_between_requests, so lower it or configure an egress pool for downloads to overlap")
+    parser.add_argument("--parsers", type=int, help="Parser processes for the pipeline (default: CPU count)")
+    parser.add_argument("--daemon", action="store_true", help="Keep running, one cycle every --interval seconds, controlled through control.py")
+    parser.add_argument("--worker", action="store_true", help="Run as one of N sharded monitor workers")
+    parser.add_argument("--shard-db", default="shards.db", help="SQLite file shared by all workers")
+    parser.add_argument("--worker-id", help="Unique worker name (default: host-pid)")
+    parser.add_argument("--lease", type=int, default=60, help="Worker lease in seconds; a dead worker's shard moves after this")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between cycles of a worker or --daemon")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "0")), help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-json", help="Write a JSON dump of the metrics here after each cycle")
+    parser.add_argument("--profile", nargs="?", const="trace.json", help="Write a Chrome trace of each cycle (default: trace.json) and log the slowest products")
+    parser.add_argument("--profile-top", type=int, default=10, help="Slowest products listed with --profile")
+    parser.add_argument("--cprofile", help="With --profile, also dump cProfile stats of the cycle to this file")
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.profile:
+        profiling.enable(args.profile, args.profile_top, args.cprofile)
     
-    if args.ci:
-        run_monitor()
+    if args.daemon:
+        run_daemon(args.interval, fetchers=args.fetchers, parsers=args.parsers, listings=args.listings, zones=args.zones)
+    elif args.worker:
+        run_worker(args.shard_db, args.worker_id, args.lease, args.interval, args.metrics_json)
+    elif args.ci:
+        run_monitor(fetchers=args.fetchers, parsers=args.parsers, deadline=args.deadline, new_listings=args.new_listings,
+                    listings=args.listings, zones=args.zones)
+        if args.metrics_json:
+            metrics.dump_json(args.metrics_json)
     elif args.test:
         run_monitor(test_mode=True)
     else:
@@ -0,0 +1,214 @@
+"""
+FirstCry page parsers
+Pure functions from raw HTML to compact results, importable by worker
+processes so parsing can run off the fetching thread
+"""
+
+import re
+import zlib
+import logging
+
+from htmlparse import get_backend
+
+BASE_URL = "https://www.firstcry.com"
+
+# Listing containers, most specific first
+LISTING_SELECTORS = [
+    'div[class*="li_cont"]',
+    'div[class*="product"]',
+    'div[class*="item"]',
+    'div[class*="card"]',
+    'div[class*="li_"]',
+    'div[data-testid*="product"]',
+    'div[class*="grid-item"]'
+]
+
+TITLE_SELECTORS = [
+    'a[class*="li_title"]',
+    'a[class*="title"]',
+    'a[class*="product"]',
+    'h3 a',
+    'h4 a',
+    'a[href*="/hotwheels/"]',
+    'a[href*="/hot-wheels/"]'
+]
+
+PRICE_SELECTORS = [
+    'span[class*="price"]',
+    'div[class*="price"]',
+    'span[class*="cost"]',
+    'div[class*="cost"]',
+    'span[class*="amount"]',
+    'div[class*="amount"]',
+    '.price',
+    '.cost',
+    '.amount'
+]
+
+OUT_OF_STOCK_SELECTORS = [
+    'span[class*="out_of_stock"]',
+    'div[class*="out_of_stock"]',
+    'span[class*="sold_out"]',
+    'div[class*="sold_out"]',
+    'span[class*="unavailable"]',
+    'div[class*="unavailable"]'
+]
+
+PRICE_RE = re.compile(r'₹\s*[\d,]+')
+
+
+def _page_text(html):
+    # The backend (and bs4 or lxml with it) is imported on first parse: bs4 is a third of the monitor's startup otherwise
+    dom = get_backend()
+    return dom.text(dom.parse(html), " ", strip=True).lower()
+
+
+def find_containers(dom, doc):
+    """Product containers of a parsed listing page, from the first selector matching more than one element"""
+    for selector in LISTING_SELECTORS:
+        containers = dom.select(doc, selector)
+        if len(containers) > 1:  # More than 1 to avoid single elements
+            logging.info(f"Found {len(containers)} products with selector: {selector}")
+            return containers
+    return []
+
+
+def check_stock(html):
+    """Product page verdict used by the monitor"""
+    text = _page_text(html)
+    if "out of stock" in text or "notify me" in text or "sold out" in text:
+        return False
+    if "add to cart" in text or "buy now" in text or "add to bag" in text:
+        return True
+    return False
+
+
+def parse_product_page(html):
+    """Stock status and a text snippet from a product page"""
+    page_text = _page_text(html)
+    in_stock = not any(phrase in page_text for phrase in [
+        "out of stock", "notify me", "sold out", "currently unavailable"
+    ])
+    return {
+        'in_stock': in_stock,
+        'page_text': page_text[:200] + "..." if len(page_text) > 200 else page_text
+    }
+
+
+def parse_listing(html, base_url=BASE_URL):
+    """Products on a HotWheels listing page (empty list if none were found)"""
+    dom = get_backend()
+    doc = dom.parse(html)
+    products = []
+
+    # Look for product containers - try multiple selectors
+    product_containers = find_containers(dom, doc)
+    if product_containers:
+        for container in product_containers:
+            product = extract_product_info(container, base_url)
+            if product:
+                products.append(product)
+        return products
+
+    # Try to find product links directly
+    hotwheels_links = []
+    for link in dom.links(doc):
+        href = dom.get(link, 'href', '')
+        text = dom.text(link, strip=True).lower()
+        if ('hot' in text and 'wheels' in text) or '/hotwheels/' in href or '/hot-wheels/' in href:
+            hotwheels_links.append(link)
+
+    if hotwheels_links:
+        logging.info(f"Found {len(hotwheels_links)} HotWheels product links")
+        for i, link in enumerate(hotwheels_links[:20]):  # Limit to 20
+            href = dom.get(link, 'href', '')
+            products.append({
+                'id': f"link_{i}",
+                'title': dom.text(link, strip=True) or f"Hot Wheels Product {i+1}",
+                'url': base_url + href if not href.startswith('http') else href,
+                'price': "Price not available",
+                'in_stock': True,
+                'image_url': ''
+            })
+    return products
+
+
+def listing_stock_known(product):
+    """False for listing results from bare links, whose in_stock is only assumed"""
+    return not str(product.get('id', '')).startswith('link_')
+
+
+def extract_product_info(container, base_url=BASE_URL):
+    """Extract product information from a product container (an element of the current backend)"""
+    dom = get_backend()
+    try:
+        # Try multiple selectors for title
+        title_elem = None
+        for selector in TITLE_SELECTORS:
+            title_elem = dom.select_one(container, selector)
+            if title_elem is not None:
+                break
+
+        if title_elem is None:
+            return None
+
+        title = dom.text(title_elem, strip=True)
+        if not title or len(title) < 5:  # Skip if title is too short
+            return None
+
+        product_url = dom.get(title_elem, 'href', '')
+        if product_url:
+            if product_url.startswith('http'):
+                pass  # Already a full URL
+            elif product_url.startswith('/'):
+                product_url = base_url + product_url
+            else:
+                product_url = base_url + '/' + product_url
+        else:
+            product_url = "#"
+
+        # Product ID from URL (crc32 rather than hash() so ids agree across worker processes)
+        product_id = product_url.split('/')[-1] if '/' in product_url else f"prod_{zlib.crc32(title.encode())}"
+
+        # Try multiple selectors for price
+        price_elem = None
+        for selector in PRICE_SELECTORS:
+            price_elem = dom.select_one(container, selector)
+            if price_elem is not None and dom.text(price_elem, strip=True):
+                break
+
+        price = dom.text(price_elem, strip=True) if price_elem is not None else "Price not available"
+
+        # If no price found, try to find any text with ₹ symbol
+        if price == "Price not available":
+            price_match = PRICE_RE.search(dom.text(container))
+            if price_match:
+                price = price_match.group()
+
+        # Stock status - look for out of stock indicators
+        in_stock = True
+        for selector in OUT_OF_STOCK_SELECTORS:
+            if dom.select_one(container, selector) is not None:
+                in_stock = False
+                break
+
+        # Image URL
+        img_elem = dom.find(container, 'img')
+        image_url = ''
+        if img_elem is not None:
+            image_url = dom.get(img_elem, 'data-original') or dom.get(img_elem, 'src') or ''
+            if image_url and not image_url.startswith('http'):
+                image_url = base_url + image_url
+
+        return {
+            'id': product_id,
+            'title': title,
+            'url': product_url,
+            'price': price,
+            'in_stock': in_stock,
+            'image_url': image_url
+        }
+
+    except Exception as e:
+        logging.warning(f"Error extracting product info: {e}")
+        return None
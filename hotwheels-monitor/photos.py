@@ -0,0 +1,90 @@
+"""
+Product photos for Telegram
+Image URL -> Telegram file_id of its first upload, kept on disk so later
+sends (to any chat, from the monitor or the bot) reference the id instead of
+downloading and uploading the image again
+"""
+
+import os
+import json
+import logging
+import threading
+
+import requests
+
+import metrics
+
+PHOTO_CACHE_FILE = "photo_cache.json"
+# Telegram rejects photo uploads over 10 MB
+MAX_PHOTO_BYTES = 10 * 2**20
+
+
+def bot_id(bot_token):
+    """file_ids only work for the bot that uploaded them: '123456:ABC' -> '123456'"""
+    return str(bot_token or "").split(":")[0]
+
+
+def fetch_image(url, session=None, timeout=10):
+    """Image bytes, or None if the download failed or is too big to send"""
+    try:
+        response = (session or requests).get(url, timeout=timeout)
+        response.raise_for_status()
+    except Exception as e:
+        logging.warning("Failed to fetch image %s: %s", url, e)
+        return None
+    if len(response.content) > MAX_PHOTO_BYTES:
+        logging.warning("Image %s is %d bytes, too big for Telegram", url, len(response.content))
+        return None
+    return response.content
+
+
+def largest_file_id(message):
+    """file_id of the biggest size Telegram made of an uploaded photo (Bot API message dict)"""
+    sizes = (message or {}).get("photo") or []
+    return sizes[-1]["file_id"] if sizes else None
+
+
+class PhotoCache:
+    """file_ids per bot and image URL, persisted as JSON"""
+
+    def __init__(self, path=PHOTO_CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file_ids = self._read()
+
+    def _read(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning("Ignoring unreadable %s: %s", self.path, e)
+        return {}
+
+    def get(self, bot_token, url):
+        file_id = self.file_ids.get(bot_id(bot_token), {}).get(url)
+        metrics.CACHE_REQUESTS.inc(cache="photo", result="miss" if file_id is None else "hit")
+        return file_id
+
+    def put(self, bot_token, url, file_id):
+        self._update(bot_token, url, file_id)
+
+    def forget(self, bot_token, url):
+        """Drop an id Telegram no longer accepts, so the next send uploads again"""
+        self._update(bot_token, url, None)
+
+    def _update(self, bot_token, url, file_id):
+        with self.lock:
+            # Merge with what other processes (monitor, bot) saved since we loaded
+            merged = self._read()
+            merged.update({bot: dict(ids, **merged.get(bot, {})) for bot, ids in self.file_ids.items()})
+            ids = merged.setdefault(bot_id(bot_token), {})
+            if file_id:
+                ids[url] = file_id
+            else:
+                ids.pop(url, None)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+            os.replace(tmp, self.path)
+            self.file_ids = merged
@@ -0,0 +1,102 @@
+"""
+Fetch/parse pipeline
+Fetcher threads download raw HTML while a process pool parses it, so
+parsing scales across cores instead of sharing the GIL with network I/O
+"""
+
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+import metrics
+import profiling
+
+
+class FetchParsePipeline:
+    """Bounded two-stage pipeline: fetch on threads, parse on processes"""
+
+    def __init__(self, scraper, fetchers=8, parsers=None, max_pending=None):
+        self.scraper = scraper
+        self.fetchers = fetchers
+        self.parsers = parsers or os.cpu_count() or 1
+        # Backpressure: at most this many pages are downloaded but not yet parsed
+        self.max_pending = max_pending or 2 * (self.fetchers + self.parsers)
+        self.parser_pool = None
+        # Fetchers share the scraper's politeness delay on purpose; with one address
+        # it caps the request rate however many fetchers there are
+        interval = scraper.rate_limiter.interval
+        if fetchers > 1 and scraper.egress is None and interval > 0:
+            logging.warning("%d fetchers share delay_between_requests=%gs: at most one request starts every %gs, "
+                            "so lower the delay or add an egress pool for downloads to overlap",
+                            fetchers, interval, interval)
+        # Let every fetcher keep its own pooled connection
+        adapter = HTTPAdapter(pool_connections=fetchers, pool_maxsize=fetchers)
+        scraper.session.mount("https://", adapter)
+        scraper.session.mount("http://", adapter)
+
+    def __enter__(self):
+        self.parser_pool = ProcessPoolExecutor(max_workers=self.parsers)
+        return self
+
+    def __exit__(self, *exc):
+        self.parser_pool.shutdown(cancel_futures=True)
+        self.parser_pool = None
+
+    def run(self, jobs, parse, *parse_args):
+        """Yield (tag, result) as pages finish; jobs are (tag, url, pincode), result None on failure"""
+        slots = threading.BoundedSemaphore(self.max_pending)
+        done = queue.Queue()
+        submitted = []
+
+        def fetch(tag, url, pincode):
+            try:
+                body = self.scraper.fetch_bytes(url, pincode)
+                if body is None:
+                    done.put((tag, url, pincode, None))
+                    return
+                # Only the raw bytes cross into the parser process; a compact result comes back
+                future = self.parser_pool.submit(metrics.timed_call, parse, body, *parse_args)
+                future.add_done_callback(lambda f: done.put((tag, url, pincode, f)))
+            except Exception as e:
+                logging.warning("Pipeline fetch failed for %s: %s", url, e)
+                done.put((tag, url, pincode, None))
+
+        def submit_all(fetch_pool):
+            count = 0
+            try:
+                for tag, url, pincode in jobs:
+                    slots.acquire()  # blocks while downstream stages are saturated
+                    metrics.QUEUE_DEPTH.inc(queue="pipeline")
+                    fetch_pool.submit(fetch, tag, url, pincode)
+                    count += 1
+            finally:
+                submitted.append(count)
+                done.put(None)
+
+        with ThreadPoolExecutor(max_workers=self.fetchers, thread_name_prefix="fetch") as fetch_pool:
+            threading.Thread(target=submit_all, args=(fetch_pool,), daemon=True).start()
+            received = 0
+            while not submitted or received < submitted[0]:
+                item = done.get()
+                if item is None:
+                    continue
+                received += 1
+                slots.release()
+                metrics.QUEUE_DEPTH.dec(queue="pipeline")
+                tag, url, pincode, future = item
+                if future is None:
+                    yield tag, None
+                    continue
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    logging.warning("Parse failed for %s: %s", tag, e)
+                    yield tag, None
+                    continue
+                metrics.PARSE_SECONDS.observe(seconds, parser=parse.__name__)
+                profiling.add("parse", seconds, url=url, pincode=pincode)
+                yield tag, result
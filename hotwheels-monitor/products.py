@@ -0,0 +1,124 @@
+"""
+Compact product records
+A pincode's listing stored as columns (interned strings, integer paise prices
+in an array, one stock byte per product) instead of a dict per product, with
+filter and sort that work on whole columns
+"""
+
+import re
+import sys
+from array import array
+from itertools import compress
+
+from watchlist import canonical_key
+
+PRICE_UNKNOWN = -1
+_PRICE_RE = re.compile(r"(\d[\d,]*)(?:\.(\d{1,2}))?")
+
+
+def parse_price(text):
+    """'₹2,680' -> 268000 paise; PRICE_UNKNOWN when there is no amount"""
+    match = _PRICE_RE.search(str(text or ""))
+    if not match:
+        return PRICE_UNKNOWN
+    rupees = int(match.group(1).replace(",", ""))
+    paise = int((match.group(2) or "0").ljust(2, "0"))
+    return rupees * 100 + paise
+
+
+def format_price(paise):
+    if paise == PRICE_UNKNOWN:
+        return "Price not available"
+    rupees, rest = divmod(paise, 100)
+    return f"₹{rupees:,}" + (f".{rest:02d}" if rest else "")
+
+
+class Product:
+    """One row of a ProductTable; also readable as product["title"] etc. like the listing dicts"""
+    __slots__ = ("id", "title", "url", "price", "in_stock", "image_url")
+
+    def __init__(self, id, title, url, price, in_stock, image_url):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.price = price
+        self.in_stock = in_stock
+        self.image_url = image_url
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    @property
+    def price_text(self):
+        return format_price(self.price)
+
+
+class ProductTable:
+    """Column store for a list of listing products; rows keep the order they were added in"""
+
+    def __init__(self):
+        self.ids = []
+        self.titles = []
+        self.urls = []
+        self.image_urls = []
+        self.prices = array("q")
+        self.stock = bytearray()
+        self._rows = None  # canonical key -> row, built on first lookup
+
+    @classmethod
+    def from_dicts(cls, products):
+        table = cls()
+        for product in products:
+            table.append(product)
+        return table
+
+    def append(self, product):
+        intern = sys.intern
+        self.ids.append(intern(str(product.get("id", ""))))
+        self.titles.append(intern(product.get("title") or ""))
+        self.urls.append(intern(product.get("url") or ""))
+        self.image_urls.append(intern(product.get("image_url") or ""))
+        self.prices.append(parse_price(product.get("price")))
+        self.stock.append(1 if product.get("in_stock") else 0)
+        self._rows = None
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getitem__(self, row):
+        return Product(self.ids[row], self.titles[row], self.urls[row], self.prices[row],
+                       bool(self.stock[row]), self.image_urls[row])
+
+    def row_of(self, url):
+        """Row of the product with this canonical key, or None"""
+        if self._rows is None:
+            self._rows = {canonical_key(u): row for row, u in enumerate(self.urls)}
+        return self._rows.get(canonical_key(url))
+
+    def set_stock(self, row, in_stock):
+        self.stock[row] = 1 if in_stock else 0
+
+    # ---------- Filter and sort ----------
+    def select(self, in_stock=False, max_price=None, sort=None):
+        """Rows matching the filters, in listing order or sorted by "price" / "-price"
+
+        Works column by column: stock through a byte mask, prices through the
+        array, so a pincode's whole catalog is filtered without building records.
+        """
+        rows = range(len(self))
+        if in_stock:
+            rows = compress(rows, self.stock)
+        if max_price is not None:
+            prices = self.prices
+            rows = [row for row in rows if 0 <= prices[row] <= max_price]
+        rows = list(rows)
+        if sort in ("price", "-price"):
+            # Unknown prices go last either way
+            prices = self.prices
+            known = [row for row in rows if prices[row] != PRICE_UNKNOWN]
+            known.sort(key=prices.__getitem__, reverse=sort == "-price")
+            rows = known + [row for row in rows if prices[row] == PRICE_UNKNOWN]
+        return rows
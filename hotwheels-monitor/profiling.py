@@ -0,0 +1,227 @@
+"""
+Per-cycle profiling
+Records spans per product (DNS, connect, TTFB, download, parse, notify and
+bytes) and at cycle end writes a Chrome trace (chrome://tracing, Perfetto),
+logs the slowest products and optionally dumps cProfile stats. Off by
+default: every hook is then a single global check.
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import nullcontext
+
+_profiler = None
+_NULL_SPAN = nullcontext()
+
+# Spans that add up to a product's cost in the summary
+PRODUCT_STAGES = ("fetch", "parse", "notify")
+FETCH_PHASES = ("dns", "connect", "ttfb", "download")
+
+
+class Span:
+    __slots__ = ("name", "args", "start", "phases", "last_end")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = time.perf_counter()
+        self.phases = []
+        self.last_end = self.start
+
+    def phase(self, name, start, end):
+        """Record a sub-stage of this span, e.g. the DNS lookup of a fetch"""
+        self.phases.append((name, start, end))
+        self.last_end = end
+
+
+class _SpanContext:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.span = Span(name, args)
+
+    def __enter__(self):
+        self.profiler.stack().append(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.stack().pop()
+        if exc_type is not None:
+            self.span.args["error"] = exc_type.__name__
+        self.profiler.record(self.span, time.perf_counter())
+
+
+class Profiler:
+    def __init__(self, trace_path="trace.json", top=10, cprofile_path=None, max_events=200000):
+        self.trace_path = trace_path
+        self.top = top
+        self.cprofile_path = cprofile_path
+        self.max_events = max_events
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cprofile = None
+        self.reset()
+
+    def reset(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.products = {}
+        self.dropped = 0
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _event(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+        if args:
+            event["args"] = args
+        return event
+
+    def record(self, span, end):
+        events = [self._event(span.name, span.start, end, span.args)]
+        events += [self._event(name, start, stop) for name, start, stop in span.phases]
+        with self.lock:
+            if len(self.events) < self.max_events:
+                self.events.extend(events)
+            else:
+                self.dropped += len(events)
+            if span.name in PRODUCT_STAGES and "url" in span.args:
+                key = (span.args["url"], str(span.args.get("pincode", "")))
+                totals = self.products.setdefault(key, {"bytes": 0})
+                totals[span.name] = totals.get(span.name, 0) + end - span.start
+                for name, start, stop in span.phases:
+                    totals[name] = totals.get(name, 0) + stop - start
+                totals["bytes"] += span.args.get("bytes", 0)
+
+    # ---------- Cycle ----------
+    def start_cycle(self):
+        if self.cprofile_path:
+            # cProfile only sees the thread that runs the cycle, not fetcher threads or parser processes
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def end_cycle(self):
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+            logging.info("cProfile stats written to %s", self.cprofile_path)
+            self.cprofile = None
+        # Everything since the last flush, so bot handler spans between cycles are kept too
+        with self.lock:
+            events, products, dropped = self.events, self.products, self.dropped
+            self.reset()
+        with open(self.trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        logging.info("Trace with %d events written to %s%s", len(events), self.trace_path,
+                     f" ({dropped} dropped)" if dropped else "")
+        for line in summary(products, self.top):
+            logging.info(line)
+
+
+def summary(products, top=10):
+    """Lines describing the `top` slowest (url, pincode) pairs"""
+    ranked = sorted(products.items(), key=lambda item: -sum(item[1].get(s, 0) for s in PRODUCT_STAGES))
+    lines = [f"Slowest {min(top, len(ranked))} of {len(ranked)} products (ms):",
+             f"{'total':>8}{'dns':>7}{'conn':>7}{'ttfb':>8}{'down':>7}{'parse':>8}{'notify':>8}{'KiB':>7}  pincode  url"]
+    for (url, pincode), t in ranked[:top]:
+        ms = {name: t.get(name, 0) * 1000 for name in PRODUCT_STAGES + FETCH_PHASES}
+        lines.append(f"{sum(ms[s] for s in PRODUCT_STAGES):>8.1f}{ms['dns']:>7.1f}{ms['connect']:>7.1f}"
+                     f"{ms['ttfb']:>8.1f}{ms['download']:>7.1f}{ms['parse']:>8.1f}{ms['notify']:>8.1f}"
+                     f"{t['bytes'] / 1024:>7.1f}  {pincode:<7}  {url}")
+    return lines
+
+
+# ---------- Module API (no-ops until enable()) ----------
+def enable(trace_path="trace.json", top=10, cprofile_path=None):
+    global _profiler
+    _profiler = Profiler(trace_path, top, cprofile_path)
+    _install_connection_hook()
+    logging.info("Profiling enabled, trace → %s", trace_path)
+    return _profiler
+
+
+def enabled():
+    return _profiler is not None
+
+
+def span(name, **args):
+    """Context manager yielding a Span, or None when profiling is off"""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _SpanContext(_profiler, name, args)
+
+
+def add(name, seconds, **args):
+    """Record a stage measured elsewhere (e.g. in a parser process) as ending now"""
+    if _profiler is None:
+        return
+    end = time.perf_counter()
+    s = Span(name, args)
+    s.start = end - seconds
+    _profiler.record(s, end)
+
+
+def current():
+    """Innermost open span on this thread"""
+    if _profiler is None:
+        return None
+    stack = _profiler.stack()
+    return stack[-1] if stack else None
+
+
+def start_cycle():
+    if _profiler is not None:
+        _profiler.start_cycle()
+
+
+def end_cycle():
+    if _profiler is not None:
+        _profiler.end_cycle()
+
+
+# ---------- DNS / connect timing ----------
+_original_create_connection = None
+
+
+def _install_connection_hook():
+    """Split new connections into DNS and connect phases of the current span"""
+    global _original_create_connection
+    from urllib3.util import connection
+    if _original_create_connection is not None:
+        return
+    _original_create_connection = connection.create_connection
+
+    def create_connection(address, *args, **kwargs):
+        span = current()
+        if span is None:
+            return _original_create_connection(address, *args, **kwargs)
+        host, port = address
+        started = time.perf_counter()
+        try:
+            # Resolve here, with the address families urllib3 would ask for, so the lookup can be timed
+            infos = socket.getaddrinfo(host.strip("[]"), port, connection.allowed_gai_family(), socket.SOCK_STREAM)
+        except OSError:
+            return _original_create_connection(address, *args, **kwargs)  # urllib3's usual resolution error
+        resolved = time.perf_counter()
+        span.phase("dns", started, resolved)
+        # Then try each address in turn like urllib3 does, each one through urllib3 itself
+        error = None
+        for info in infos:
+            try:
+                sock = _original_create_connection((info[4][0], port), *args, **kwargs)
+            except OSError as e:
+                error = e
+                continue
+            span.phase("connect", resolved, time.perf_counter())
+            return sock
+        raise error
+
+    connection.create_connection = create_connection
@@ -1,7 +1,14 @@
-import os, yaml
-from github import Github
+import os, sys, yaml, argparse
+from github import Auth, Github, GithubException, UnknownObjectException
+
+# The monitor's modules sit next to scripts/ (or under hotwheels-monitor/ for the repo-root copy)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, next((d for d in (ROOT, os.path.join(ROOT, "hotwheels-monitor"))
+                         if os.path.exists(os.path.join(d, "watchlist.py"))), ROOT))
+from watchlist import canonical_key
 
 CONFIG_FILE = "config.yaml"
+COMMANDS = ("/add", "/remove", "/list")
 
 def load_config():
     if os.path.exists(CONFIG_FILE):
@@ -13,55 +20,213 @@ def save_config(cfg):
     with open(CONFIG_FILE, "w", encoding="utf-8") as f:
         yaml.safe_dump(cfg, f, sort_keys=False)
 
+def get_repo():
+    # Actions sets GITHUB_API_URL; tests point it at fake_github.py
+    api_url = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    g = Github(auth=Auth.Token(os.environ["GITHUB_TOKEN"]), base_url=api_url)
+    return g.get_repo(os.environ["GITHUB_REPOSITORY"])
+
+# ---------- Watchlist ----------
+def target(url, pincode):
+    """The same product at the same pincode, whatever query string or tracking parameters the URL has"""
+    return canonical_key(url), str(pincode)
+
+class Watchlist:
+    """config.yaml products indexed by title and by (product, pincode), so commands don't scan the list"""
+
+    def __init__(self, cfg):
+        self.cfg = cfg or {}
+        self.entries = {}    # insertion order = config order
+        self.by_title = {}   # lower-case title -> entry keys
+        self.by_target = {}  # (canonical product key, pincode) -> entry key, as the bot and monitor match
+        self.inserted = 0
+        self.next_id = 1
+        for product in self.cfg.get("products") or []:
+            self._insert(product)
+
+    def _insert(self, product):
+        key = self.inserted = self.inserted + 1
+        self.entries[key] = product
+        self.by_title.setdefault(str(product.get("title", "")).lower(), set()).add(key)
+        self.by_target[target(product.get("url"), product.get("pincode"))] = key
+        pid = str(product.get("id", ""))
+        if pid.startswith("prod") and pid[4:].isdigit():
+            self.next_id = max(self.next_id, int(pid[4:]) + 1)
+
+    def add(self, title, url, pincode):
+        """The new entry, or None if this product and pincode are already watched"""
+        if target(url, pincode) in self.by_target:
+            return None
+        product = {"id": f"prod{self.next_id}", "title": title, "url": url, "pincode": pincode}
+        self._insert(product)
+        return product
+
+    def remove(self, title):
+        """Remove every entry with this title; returns how many there were"""
+        keys = self.by_title.pop(title.lower(), set())
+        for key in keys:
+            product = self.entries.pop(key)
+            self.by_target.pop(target(product.get("url"), product.get("pincode")), None)
+        return len(keys)
+
+    def products(self):
+        return list(self.entries.values())
+
+    def to_config(self):
+        return dict(self.cfg, products=self.products())
+
+# ---------- Watchlist in a SQLite store (config.yaml `watchlist_db`) ----------
+class StoreWatchlist:
+    """The Watchlist interface over watchstore.WatchlistStore: commands change the store, not config.yaml"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def add(self, title, url, pincode):
+        if self.store.find(url, pincode) is not None:
+            return None
+        product = {"title": title, "url": url, "pincode": pincode}
+        self.store.add(product, new_id=True)
+        return product
+
+    def remove(self, title):
+        return self.store.remove_titled(title)
+
+    def products(self):
+        return self.store.export_products()
+
+def store_replies(cfg, bodies):
+    """Apply command bodies to the watchlist_db store; if it isn't on this machine, refuse each command"""
+    path = cfg["watchlist_db"]
+    if not os.path.exists(path):
+        # A GitHub-hosted runner only has the repo: the store lives where the bot and monitor run
+        refusal = (f"⚠️ This watchlist is kept in `{path}` (`watchlist_db` in config.yaml), which this runner "
+                   "can't reach, so nothing was changed. Use the Telegram bot, or `python watchstore.py import` "
+                   "on the machine that has the store.")
+        # A throwaway Watchlist only tells complete commands (answered) from incomplete ones (left open)
+        return [refusal if apply_command(Watchlist({}), body)[0] is not None else None for body in bodies]
+    from watchstore import WatchlistStore
+    watchlist = StoreWatchlist(WatchlistStore(path))
+    return [apply_command(watchlist, body)[0] for body in bodies]
+
+def field(lines, name):
+    return next((l.split(":",1)[1].strip() for l in lines if l.lower().startswith(name + ":")), None)
+
+def is_command(body):
+    return (body or "").strip().lower().startswith(COMMANDS)
+
+def apply_command(watchlist, body):
+    """Apply one issue's command; returns (reply, changed), reply None if it isn't a complete command"""
+    body = (body or "").strip()
+    lines = body.splitlines()
+    command = body.lower()
+
+    if command.startswith("/add"):
+        title, url, pincode = field(lines, "title"), field(lines, "url"), field(lines, "pincode")
+        if not (title and url and pincode):
+            return None, False
+        if watchlist.add(title, url, pincode) is None:
+            return f"ℹ️ Already watching {url} [{pincode}]", False
+        return f"✅ Added product: **{title}** [{pincode}]", True
+
+    if command.startswith("/remove"):
+        title = field(lines, "title")
+        if not title:
+            return None, False
+        if not watchlist.remove(title):
+            return f"⚠️ No product titled **{title}** in the watchlist", False
+        return f"❌ Removed product: **{title}**", True
+
+    if command.startswith("/list"):
+        products = watchlist.products()
+        if not products:
+            return "📭 No products in watchlist.", False
+        msg = "\n".join([f"- **{p['title']}** [{p['pincode']}] → {p['url']}" for p in products])
+        return "📋 Current Watchlist:\n" + msg, False
+
+    return None, False
+
+def commit_config(repo, cfg, message, sha=None):
+    content = yaml.safe_dump(cfg, sort_keys=False)
+    if sha:
+        repo.update_file(CONFIG_FILE, message, content, sha)
+    else:
+        repo.create_file(CONFIG_FILE, message, content)
+
+# ---------- Single issue (one workflow run per issue) ----------
 def handle_issue():
     body = os.environ["ISSUE_BODY"].strip()
-    repo_name = os.environ["GITHUB_REPOSITORY"]
-    issue_number = os.environ["ISSUE_NUMBER"]
-    token = os.environ["GITHUB_TOKEN"]
-
-    g = Github(token)
-    repo = g.get_repo(repo_name)
-    issue = repo.get_issue(int(issue_number))
+    repo = get_repo()
+    issue = repo.get_issue(int(os.environ["ISSUE_NUMBER"]))
 
     cfg = load_config()
-    updated = False
-
-    if body.lower().startswith("/add"):
-        lines = body.splitlines()
-        title = next((l.split(":",1)[1].strip() for l in lines if l.lower().startswith("title:")), None)
-        url = next((l.split(":",1)[1].strip() for l in lines if l.lower().startswith("url:")), None)
-        pincode = next((l.split(":",1)[1].strip() for l in lines if l.lower().startswith("pincode:")), None)
-        if title and url and pincode:
-            pid = f"prod{len(cfg['products'])+1}"
-            cfg["products"].append({"id": pid, "title": title, "url": url, "pincode": pincode})
-            updated = True
-            issue.create_comment(f"✅ Added product: **{title}** [{pincode}]")
-            issue.edit(state="closed")
-
-    elif body.lower().startswith("/remove"):
-        lines = body.splitlines()
-        title = next((l.split(":",1)[1].strip() for l in lines if l.lower().startswith("title:")), None)
-        if title:
-            cfg["products"] = [p for p in cfg["products"] if p["title"].lower() != title.lower()]
-            updated = True
-            issue.create_comment(f"❌ Removed product: **{title}**")
-            issue.edit(state="closed")
-
-    elif body.lower().startswith("/list"):
-        if not cfg["products"]:
-            issue.create_comment("📭 No products in watchlist.")
-        else:
-            msg = "\n".join([f"- **{p['title']}** [{p['pincode']}] → {p['url']}" for p in cfg["products"]])
-            issue.create_comment("📋 Current Watchlist:\n" + msg)
-        issue.edit(state="closed")
+    if (cfg or {}).get("watchlist_db"):
+        reply, updated = store_replies(cfg, [body])[0], False
+    else:
+        watchlist = Watchlist(cfg)
+        reply, updated = apply_command(watchlist, body)
+        cfg = watchlist.to_config()
+    if reply is None:
+        return
 
     if updated:
-        if os.path.exists(CONFIG_FILE):
-            sha = repo.get_contents(CONFIG_FILE).sha
-            repo.update_file(CONFIG_FILE, "Update config via issue", yaml.safe_dump(cfg, sort_keys=False), sha)
-        else:
-            repo.create_file(CONFIG_FILE, "Create config via issue", yaml.safe_dump(cfg, sort_keys=False))
+        sha = repo.get_contents(CONFIG_FILE).sha if os.path.exists(CONFIG_FILE) else None
+        commit_config(repo, cfg, "Update config via issue", sha)
         save_config(cfg)
+    issue.create_comment(reply)
+    issue.edit(state="closed")
+
+# ---------- Batch (all pending issues, one commit) ----------
+def handle_batch(repo, attempts=3):
+    """Apply every open command issue in order, commit config.yaml once, then reply to and close each issue"""
+    issues = [i for i in repo.get_issues(state="open", sort="created", direction="asc")
+              if i.pull_request is None and is_command(i.body)]
+    if not issues:
+        print("No pending commands")
+        return 0
+
+    for attempt in range(attempts):
+        try:
+            contents = repo.get_contents(CONFIG_FILE)
+            cfg, sha = yaml.safe_load(contents.decoded_content), contents.sha
+        except UnknownObjectException:
+            cfg, sha = load_config(), None
+
+        if (cfg or {}).get("watchlist_db"):
+            # The store is the watchlist: commands go there and config.yaml is left alone
+            replies = [(issue, reply, False) for issue, reply in zip(issues, store_replies(cfg, [i.body for i in issues]))]
+            changed = []
+            break
+        watchlist = Watchlist(cfg)
+        replies = [(issue, *apply_command(watchlist, issue.body)) for issue in issues]
+        changed = [issue.number for issue, _, updated in replies if updated]
+        if not changed:
+            break
+        message = f"Update config via {len(changed)} issue(s): " + ", ".join(f"#{n}" for n in changed)
+        try:
+            commit_config(repo, watchlist.to_config(), message, sha)
+            break
+        except GithubException as e:
+            # Someone else committed config.yaml since we read it: re-read and re-apply
+            if e.status != 409 or attempt == attempts - 1:
+                raise
+            print(f"config.yaml changed upstream, retrying ({attempt + 1}/{attempts - 1})")
+
+    if changed:
+        save_config(watchlist.to_config())
+    for issue, reply, _ in replies:
+        if reply is None:
+            continue  # incomplete command; leave the issue open for the author to fix
+        issue.create_comment(reply)
+        issue.edit(state="closed")
+    print(f"Processed {len(issues)} issue(s), {len(changed)} changed config.yaml")
+    return len(issues)
 
 if __name__ == "__main__":
-    handle_issue()
+    parser = argparse.ArgumentParser(description="Apply watchlist commands from GitHub Issues to config.yaml")
+    parser.add_argument("--batch", action="store_true", help="Process all open command issues with a single commit")
+    args = parser.parse_args()
+    if args.batch:
+        handle_batch(get_repo())
+    else:
+        handle_issue()
@@ -0,0 +1,222 @@
+"""
+Title search over cached listings
+Inverted index from words to titles plus a trigram index over the words, so a
+query word also finds typos and prefixes of title words ("yoshy", "dash"),
+kept up to date as listings are cached: only titles not seen before are
+tokenised, and titles no cached listing holds any more are dropped
+"""
+
+import re
+import heapq
+from collections import Counter
+
+# Score of a query word by how it matched a title word
+EXACT, PREFIX, ONE_TYPO, TWO_TYPOS = 1.0, 0.8, 0.6, 0.4
+# Above this many equally scored titles, rank by walking the listing instead of scoring each
+RANK_ALL_UNDER = 200
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def words(text):
+    return _WORD_RE.findall(str(text or "").lower())
+
+
+def trigrams(word, closed=True):
+    """' mario ' -> {' ma', 'mar', 'ari', 'rio', 'io '}; open-ended for prefixes"""
+    padded = f" {word} " if closed else f" {word}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(word):
+    return 0 if len(word) < 5 else 1 if len(word) < 9 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edits (insert, delete, substitute, swap neighbours) from a to b; limit + 1 once it's over limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], before[j - 2] + 1)
+        # A swap can still reach back a row, so stop only once both rows are over the limit
+        if min(current) > limit and min(previous) >= limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def merge(groups, score, tids):
+    """Add title ids to a score group; sets are never changed in place, they may be postings"""
+    if score in groups:
+        groups[score] = groups[score] | tids
+    else:
+        groups[score] = tids
+
+
+class TitleIndex:
+    """Search index over the titles of every cached listing table"""
+
+    def __init__(self):
+        self.titles = []        # title id -> title, None once dropped
+        self.title_ids = {}     # title -> title id
+        self.free = []          # ids of dropped titles, reused by new ones
+        self.postings = {}      # word -> set of title ids
+        self.grams = {}         # trigram -> set of words
+        self.listings = {}      # pincode -> {title id: [table rows]}
+        self.listed = {}        # pincode -> set of its title ids
+        self.by_length = {}     # pincode -> its title ids, shortest title first
+
+    def _title_id(self, title):
+        tid = self.title_ids.get(title)
+        if tid is None:
+            if self.free:
+                tid = self.free.pop()
+                self.titles[tid] = title
+            else:
+                tid = len(self.titles)
+                self.titles.append(title)
+            self.title_ids[title] = tid
+            for word in set(words(title)):
+                if word not in self.postings:
+                    self.postings[word] = set()
+                    for gram in trigrams(word):
+                        self.grams.setdefault(gram, set()).add(word)
+                self.postings[word].add(tid)
+        return tid
+
+    def _drop(self, tid):
+        """Forget a title no listing holds any more, and the words only it had"""
+        title = self.titles[tid]
+        self.titles[tid] = None
+        del self.title_ids[title]
+        self.free.append(tid)
+        for word in set(words(title)):
+            postings = self.postings[word]
+            postings.discard(tid)
+            if not postings:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def add_listing(self, pincode, table):
+        """Index a pincode's ProductTable, replacing what was indexed for it before"""
+        pincode = str(pincode)
+        previous = self.listed.get(pincode, set())
+        rows = {}
+        for row, title in enumerate(table.titles):
+            rows.setdefault(self._title_id(title), []).append(row)
+        self.listings[pincode] = rows
+        self.listed[pincode] = set(rows)
+        # Shortest titles first: the tie-break order when a query matches most of the listing
+        self.by_length[pincode] = sorted(rows, key=lambda tid: len(self.titles[tid]))
+        for tid in previous - self.listed[pincode]:
+            if not any(tid in listed for listed in self.listed.values()):
+                self._drop(tid)
+
+    def expand(self, word):
+        """Index words a query word matches, as (word, score), best first"""
+        matches = {}
+        if word in self.postings:
+            matches[word] = EXACT
+        if len(word) >= 3:
+            # Title words starting with `word` hold all of its open-ended trigrams
+            sets = sorted((self.grams.get(g, ()) for g in trigrams(word, closed=False)), key=len)
+            for candidate in set(sets[0]).intersection(*sets[1:]):
+                if candidate.startswith(word):
+                    matches.setdefault(candidate, PREFIX)
+        limit = max_typos(word)
+        if limit:
+            # One edit changes at most 4 trigrams (a swap), so a close word shares all but 4 per typo
+            grams = trigrams(word)
+            shared = Counter(w for g in grams for w in self.grams.get(g, ()))
+            need = len(grams) - 4 * limit
+            for candidate, count in shared.items():
+                if count >= need and candidate not in matches:
+                    distance = edit_distance(word, candidate, limit)
+                    if distance <= limit:
+                        matches[candidate] = ONE_TYPO if distance == 1 else TWO_TYPOS
+        return sorted(matches.items(), key=lambda m: -m[1])
+
+    def search(self, pincode, query, table=None, limit=10):
+        """Table rows in `pincode`'s listing matching every query word, best first
+
+        Ranked by how well the words matched, then in-stock (when `table` is
+        given), then shorter titles. Pure lookups: nothing is fetched.
+        """
+        pincode = str(pincode)
+        listing = self.listings.get(pincode)
+        terms = words(query)
+        if not listing or not terms:
+            return []
+        expansions = [self.expand(term) for term in set(terms)]
+        if not all(expansions):
+            return []
+        # Rarest query word first, so the candidate set starts small
+        expansions.sort(key=lambda matches: sum(len(self.postings[w]) for w, _ in matches))
+        groups = None  # total score -> title ids, combined as whole sets
+        for matches in expansions:
+            if groups is not None:
+                candidates = set().union(*groups.values()) if len(groups) > 1 else next(iter(groups.values()))
+            elif len(listing) < len(self.title_ids):
+                candidates = self.listed[pincode]
+            else:
+                candidates = None  # the only listing indexed: every title is in it
+            by_word, seen = {}, set()
+            for word, score in matches:
+                # Best match first, so a title keeps the score of its closest word
+                hits = self.postings[word] if candidates is None else self.postings[word] & candidates
+                if seen:
+                    hits = hits - seen
+                if hits:
+                    merge(by_word, score, hits)
+                    if len(matches) > 1:
+                        seen |= hits
+            if groups is None:
+                groups = by_word
+            else:
+                combined = {}
+                for total, tids in groups.items():
+                    for score, hits in by_word.items():
+                        both = tids & hits
+                        if both:
+                            merge(combined, total + score, both)
+                groups = combined
+            if not groups:
+                return []
+
+        stock = table.stock if table is not None else None
+
+        def in_stock(tid):
+            return stock is None or any(stock[row] for row in listing[tid])
+
+        titles = self.titles
+        ranked = []
+        for total in sorted(groups, reverse=True):
+            tids, need = groups[total], limit - len(ranked)
+            if len(tids) <= RANK_ALL_UNDER:
+                ranked += heapq.nsmallest(need, tids, key=lambda tid: (not in_stock(tid), len(titles[tid]), tid))
+            else:
+                # Too many to rank one by one: walk the listing shortest title first until
+                # enough in-stock matches turn up
+                available, sold_out = [], []
+                for tid in self.by_length[pincode]:
+                    if tid in tids:
+                        if in_stock(tid):
+                            available.append(tid)
+                            if len(available) == need:
+                                break
+                        elif len(sold_out) < need:
+                            sold_out.append(tid)
+                ranked += (available + sold_out)[:need]
+            if len(ranked) >= limit:
+                break
+        return [row for tid in ranked for row in listing[tid]][:limit]
+
+    def __len__(self):
+        return len(self.title_ids)
@@ -0,0 +1,135 @@
+"""
+Sharded monitoring
+Workers split the watchlist with a consistent-hash ring and coordinate
+through leases and shared stock state in a local SQLite database
+"""
+
+import json
+import time
+import bisect
+import hashlib
+import sqlite3
+import logging
+import threading
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring; each worker owns many virtual points so shards stay even"""
+
+    def __init__(self, workers, vnodes=64):
+        self.points = sorted((_hash(f"{worker}#{i}"), worker) for worker in workers for i in range(vnodes))
+        self.hashes = [h for h, _ in self.points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        idx = bisect.bisect(self.hashes, _hash(key)) % len(self.points)
+        return self.points[idx][1]
+
+
+class ShardStore:
+    """Leases and stock state shared by all workers through one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (worker_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stock_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    # ---------- Leases ----------
+    def heartbeat(self, worker_id, lease_seconds):
+        """Create or extend this worker's lease"""
+        self._conn().execute(
+            "INSERT INTO leases (worker_id, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at",
+            (worker_id, time.time() + lease_seconds))
+
+    def release(self, worker_id):
+        self._conn().execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self):
+        """Workers holding an unexpired lease; expired ones are dropped"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        return sorted(row[0] for row in conn.execute("SELECT worker_id FROM leases WHERE expires_at > ?", (now,)))
+
+    # ---------- Shared state ----------
+    def get(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM stock_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __setitem__(self, key, record):
+        self._conn().execute(
+            "INSERT INTO stock_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(record)))
+
+    def swap(self, key, record, legacy_key=None):
+        """Atomically store a record and return the previous one (or legacy_key's, if key has none)"""
+        # Workers racing on a key during a handover see different previous
+        # values, so only one of them observes the restock and alerts
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM stock_state WHERE key = ?", (key,)).fetchone()
+            if row is None and legacy_key:
+                row = conn.execute("SELECT value FROM stock_state WHERE key = ?", (legacy_key,)).fetchone()
+            self[key] = record
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return json.loads(row[0]) if row else {}
+
+    def import_state(self, state):
+        """Seed shared state from a state.json dict, keeping newer shared records"""
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR IGNORE INTO stock_state (key, value) VALUES (?, ?)",
+            [(key, json.dumps(record)) for key, record in state.items()])
+
+
+class ShardWorker:
+    """Keeps a lease alive and answers whether this worker owns a product key"""
+
+    def __init__(self, store, worker_id, lease_seconds=60):
+        self.store = store
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.ring = None
+        self.workers = []
+        self.refreshed_at = 0.0
+
+    def refresh(self):
+        """Renew the lease and rebuild the ring from the currently live workers"""
+        self.store.heartbeat(self.worker_id, self.lease_seconds)
+        workers = self.store.live_workers()
+        if workers != self.workers:
+            logging.info("Shard membership: %s", ", ".join(workers))
+            self.workers = workers
+            self.ring = HashRing(workers)
+        self.refreshed_at = time.monotonic()
+
+    def owns(self, product_key):
+        # Refresh a few times per lease so dead workers' shards move within one lease period
+        if time.monotonic() - self.refreshed_at > self.lease_seconds / 3:
+            self.refresh()
+        return self.ring.owner(product_key) == self.worker_id
+
+    def stop(self):
+        self.store.release(self.worker_id)
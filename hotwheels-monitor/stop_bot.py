@@ -1,31 +1,40 @@
 #!/usr/bin/env python3
 """
 Script to stop the Telegram bot
+Finds it through its pidfile and asks it to shut down over its control socket
+(control.py), so it finishes in-flight work and saves its state
 """
 
 import os
+import time
 import signal
-import psutil
 
-def stop_bot():
+from control import ControlError, alive, read_pidfile, send
+
+def stop_bot(timeout=30):
     """Stop the running Telegram bot"""
-    try:
-        # Find and kill the telegram_bot.py process
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['cmdline'] and 'telegram_bot.py' in ' '.join(proc.info['cmdline']):
-                    print(f"🛑 Stopping bot process (PID: {proc.info['pid']})")
-                    proc.terminate()
-                    proc.wait(timeout=5)
-                    print("✅ Bot stopped successfully!")
-                    return
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                continue
-        
+    info = read_pidfile("bot")
+    if info is None:
         print("❌ Bot process not found or already stopped")
-        
-    except Exception as e:
-        print(f"❌ Error stopping bot: {e}")
+        return False
+    
+    pid = info["pid"]
+    print(f"🛑 Stopping bot process (PID: {pid})")
+    try:
+        send("bot", "stop", timeout=5)
+    except (ControlError, OSError) as e:
+        # Control socket gone or stuck: SIGTERM also shuts the bot down gracefully
+        print(f"⚠️ Control socket did not answer ({e}), sending SIGTERM")
+        os.kill(pid, signal.SIGTERM)
+    
+    deadline = time.monotonic() + timeout
+    while alive(pid):
+        if time.monotonic() > deadline:
+            print(f"❌ Bot still running after {timeout}s")
+            return False
+        time.sleep(0.2)
+    print("✅ Bot stopped successfully!")
+    return True
 
 if __name__ == "__main__":
     stop_bot()
@@ -5,30 +5,83 @@ Interactive bot with menus and product browsing
 """
 
 import os
-import json
+import asyncio
+import time
 import logging
+import secrets
+import argparse
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.ext import Application, BaseRateLimiter, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
+import metrics
+import profiling
 from firstcry_scraper import FirstCryScraper
+from photos import PhotoCache, fetch_image
+from products import ProductTable, format_price
+from search import TitleIndex, words
+from watchlist import SubscriptionIndex, subscribe
 import yaml
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-
 # Configuration
 CONFIG_FILE = "config.yaml"
 STATE_FILE = "bot_state.json"
+WEBHOOK_PATH = "telegram-webhook"
+# Browse filters: price caps in paise that the "Under" button steps through, and sort orders
+PRICE_LIMITS = (30000, 50000, 100000)
+SORT_ORDER = (None, "price", "-price")
+SORT_LABELS = {None: "↕️ Listing order", "price": "⬆️ Cheapest first", "-price": "⬇️ Priciest first"}
+# Pincodes offered by the Browse menu; the control socket's `warm` fetches their listings
+BROWSE_PINCODES = {"400001": "Mumbai", "110001": "Delhi", "560001": "Bangalore", "700001": "Kolkata", "600001": "Chennai"}
+
+def retry_seconds(error):
+    """RetryAfter.retry_after as seconds (a timedelta in newer python-telegram-bot releases)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        retry_after = retry_after.total_seconds()
+    return retry_after
+
+class RetryAfterLimiter(BaseRateLimiter):
+    """Retries Bot API calls that Telegram answered with 429, after the retry_after it asks for"""
+    
+    def __init__(self, max_retries=5):
+        self.max_retries = max_retries
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Telegram throttled %s, retrying in %ss", endpoint, retry_seconds(e))
+                await asyncio.sleep(retry_seconds(e))
 
 class HotWheelsBot:
     def __init__(self):
         self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        self.owner_chat = os.getenv("TELEGRAM_CHAT_ID")
         self.scraper = FirstCryScraper()
         self.products_cache = {}
         self.user_states = {}  # Track user interaction states
+        self.in_flight = {}  # Scrapes in progress, shared by every user asking for the same page
+        self.title_index = TitleIndex()  # Titles of every cached listing, for free-text search
+        self.photos = PhotoCache()  # Image URL -> Telegram file_id, shared with monitor.py
+        self.photo_uploads = {}  # First uploads in progress, by image URL
+        self.monitor_lock = asyncio.Lock()  # One monitor cycle or forced check at a time
+        self.application = None
+        self.loop = None
+        self.control = None  # control.ControlServer while running
+        self.egress_config = None
         
     def load_config(self):
         """Load configuration from YAML file"""
@@ -55,38 +108,45 @@ class HotWheelsBot:
     
     def get_pincode_menu(self):
         """Get pincode selection menu"""
-        keyboard = [
-            [InlineKeyboardButton("400001 (Mumbai)", callback_data="pincode_400001")],
-            [InlineKeyboardButton("110001 (Delhi)", callback_data="pincode_110001")],
-            [InlineKeyboardButton("560001 (Bangalore)", callback_data="pincode_560001")],
-            [InlineKeyboardButton("700001 (Kolkata)", callback_data="pincode_700001")],
-            [InlineKeyboardButton("600001 (Chennai)", callback_data="pincode_600001")],
-            [InlineKeyboardButton("Custom Pincode", callback_data="custom_pincode")]
-        ]
+        keyboard = [[InlineKeyboardButton(f"{pincode} ({city})", callback_data=f"pincode_{pincode}")]
+                    for pincode, city in BROWSE_PINCODES.items()]
+        keyboard.append([InlineKeyboardButton("Custom Pincode", callback_data="custom_pincode")])
         return InlineKeyboardMarkup(keyboard)
     
-    def get_product_list_keyboard(self, products, page=0, pincode="400001"):
-        """Get product list keyboard with pagination"""
+    def get_product_list_keyboard(self, products, page=0, pincode="400001", rows=None, view=None):
+        """Get product list keyboard with pagination; `rows` are the table rows left after filtering"""
         keyboard = []
         items_per_page = 5
         start_idx = page * items_per_page
         end_idx = start_idx + items_per_page
+        rows = list(range(len(products))) if rows is None else rows
+        view = view or {}
         
-        for i, product in enumerate(products[start_idx:end_idx], start_idx):
+        for row in rows[start_idx:end_idx]:
+            product = products[row]
             stock_emoji = "✅" if product['in_stock'] else "❌"
             button_text = f"{stock_emoji} {product['title'][:30]}..."
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"product_{i}")])
+            # Row in the cached table, so the button survives filter changes
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"product_{row}")])
         
         # Pagination buttons
         nav_buttons = []
         if page > 0:
             nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"page_{page-1}"))
-        if end_idx < len(products):
+        if end_idx < len(rows):
             nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{page+1}"))
         
         if nav_buttons:
             keyboard.append(nav_buttons)
         
+        # Filter and sort buttons show the current setting; pressing one moves to the next
+        max_price = view.get("max_price")
+        keyboard.append([
+            InlineKeyboardButton("✅ In stock only" if view.get("in_stock") else "📦 All stock", callback_data="filter_stock"),
+            InlineKeyboardButton(f"💸 Under {format_price(max_price)}" if max_price else "💸 Any price", callback_data="filter_price"),
+            InlineKeyboardButton(SORT_LABELS[view.get("sort")], callback_data="sort_price"),
+        ])
+        
         # Back button
         keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")])
         
@@ -99,6 +159,7 @@ class HotWheelsBot:
 
 I can help you:
 • 🔍 Browse all HotWheels on FirstCry
+• 🔎 Search by name: just type it, e.g. "mario kart yoshi"
 • 📋 Manage your watchlist
 • 🔔 Get notified when products are back in stock
 • 🧪 Test notifications
@@ -114,6 +175,12 @@ Choose an option below:
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle callback queries"""
+        # Time per action (browse, pincode, page, product, add, ...)
+        action = update.callback_query.data.split("_")[0]
+        with metrics.HANDLER_SECONDS.time(action=action), profiling.span("handler", action=action):
+            await self._handle_callback(update, context)
+    
+    async def _handle_callback(self, update, context):
         query = update.callback_query
         await query.answer()
         
@@ -150,6 +217,11 @@ Choose an option below:
             pincode = self.user_states.get(f"{user_id}_pincode", "400001")
             await self.show_hotwheels_list(query, pincode, page)
         
+        elif data.startswith(("filter_", "sort_")):
+            pincode = self.user_states.get(f"{user_id}_pincode", "400001")
+            self.update_view(user_id, data)
+            await self.show_hotwheels_list(query, pincode)
+        
         elif data.startswith("product_"):
             product_idx = int(data.split("_")[1])
             pincode = self.user_states.get(f"{user_id}_pincode", "400001")
@@ -181,13 +253,18 @@ Choose an option below:
         
         # Check cache first
         cache_key = f"products_{pincode}"
+        metrics.CACHE_REQUESTS.inc(cache="listing", result="hit" if cache_key in self.products_cache else "miss")
         if cache_key not in self.products_cache:
             await query.edit_message_text("🔍 **Searching for HotWheels products...**\n\nThis may take a moment...", parse_mode='Markdown')
             
-            products = self.scraper.search_hotwheels(pincode=pincode, max_pages=3)
-            self.products_cache[cache_key] = products
-        else:
-            products = self.products_cache[cache_key]
+            # Another user's search may have filled the cache while the message was being edited
+            if cache_key not in self.products_cache:
+                table = await self.single_flight(cache_key, self.fetch_products, pincode)
+                self.products_cache[cache_key] = table
+                self.title_index.add_listing(pincode, table)
+        products = self.products_cache[cache_key]
+        view = self.user_states.get(f"{user_id}_view") or {}
+        rows = products.select(**view)
         
         if not products:
             await query.edit_message_text(
@@ -200,16 +277,50 @@ Choose an option below:
             return
         
         text = f"🚗 **HotWheels Products (Pincode: {pincode})**\n\n"
-        text += f"Found {len(products)} products. Page {page + 1}:\n\n"
+        text += f"Found {len(products)} products"
+        if len(rows) != len(products):
+            text += f", {len(rows)} match your filters"
+        text += f". Page {page + 1}:\n\n"
         
         await query.edit_message_text(
             text,
-            reply_markup=self.get_product_list_keyboard(products, page, pincode),
+            reply_markup=self.get_product_list_keyboard(products, page, pincode, rows, view),
             parse_mode='Markdown'
         )
     
-    async def show_product_details(self, query, product_idx, pincode):
-        """Show detailed product information"""
+    def fetch_products(self, pincode):
+        """Scrape a pincode's listing into a compact table (runs in a worker thread)"""
+        return ProductTable.from_dicts(self.scraper.search_hotwheels(pincode=pincode, max_pages=3))
+    
+    def update_view(self, user_id, action):
+        """Step a user's listing filter or sort setting"""
+        view = dict(self.user_states.get(f"{user_id}_view") or {})
+        if action == "filter_stock":
+            view["in_stock"] = not view.get("in_stock")
+        elif action == "filter_price":
+            limits = PRICE_LIMITS + (None,)
+            view["max_price"] = limits[(limits.index(view.get("max_price")) + 1) % len(limits)]
+        elif action == "sort_price":
+            view["sort"] = SORT_ORDER[(SORT_ORDER.index(view.get("sort")) + 1) % len(SORT_ORDER)]
+        self.user_states[f"{user_id}_view"] = view
+    
+    async def single_flight(self, key, fetch, *args, **kwargs):
+        """Run a blocking scrape in a thread, joining one already in flight for the same key"""
+        task = self.in_flight.get(key)
+        metrics.CACHE_REQUESTS.inc(cache="single_flight", result="miss" if task is None else "joined")
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(fetch, *args, **kwargs))
+            self.in_flight[key] = task
+        try:
+            # shield: one user's cancelled handler must not cancel the scrape for everyone else
+            return await asyncio.shield(task)
+        finally:
+            # Dropped only once a caller resumes, so it can cache the result before anyone else looks
+            if self.in_flight.get(key) is task:
+                del self.in_flight[key]
+    
+    async def show_product_details(self, query, product_idx, pincode, photo=True):
+        """Show detailed product information, followed by the product photo"""
         cache_key = f"products_{pincode}"
         products = self.products_cache.get(cache_key, [])
         
@@ -220,10 +331,11 @@ Choose an option below:
         product = products[product_idx]
         
         # Get detailed stock status
-        details = self.scraper.get_product_details(product['url'], pincode)
+        details = await self.single_flight(("details", product['url'], pincode),
+                                           self.scraper.get_product_details, product['url'], pincode)
         
         text = f"🚗 **{product['title']}**\n\n"
-        text += f"💰 **Price:** {product['price']}\n"
+        text += f"💰 **Price:** {product.price_text}\n"
         text += f"📦 **Stock:** {'✅ In Stock' if details['in_stock'] else '❌ Out of Stock'}\n"
         text += f"📍 **Pincode:** {pincode}\n\n"
         text += f"🔗 **URL:** {product['url']}\n\n"
@@ -238,6 +350,55 @@ Choose an option below:
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
+        
+        if photo and product['image_url']:
+            try:
+                await self.send_product_photo(query.get_bot(), query.from_user.id, product['image_url'],
+                                              f"{product['title']}\n{product.price_text}")
+            except TelegramError as e:
+                logging.warning("Failed to send photo of %s: %s", product['url'], e)
+    
+    async def send_product_photo(self, bot, chat_id, image_url, caption):
+        """Send a product photo by its cached file_id; None if the image couldn't be sent
+        
+        The first send downloads and uploads the image; users asking for it meanwhile
+        wait for that upload and then send the file_id Telegram gave it.
+        """
+        file_id = self.photos.get(self.bot_token, image_url)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            except BadRequest as e:
+                logging.warning("Telegram rejected the cached photo for %s (%s), uploading it again", image_url, e)
+                self.photos.forget(self.bot_token, image_url)
+        upload = self.photo_uploads.get(image_url)
+        if upload is None:
+            upload = asyncio.ensure_future(self.upload_photo(bot, chat_id, image_url, caption))
+            self.photo_uploads[image_url] = upload
+            try:
+                # shield: the upload serves every waiting user, not just this handler
+                return await asyncio.shield(upload)
+            finally:
+                if self.photo_uploads.get(image_url) is upload:
+                    del self.photo_uploads[image_url]
+        try:
+            await asyncio.shield(upload)
+        except TelegramError as e:
+            logging.warning("Photo upload for %s failed: %s", image_url, e)
+        file_id = self.photos.get(self.bot_token, image_url)
+        if not file_id:
+            return None
+        return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+    
+    async def upload_photo(self, bot, chat_id, image_url, caption):
+        """Download an image and upload it to one chat, caching the file_id Telegram returns"""
+        data = await asyncio.to_thread(fetch_image, image_url)
+        if data is None:
+            return None
+        message = await bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+        if message.photo:
+            self.photos.put(self.bot_token, image_url, message.photo[-1].file_id)
+        return message
     
     async def add_to_watchlist(self, query, product_idx):
         """Add product to watchlist"""
@@ -252,36 +413,41 @@ Choose an option below:
         
         product = products[product_idx]
         
+        from monitor import open_watchlist
+        
         # Load current config
         config = self.load_config()
+        store = open_watchlist(config)
         
-        # Check if product already exists
-        existing = any(p['url'] == product['url'] and p.get('pincode') == pincode for p in config['products'])
-        
-        if existing:
+        # One entry per (product, pincode); each user just joins its subscribers
+        if store is not None:
+            # A single transaction: no config.yaml rewrite, and concurrent adds can't overwrite each other
+            added = await asyncio.to_thread(store.subscribe, product, pincode, user_id, self.owner_chat)
+        else:
+            added = subscribe(config['products'], product, pincode, user_id, default_chat=self.owner_chat)
+        if not added:
             await query.answer("❌ Product already in watchlist!")
             return
         
-        # Add to watchlist
-        new_product = {
-            'id': f"prod{len(config['products']) + 1}",
-            'title': product['title'],
-            'url': product['url'],
-            'pincode': pincode
-        }
-        
-        config['products'].append(new_product)
-        self.save_config(config)
+        if store is None:
+            self.save_config(config)
         
         await query.answer("✅ Added to watchlist!")
         
         # Show updated product details
-        await self.show_product_details(query, product_idx, pincode)
+        await self.show_product_details(query, product_idx, pincode, photo=False)
     
     async def show_watchlist(self, query):
         """Show user's watchlist"""
+        from monitor import open_watchlist
+        
         config = self.load_config()
-        products = config.get('products', [])
+        store = open_watchlist(config)
+        if store is not None:
+            products = await asyncio.to_thread(store.for_chat, query.from_user.id, self.owner_chat)
+        else:
+            index = SubscriptionIndex.from_products(config.get('products', []), self.owner_chat)
+            products = index.for_chat(query.from_user.id)
         
         if not products:
             text = "📭 **Your watchlist is empty!**\n\nUse the Browse option to find and add HotWheels products."
@@ -312,7 +478,7 @@ Choose an option below:
         
         test_message = "🧪 **Test notification from HotWheels Monitor!**\n\nYour Telegram notifications are working correctly! 🎉"
         
-        success = send_telegram(self.bot_token, str(query.from_user.id), test_message)
+        success = await asyncio.to_thread(send_telegram, self.bot_token, str(query.from_user.id), test_message)
         
         if success:
             await query.answer("✅ Test notification sent!")
@@ -346,6 +512,9 @@ Choose an option below:
                     "❌ **Invalid pincode!**\n\nPlease enter a valid 6-digit pincode.",
                     parse_mode='Markdown'
                 )
+        elif words(text) and self.title_index.listings:
+            with metrics.HANDLER_SECONDS.time(action="search"), profiling.span("handler", action="search"):
+                await self.show_search_results(update.message, user_id, text)
         else:
             await update.message.reply_text(
                 "🤖 **HotWheels Monitor Bot**\n\nUse the menu below to get started!",
@@ -353,22 +522,306 @@ Choose an option below:
                 parse_mode='Markdown'
             )
     
-    def run(self):
-        """Start the bot"""
-        if not self.bot_token:
-            logging.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
-            return
+    async def show_search_results(self, message, user_id, text):
+        """Answer a free-text search from the cached listings; never scrapes"""
+        # The user's pincode if its listing is cached, otherwise the last one browsed by anyone
+        pincode = self.user_states.get(f"{user_id}_pincode")
+        if pincode not in self.title_index.listings:
+            pincode = next(reversed(self.title_index.listings))
+        products = self.products_cache[f"products_{pincode}"]
+        rows = self.title_index.search(pincode, text, products)
+        self.user_states[f"{user_id}_pincode"] = pincode
+        query = " ".join(words(text))
+        
+        if not rows:
+            text = f"🔎 **No matches for \"{query}\"** (Pincode: {pincode})\n\nTry fewer words or browse the full list."
+        else:
+            text = f"🔎 **{len(rows)} results for \"{query}\"** (Pincode: {pincode})\n\nBest matches first:"
+        keyboard = []
+        for row in rows:
+            product = products[row]
+            stock_emoji = "✅" if product['in_stock'] else "❌"
+            keyboard.append([InlineKeyboardButton(f"{stock_emoji} {product['title'][:30]}...", callback_data=f"product_{row}")])
+        keyboard.append([InlineKeyboardButton("🔍 Browse HotWheels", callback_data="browse")])
+        keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")])
+        
+        await message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    
+    async def monitor_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Run one stock monitoring cycle on the bot's scraper and alert through this bot"""
+        from monitor import run_cycle
         
-        application = Application.builder().token(self.bot_token).build()
+        results = await self.run_monitor_check(context.bot, run_cycle)
+        logging.info("Monitor job checked %d products", len(results))
+    
+    async def run_monitor_check(self, bot, check, *args):
+        """Run monitor.run_cycle or monitor.check_product in a thread on the saved state, alerting through this bot"""
+        from monitor import load_state, save_state, load_channels, notify_all
+        
+        async with self.monitor_lock:
+            config = self.load_config()
+            state = load_state()
+            channels = load_channels(config)
+            loop = asyncio.get_running_loop()
+            deliveries = []
+            
+            def on_alert(product, subject, message, subscribers, detected_at):
+                # Runs in the worker thread: hand the Telegram fan-out back to the bot's event loop
+                deliveries.append(asyncio.run_coroutine_threadsafe(
+                    self.fan_out(bot, subscribers, message, detected_at=detected_at,
+                                 image_url=product.get("image_url")), loop))
+                notify_all(channels, subject, message, subscribers, telegram=False)
+            
+            results = await asyncio.to_thread(check, config, state, self.scraper, on_alert, *args,
+                                              default_chat=self.owner_chat)
+            # concurrent.futures from the worker thread; only wrapped here, on the loop
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in deliveries))
+            save_state(state)
+        self.refresh_cached_stock(result for result in results if result["in_stock"] is not None)
+        return results
+    
+    async def fan_out(self, bot, chat_ids, message, detected_at=None, image_url=None):
+        """Send one alert to every subscriber, paced under Telegram's bulk limit"""
+        from monitor import TELEGRAM_BATCH_INTERVAL
+        
+        for chat_id in chat_ids:
+            started = time.perf_counter()
+            for _ in range(3):
+                try:
+                    await self.send_alert(bot, chat_id, message, image_url)
+                    metrics.NOTIFY_SECONDS.observe(time.perf_counter() - started, channel="telegram")
+                    break
+                except RetryAfter as e:
+                    await asyncio.sleep(retry_seconds(e))
+                except TelegramError as e:
+                    logging.error("Failed to send Telegram alert to %s: %s", chat_id, e)
+                    metrics.NOTIFY_FAILURES.inc(channel="telegram")
+                    break
+            else:
+                logging.error("Telegram kept throttling chat %s, giving up", chat_id)
+                metrics.NOTIFY_FAILURES.inc(channel="telegram")
+            await asyncio.sleep(TELEGRAM_BATCH_INTERVAL)
+        if detected_at is not None:
+            metrics.DETECTION_SECONDS.observe(time.monotonic() - detected_at)
+    
+    async def send_alert(self, bot, chat_id, message, image_url=None):
+        """An alert as the caption of the product photo when there is one, else as text"""
+        from monitor import TELEGRAM_CAPTION_LIMIT
+        
+        if image_url and len(message) <= TELEGRAM_CAPTION_LIMIT:
+            try:
+                if await self.send_product_photo(bot, chat_id, image_url, message):
+                    return
+            except BadRequest as e:
+                logging.warning("Telegram rejected the photo at %s (%s), sending text", image_url, e)
+        await bot.send_message(chat_id=chat_id, text=message)
+    
+    def refresh_cached_stock(self, results):
+        """Copy fresh stock results from the monitor into cached browse listings"""
+        for result in results:
+            product = result["product"]
+            table = self.products_cache.get(f"products_{product.get('pincode')}")
+            row = table.row_of(product['url']) if table else None
+            if row is not None:
+                table.set_stock(row, result["in_stock"])
+    
+    async def start_control(self, application):
+        """Open the control socket (control.py) once the application is up"""
+        from control import ControlServer
+        from monitor import check_product
+        
+        self.application = application
+        self.loop = asyncio.get_running_loop()
+        self.control = ControlServer("bot", {
+            "stats": self.control_stats,
+            "stop": self.control_stop,
+            "reload": lambda: self.on_loop(self.reload_config()),
+            "flush": lambda cache="all": self.on_loop(self.flush_caches(cache)),
+            "warm": lambda pincode=None: self.on_loop(self.warm_listings(pincode)),
+            "check": lambda url, pincode=None: self.on_loop(
+                self.run_monitor_check(application.bot, check_product, url, pincode)),
+        }).start()
+    
+    async def stop_control(self, application):
+        if self.control:
+            self.control.stop()
+    
+    def on_loop(self, coro, timeout=300):
+        """Run a coroutine on the bot's event loop from a control connection and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+    
+    def control_stats(self):
+        cache = self.scraper.cache
+        return {
+            "pid": os.getpid(),
+            "listings": {key[len("products_"):]: len(table) for key, table in list(self.products_cache.items())},
+            "titles": len(self.title_index),
+            "scrapes_in_flight": len(self.in_flight),
+            "http_cache": cache.stats() if cache is not None else None,
+            "egress": self.scraper.egress.stats() if self.scraper.egress is not None else None,
+            "metrics": metrics.snapshot(),
+        }
+    
+    def control_stop(self):
+        """Stop polling and shut down as on Ctrl+C"""
+        self.loop.call_soon_threadsafe(self.application.stop_running)
+        return {"stopping": True}
+    
+    async def reload_config(self):
+        """Pick up config.yaml's pacing and egress changes; handlers already read the watchlist per use"""
+        from monitor import egress_pool
+        
+        config = self.load_config()
+        if self.application.job_queue and self.application.job_queue.get_jobs_by_name("stock_monitor"):
+            self.scraper.rate_limiter.interval = config.get("delay_between_requests", 3)
+        if config.get("egress") != self.egress_config:
+            # A new pool starts every endpoint healthy again, so only rebuild it when the list changed
+            self.egress_config = config.get("egress")
+            self.scraper.egress = egress_pool(config, self.scraper.rate_limiter.interval)
+        return {"delay_between_requests": self.scraper.rate_limiter.interval,
+                "egress": sorted(self.scraper.egress.endpoints) if self.scraper.egress is not None else []}
+    
+    async def flush_caches(self, cache="all"):
+        """Drop cached browse listings and their search index ("listings"), the HTTP cache ("http"), or both ("all")"""
+        if cache not in ("listings", "http", "all"):
+            raise ValueError(f"unknown cache {cache!r}; use listings, http or all")
+        flushed = {}
+        if cache in ("listings", "all"):
+            flushed["listings"] = len(self.products_cache)
+            self.products_cache.clear()
+            self.title_index = TitleIndex()
+        if cache in ("http", "all") and self.scraper.cache is not None:
+            flushed["http"] = await asyncio.to_thread(self.scraper.cache.clear)
+        return flushed
+    
+    async def warm_listings(self, pincode=None):
+        """Fetch the browse listing of a pincode (default: every Browse menu pincode) into the cache"""
+        warmed = {}
+        for pincode in [str(pincode)] if pincode else BROWSE_PINCODES:
+            cache_key = f"products_{pincode}"
+            table = await self.single_flight(cache_key, self.fetch_products, pincode)
+            self.products_cache[cache_key] = table
+            self.title_index.add_listing(pincode, table)
+            warmed[pincode] = len(table)
+        return warmed
+    
+    def build_application(self, base_url=None, concurrent_updates=1):
+        """Build the Application and register handlers"""
+        builder = (Application.builder().token(self.bot_token)
+                   .concurrent_updates(concurrent_updates)
+                   .rate_limiter(RetryAfterLimiter()))
+        if base_url:
+            builder = builder.base_url(base_url)
+        application = builder.build()
         
         # Add handlers
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CallbackQueryHandler(self.handle_callback))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         
-        logging.info("🤖 Starting HotWheels Monitor Bot...")
-        application.run_polling()
+        metrics.QUEUE_DEPTH.set_function(application.update_queue.qsize, queue="telegram_updates")
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.in_flight), queue="bot_scrapes")
+        return application
+    
+    def run(self, webhook=False, webhook_url=None, listen="127.0.0.1", port=8443,
+            secret_token=None, max_connections=40, concurrent_updates=1, monitor_interval=None,
+            parsers=0, metrics_port=0, profile=None, profile_top=10, cprofile=None):
+        """Start the bot, long polling by default or behind a webhook"""
+        if not self.bot_token:
+            logging.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
+            return
+        
+        if parsers:
+            # Parse listing/product pages in worker processes so handlers don't contend for the GIL
+            from concurrent.futures import ProcessPoolExecutor
+            self.scraper.parser_pool = ProcessPoolExecutor(max_workers=parsers)
+        
+        application = self.build_application(concurrent_updates=concurrent_updates)
+        
+        if metrics_port:
+            metrics.serve(metrics_port)
+        if profile:
+            # Traces are written after each monitor cycle and on shutdown
+            profiling.enable(profile, profile_top, cprofile)
+        
+        if monitor_interval:
+            if application.job_queue is None:
+                logging.error("Monitoring needs the job queue: pip install \"python-telegram-bot[job-queue]\"")
+                return
+            # Browsing and monitoring share one rate limiter
+            self.scraper.rate_limiter.interval = self.load_config().get("delay_between_requests", 3)
+            application.job_queue.run_repeating(self.monitor_job, interval=monitor_interval, first=10, name="stock_monitor")
+            logging.info("Stock monitor scheduled every %s seconds", monitor_interval)
+        
+        from monitor import egress_pool
+        # Spread FirstCry requests over config.yaml's egress endpoints, if any, each paced like the scraper
+        config = self.load_config()
+        self.egress_config = config.get("egress")
+        self.scraper.egress = egress_pool(config, self.scraper.rate_limiter.interval)
+        # stop_bot.py and control.py find the bot through its pidfile and control socket
+        application.post_init = self.start_control
+        application.post_shutdown = self.stop_control
+        
+        if not webhook:
+            logging.info("🤖 Starting HotWheels Monitor Bot (polling)...")
+            application.run_polling()
+            profiling.end_cycle()
+            return
+        
+        if not webhook_url:
+            logging.error("Webhook mode needs a public URL (--webhook-url or TELEGRAM_WEBHOOK_URL)")
+            return
+        
+        # Telegram echoes this in X-Telegram-Bot-Api-Secret-Token; requests without it are rejected
+        secret_token = secret_token or secrets.token_urlsafe(32)
+        logging.info("🤖 Starting HotWheels Monitor Bot (webhook on %s:%s, max %s connections)...",
+                     listen, port, max_connections)
+        application.run_webhook(
+            listen=listen,
+            port=port,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{webhook_url.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            max_connections=max_connections,
+        )
+        profiling.end_cycle()
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="HotWheels Monitor Telegram Bot")
+    parser.add_argument("--webhook", action="store_true", help="Receive updates via webhook instead of polling")
+    parser.add_argument("--webhook-url", default=os.getenv("TELEGRAM_WEBHOOK_URL"), help="Public base URL Telegram posts updates to")
+    parser.add_argument("--listen", default=os.getenv("TELEGRAM_WEBHOOK_LISTEN", "127.0.0.1"), help="Local address for the webhook server")
+    parser.add_argument("--port", type=int, default=int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443")), help="Local port for the webhook server")
+    parser.add_argument("--secret-token", default=os.getenv("TELEGRAM_WEBHOOK_SECRET"), help="Secret token Telegram must send with each update")
+    parser.add_argument("--max-connections", type=int, default=int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40")), help="Max simultaneous webhook connections (1-100)")
+    parser.add_argument("--concurrent-updates", type=int, default=int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", "1")), help="Number of updates processed concurrently")
+    parser.add_argument("--parsers", type=int, default=0, help="Parse FirstCry pages in this many worker processes")
+    parser.add_argument("--monitor", action="store_true", help="Also run the stock monitor inside the bot process")
+    parser.add_argument("--monitor-interval", type=int, default=int(os.getenv("MONITOR_INTERVAL", "900")), help="Seconds between monitoring cycles")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "0")), help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--profile", nargs="?", const="trace.json", help="Write a Chrome trace per monitor cycle and on exit (default: trace.json)")
+    parser.add_argument("--profile-top", type=int, default=10, help="Slowest products listed with --profile")
+    parser.add_argument("--cprofile", help="With --profile, also dump cProfile stats of each monitor cycle")
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    
     bot = HotWheelsBot()
-    bot.run()
+    bot.run(
+        webhook=args.webhook,
+        webhook_url=args.webhook_url,
+        listen=args.listen,
+        port=args.port,
+        secret_token=args.secret_token,
+        max_connections=args.max_connections,
+        concurrent_updates=args.concurrent_updates,
+        monitor_interval=args.monitor_interval if args.monitor else None,
+        parsers=args.parsers,
+        metrics_port=args.metrics_port,
+        profile=args.profile,
+        profile_top=args.profile_top,
+        cprofile=args.cprofile,
+    )
+
+if __name__ == "__main__":
+    main()
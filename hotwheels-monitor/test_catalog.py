@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test catalog snapshots and the diffs their crawls report
+"""
+
+import pytest
+
+import catalog
+from catalog import CatalogSnapshot, crawl
+
+PAGE_SIZE = 3
+
+
+def car(pid, price=199, in_stock=True):
+    return {"title": f"Car {pid}", "url": f"https://www.firstcry.com/hot-wheels/car/{pid}/product-detail",
+            "price": price, "in_stock": in_stock}
+
+
+class ListingScraper:
+    """fetch_listing over an in-memory listing, newest first; `fail_at` makes that page's fetch fail"""
+
+    def __init__(self, products):
+        self.products = products
+        self.fail_at = None
+        self.fetched = []
+
+    def fetch_listing(self, pincode, page=1, sort="popularity"):
+        self.fetched.append(page)
+        if page == self.fail_at:
+            return None
+        return [dict(p) for p in self.products[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return CatalogSnapshot("400001", str(tmp_path / "catalog_400001.json"))
+
+
+@pytest.fixture
+def scraper():
+    return ListingScraper([car(10000 + n) for n in range(9, 0, -1)])
+
+
+def test_first_crawl_adds_everything(snapshot, scraper):
+    diff = crawl(scraper, snapshot)
+    assert len(diff.added) == 9 and not (diff.removed or diff.price_changed or diff.stock_changed)
+    assert diff.complete and scraper.fetched == [1, 2, 3, 4]
+    assert snapshot.full_crawl_at and len(snapshot.products) == 9
+
+
+def test_refresh_stops_at_the_first_unchanged_page(snapshot, scraper):
+    crawl(scraper, snapshot)
+    scraper.products.insert(0, car(10010))
+    scraper.fetched.clear()
+    diff = crawl(scraper, snapshot, full=False)
+    # Page 1 holds the new car, page 2 only known ones: nothing further down is fetched
+    assert [p["url"] for p in diff.added] == [car(10010)["url"]]
+    assert scraper.fetched == [1, 2] and diff.pages == 2 and not diff.complete
+
+
+def test_early_stop_misses_changes_below_and_never_reports_removals(snapshot, scraper):
+    crawl(scraper, snapshot)
+    scraper.products[7]["price"] = 149  # page 3
+    del scraper.products[8]
+    diff = crawl(scraper, snapshot, full=False)
+    assert not diff and not diff.complete
+    assert len(snapshot.products) == 9
+
+    diff = crawl(scraper, snapshot, full=True)
+    assert [r["title"] for r in diff.removed] == ["Car 10001"]
+    assert [(r["title"], old, r["price"]) for r, old in diff.price_changed] == [("Car 10002", 199, 149)]
+    assert len(snapshot.products) == 8
+
+
+def test_stock_changes_are_reported_once(snapshot, scraper):
+    crawl(scraper, snapshot)
+    scraper.products[0]["in_stock"] = False
+    diff = crawl(scraper, snapshot, full=False)
+    assert [(r["title"], was) for r, was in diff.stock_changed] == [("Car 10009", True)]
+    assert not diff.price_changed
+    assert not crawl(scraper, snapshot, full=False)
+
+
+def test_failed_page_keeps_the_rest_of_the_snapshot(snapshot, scraper):
+    crawl(scraper, snapshot)
+    full_crawl_at = snapshot.full_crawl_at
+    scraper.fail_at = 2
+    diff = crawl(scraper, snapshot, full=True)
+    assert not diff.removed and not diff.complete
+    assert len(snapshot.products) == 9 and snapshot.full_crawl_at == full_crawl_at
+
+
+def test_snapshot_survives_save_and_load(snapshot, scraper):
+    crawl(scraper, snapshot)
+    snapshot.save()
+    loaded = CatalogSnapshot.load("400001", snapshot.path)
+    assert loaded.products == snapshot.products
+    assert loaded.full_crawl_at == snapshot.full_crawl_at and not loaded.needs_full_crawl()
+    assert not crawl(scraper, loaded, full=False)
+
+
+def test_crawl_stops_before_a_page_that_would_end_past_the_deadline(snapshot, scraper, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog.time, "monotonic", lambda: now[0])
+    fetch = scraper.fetch_listing
+
+    def slow(*args, **kwargs):
+        now[0] += 3
+        return fetch(*args, **kwargs)
+
+    scraper.fetch_listing = slow
+    diff = crawl(scraper, snapshot, full=True, deadline=now[0] + 7)
+    assert scraper.fetched == [1, 2] and now[0] <= 1007
+    assert not diff.complete and not diff.removed and not snapshot.full_crawl_at
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the control socket: command dispatch, the pidfile and the inbox
+"""
+
+import os
+import sys
+import json
+import threading
+import subprocess
+
+import pytest
+
+import control
+from control import ControlError, ControlServer, Inbox
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    return str(tmp_path / "run")
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_dispatch_runs_commands_and_reports_errors():
+    server = ControlServer("test", {"add": lambda a, b: int(a) + int(b)})
+    assert server.dispatch(b'{"cmd": "add", "a": 2, "b": "3"}') == {"ok": True, "result": 5}
+    assert server.dispatch(b'{"cmd": "ping"}')["result"]["pid"] == os.getpid()
+    unknown = server.dispatch(b'{"cmd": "nope"}')
+    assert not unknown["ok"] and "add, ping" in unknown["error"]
+    assert server.dispatch(b'{"cmd": "add", "a": 1}')["error"].startswith("TypeError")
+    assert server.dispatch(b"not json")["error"].startswith("JSONDecodeError")
+
+
+def test_commands_reach_the_process_through_its_pidfile(run_dir):
+    server = ControlServer("test", {"echo": lambda **kwargs: kwargs}, run_dir).start()
+    try:
+        assert control.read_pidfile("test", run_dir)["pid"] == os.getpid()
+        assert control.send("test", "echo", run_dir=run_dir, url="x", pincode="400001") == {"url": "x", "pincode": "400001"}
+        with pytest.raises(ControlError, match="unknown command"):
+            control.send("test", "nope", run_dir=run_dir)
+    finally:
+        server.stop()
+    assert not os.path.exists(server.pidfile) and not os.path.exists(server.socket_path)
+    with pytest.raises(ControlError, match="not running"):
+        control.send("test", "ping", run_dir=run_dir)
+
+
+def test_pidfile_of_a_live_process_refuses_a_second_instance(run_dir):
+    pidfile, _ = control.paths("test", run_dir)
+    os.makedirs(run_dir)
+    with open(pidfile, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getppid(), "socket": "elsewhere.sock"}, f)
+    with pytest.raises(ControlError, match="already running"):
+        ControlServer("test", {}, run_dir).start()
+
+
+def test_pidfile_and_socket_left_by_a_dead_process_are_replaced(run_dir):
+    pidfile, socket_path = control.paths("test", run_dir)
+    os.makedirs(run_dir)
+    with open(pidfile, "w", encoding="utf-8") as f:
+        json.dump({"pid": dead_pid(), "socket": socket_path}, f)
+    open(socket_path, "w").close()
+    assert control.read_pidfile("test", run_dir) is None
+    server = ControlServer("test", {}, run_dir).start()
+    try:
+        assert control.send("test", "ping", run_dir=run_dir)["pid"] == os.getpid()
+    finally:
+        server.stop()
+
+
+def test_inbox_runs_calls_on_the_owning_thread():
+    inbox = Inbox()
+    results = []
+
+    def caller():
+        results.append(inbox.call(threading.current_thread))
+        try:
+            inbox.call(lambda: 1 / 0)
+        except ZeroDivisionError as e:
+            results.append(e)
+
+    thread = threading.Thread(target=caller)
+    thread.start()
+    while thread.is_alive():
+        inbox.run_pending(0.05)
+    assert results[0] is threading.current_thread()
+    assert isinstance(results[1], ZeroDivisionError)
+
+
+def test_wake_returns_from_a_waiting_run_pending():
+    inbox = Inbox()
+    threading.Timer(0.05, inbox.wake).start()
+    assert inbox.run_pending(timeout=5) is True
+    assert inbox.run_pending() is False
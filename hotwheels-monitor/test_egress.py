@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test egress endpoint selection, health, ejection and cooldown
+"""
+
+import pytest
+import requests
+
+import egress
+from egress import COOLDOWN, EgressPool, Endpoint
+
+PINCODES = [str(400001 + n) for n in range(60)]
+
+
+class Response:
+    def __init__(self, status, retry_after=None):
+        self.status_code = status
+        self.headers = {"Retry-After": retry_after} if retry_after else {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(egress.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def pool(clock):
+    endpoints = [Endpoint(name=name) for name in ("a", "b", "c")]
+    for endpoint in endpoints:
+        endpoint.answers = []  # statuses (or exceptions) its next requests get
+        endpoint.requests = 0
+
+        def get(url, endpoint=endpoint, **kwargs):
+            endpoint.requests += 1
+            answer = endpoint.answers.pop(0) if endpoint.answers else 200
+            if isinstance(answer, Exception):
+                raise answer
+            return Response(*answer) if isinstance(answer, tuple) else Response(answer)
+        endpoint.get = get
+    return EgressPool(endpoints)
+
+
+def placement(pool):
+    return {pincode: pool.pick(pincode).name for pincode in PINCODES}
+
+
+def test_pincodes_stick_to_one_endpoint_and_spread(pool):
+    before = placement(pool)
+    assert placement(pool) == before
+    assert set(before.values()) == {"a", "b", "c"}
+
+
+def test_429_ejects_at_once_and_moves_only_that_endpoints_pincodes(pool, clock):
+    before = placement(pool)
+    pool.record(pool.endpoints["b"], 429)
+    after = placement(pool)
+    assert "b" not in after.values()
+    assert all(after[p] == before[p] for p in PINCODES if before[p] != "b")
+
+    clock[0] += COOLDOWN - 1
+    assert "b" not in placement(pool).values()
+    clock[0] += 1
+    assert placement(pool) == before  # rejoined where it was
+
+
+def test_connection_errors_eject_after_four_in_a_row(pool):
+    endpoint = pool.endpoints["a"]
+    for _ in range(3):
+        pool.record(endpoint, None)
+    assert pool.stats()["a"][1] == 0
+    pool.record(endpoint, None)
+    assert pool.stats()["a"] == (1.0, COOLDOWN)  # back later with a clean slate
+
+
+def test_an_occasional_error_does_not_eject(pool):
+    endpoint = pool.endpoints["a"]
+    for _ in range(20):
+        pool.record(endpoint, None)
+        pool.record(endpoint, 200)
+        pool.record(endpoint, 200)
+    assert pool.stats()["a"][1] == 0
+
+
+def test_cooldown_doubles_until_a_success(pool, clock):
+    endpoint = pool.endpoints["c"]
+    cooldowns = []
+    for _ in range(3):
+        pool.record(endpoint, 429)
+        cooldowns.append(pool.stats()["c"][1])
+        clock[0] += cooldowns[-1]
+    assert cooldowns == [COOLDOWN, 2 * COOLDOWN, 4 * COOLDOWN]
+    pool.record(endpoint, 200)
+    pool.record(endpoint, 429)
+    assert pool.stats()["c"][1] == COOLDOWN
+
+
+def test_retry_after_longer_than_the_cooldown_is_honoured(pool):
+    pool.record(pool.endpoints["a"], 429, retry_after=str(COOLDOWN * 10))
+    assert pool.stats()["a"][1] == COOLDOWN * 10
+
+
+def test_outcomes_during_an_ejection_do_not_extend_it(pool, clock):
+    endpoint = pool.endpoints["a"]
+    pool.record(endpoint, 429)
+    clock[0] += 5
+    pool.record(endpoint, 429)  # a request that was already in flight
+    assert pool.stats()["a"][1] == COOLDOWN - 5
+
+
+def test_throttled_request_is_retried_once_through_another_endpoint(pool):
+    pincode = PINCODES[0]
+    first = pool.acquire(pincode)
+    first.answers = [429]
+    response = pool.get(first, "https://www.firstcry.com/p/1", pincode)
+    assert response.status_code == 200 and first.requests == 1
+    assert sum(e.requests for e in pool.endpoints.values()) == 2
+    assert pool.pick(pincode) is not first
+
+
+def test_connection_error_is_retried_and_raised_if_the_retry_fails_too(pool):
+    pincode = PINCODES[0]
+    first = pool.acquire(pincode)
+    retry = pool.pick(pincode, avoid=first)
+    first.answers = [requests.ConnectionError("refused")]
+    retry.answers = [requests.ConnectionError("refused")]
+    with pytest.raises(requests.ConnectionError):
+        pool.get(first, "https://www.firstcry.com/p/1", pincode)
+    assert first.requests == retry.requests == 1
+
+
+def test_with_every_endpoint_ejected_the_one_due_back_first_is_used(pool, clock):
+    for name, retry_after in (("a", 300), ("b", 100), ("c", 200)):
+        pool.record(pool.endpoints[name], 429, retry_after=str(retry_after))
+    assert {pool.pick(p).name for p in PINCODES} == {"b"}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test alert fan-out: the monitor's send_telegram_batch and the bot's run_monitor_check
+"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import monitor
+from fake_telegram import ApiError, FakeTelegram
+
+TOKEN = "123456:FANOUT"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeTelegram().start()
+    monkeypatch.setattr(monitor, "TELEGRAM_API_URL", fake.base_url[:-len("/bot")])
+    monkeypatch.setattr(monitor, "TELEGRAM_BATCH_INTERVAL", 0)
+    yield fake
+    fake.stop()
+
+
+def sent_to(fake):
+    return [params["chat_id"] for _, method, params in fake.calls if method == "sendMessage"]
+
+
+def test_batch_reaches_every_chat_once_in_order(fake):
+    chats = [str(700000 + n) for n in range(20)]
+    assert monitor.send_telegram_batch(TOKEN, chats, "✅ Twin Mill is AVAILABLE!") == []
+    assert sent_to(fake) == chats
+
+
+def test_failed_chats_are_returned_and_the_rest_still_sent(fake, monkeypatch):
+    handle = fake.handle
+
+    def blocked(method, params):
+        if params.get("chat_id") == "2":
+            raise ApiError(403, "Forbidden: bot was blocked by the user")
+        return handle(method, params)
+
+    monkeypatch.setattr(fake, "handle", blocked)
+    assert monitor.send_telegram_batch(TOKEN, ["1", "2", "3"], "restock") == ["2"]
+    assert sent_to(fake) == ["1", "3"]
+
+
+def test_nothing_is_sent_without_a_token_or_chats(fake):
+    assert monitor.send_telegram_batch(None, ["1"], "restock") == ["1"]
+    assert monitor.send_telegram_batch(TOKEN, [], "restock") == []
+    assert fake.calls == []
+
+
+def test_bot_waits_for_alerts_handed_over_from_the_check_thread(tmp_path, monkeypatch):
+    telegram_bot = pytest.importorskip("telegram_bot")
+    monkeypatch.chdir(tmp_path)
+    for name in ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "SMTP_HOST", "TWILIO_ACCOUNT_SID"):
+        monkeypatch.delenv(name, raising=False)
+    delivered = []
+
+    async def fan_out(bot, chat_ids, message, detected_at=None, image_url=None):
+        await asyncio.sleep(0.05)
+        delivered.append((threading.current_thread(), tuple(chat_ids), detected_at))
+
+    def check(config, state, scraper, on_alert, default_chat=None):
+        for n in range(3):
+            on_alert({"title": f"Car {n}"}, "subject", "message", [str(n), default_chat], float(n))
+        return [{"product": {"pincode": "400001"}, "in_stock": True}]
+
+    async def run():
+        bot = SimpleNamespace(monitor_lock=asyncio.Lock(), load_config=lambda: {}, scraper=None, owner_chat="99",
+                              fan_out=fan_out, refresh_cached_stock=list)
+        return await telegram_bot.HotWheelsBot.run_monitor_check(bot, None, check), threading.current_thread()
+
+    results, loop_thread = asyncio.run(run())
+    assert len(results) == 1
+    # Every fan-out finished on the event loop before the check returned
+    assert delivered == [(loop_thread, (str(n), "99"), float(n)) for n in range(3)]
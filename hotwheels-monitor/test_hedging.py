@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test adaptive timeouts, the hedge budget and hedged requests in hedging.py
+"""
+
+import threading
+
+import pytest
+
+import hedging
+from hedging import DEFAULT_TIMEOUT, MIN_SAMPLES, MIN_TIMEOUT, TIMEOUT_FACTOR, HedgeBudget, Hedger, LatencyTracker
+from firstcry_scraper import FirstCryScraper
+
+HOST = "www.firstcry.com"
+
+
+class Response:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def warmed(budget=1.0, latency=0.01):
+    """A Hedger whose tracker already knows HOST answers in `latency` seconds"""
+    hedger = Hedger(budget)
+    for _ in range(MIN_SAMPLES):
+        hedger.tracker.observe(HOST, latency)
+    return hedger
+
+
+def test_timeout_follows_p99_within_bounds():
+    tracker = LatencyTracker()
+    assert tracker.timeout(HOST) == DEFAULT_TIMEOUT and tracker.hedge_after(HOST) is None
+    for n in range(MIN_SAMPLES * 5):
+        tracker.observe(HOST, 1.0 if n % 100 == 99 else 0.1)
+    assert tracker.hedge_after(HOST) == 0.1
+    assert tracker.timeout(HOST) == TIMEOUT_FACTOR * 1.0
+    for _ in range(500):
+        tracker.observe(HOST, 0.01)
+    assert tracker.timeout(HOST) == MIN_TIMEOUT
+
+
+def test_budget_is_earned_per_request_and_capped():
+    budget = HedgeBudget(0.25, burst=2)
+    assert budget.spend() and not budget.spend()
+    for _ in range(3):
+        budget.earn()
+    assert not budget.available()
+    budget.earn()
+    assert budget.spend()
+    for _ in range(20):
+        budget.earn()
+    assert budget.tokens == 2
+    budget.refund()
+    assert budget.tokens == 2
+    assert not HedgeBudget(0).available()
+
+
+def test_hedge_answers_for_a_slow_primary_and_the_late_response_is_closed():
+    hedger = warmed()
+    release = threading.Event()
+    late = Response("primary")
+
+    def send(timeout):
+        release.wait(5)
+        return late
+
+    response = hedger.get(HOST, send, lambda: lambda timeout: Response("hedge"))
+    assert response.name == "hedge"
+    release.set()
+    for _ in range(100):
+        if late.closed:
+            break
+        threading.Event().wait(0.01)
+    assert late.closed
+
+
+def test_no_hedge_without_a_request_slot_and_the_token_is_refunded():
+    hedger = warmed()
+    tokens = hedger.budget.tokens
+    calls = []
+
+    def send(timeout):
+        threading.Event().wait(0.1)
+        calls.append("primary")
+        return Response("primary")
+
+    assert hedger.get(HOST, send, lambda: None).name == "primary"
+    assert calls == ["primary"]
+    assert hedger.budget.tokens == pytest.approx(tokens + 1.0)  # earned one, spent none
+
+
+def test_error_is_raised_only_when_both_attempts_fail():
+    hedger = warmed()
+
+    def fails(timeout):
+        threading.Event().wait(0.1)
+        raise ConnectionError("reset")
+
+    assert hedger.get(HOST, fails, lambda: lambda timeout: Response("hedge")).name == "hedge"
+    with pytest.raises(ConnectionError):
+        warmed().get(HOST, fails, lambda: fails)
+
+
+def test_request_goes_out_inline_when_every_worker_is_busy(monkeypatch):
+    monkeypatch.setattr(hedging, "WORKERS", hedging._Workers(size=0))
+    calls = []
+    hedger = warmed()
+    response = hedger.get(HOST, lambda timeout: calls.append(threading.current_thread()) or Response("inline"))
+    assert response.name == "inline" and calls == [threading.current_thread()]
+
+
+@pytest.mark.parametrize("interval, requests_sent", [(60, 1), (0, 2)])
+def test_scraper_hedges_only_when_its_rate_limiter_has_a_slot(monkeypatch, caplog, interval, requests_sent):
+    with caplog.at_level("INFO"):
+        scraper = FirstCryScraper(min_interval=interval, hedger=warmed())
+    # A delay between requests is announced as leaving hedging a no-op
+    assert ("expect adaptive timeouts only" in caplog.text) == (requests_sent == 1)
+    sent = []
+
+    def get(url, **kwargs):
+        sent.append(url)
+        threading.Event().wait(0.1)
+        response = Response(url)
+        response.raise_for_status = lambda: None
+        response.content = b"<html></html>"
+        return response
+
+    monkeypatch.setattr(scraper.session, "get", get)
+    scraper._get("https://www.firstcry.com/p/1", "400001", fresh=True)
+    # With a 60 s interval the primary took the only slot for the next minute
+    assert len(sent) == requests_sent
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test that the lxml backend reads awkward pages like bs4 does, or fails loudly
+"""
+
+import pytest
+
+pytest.importorskip("lxml")
+
+import htmlparse
+import parsers
+
+DECLARED = ('<?xml version="1.0" encoding="iso-8859-1"?>\n'
+            '<html><body><h1>Twin Mill</h1><button>Add to Cart</button></body></html>')
+
+
+@pytest.fixture(params=htmlparse.BACKENDS)
+def backend(request):
+    previous = htmlparse.get_backend().name
+    yield htmlparse.set_backend(request.param)
+    htmlparse.set_backend(previous)
+
+
+@pytest.mark.parametrize("page", [DECLARED, DECLARED.encode("utf-8")])
+def test_page_with_an_encoding_declaration_is_read(backend, page):
+    assert parsers.check_stock(page) is True
+
+
+@pytest.mark.parametrize("page", ["", "  \n", b""])
+def test_empty_page_is_out_of_stock(backend, page):
+    assert parsers.check_stock(page) is False
+
+
+@pytest.mark.parametrize("backend", ["lxml"], indirect=True)
+def test_lxml_raises_on_a_page_it_cannot_parse(backend):
+    # Not an empty document: a check that can't read the page must fail, not report out of stock
+    with pytest.raises(Exception):
+        parsers.check_stock("<!-- nothing but a comment -->")
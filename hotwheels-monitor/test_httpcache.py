@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the shared HTTP cache's size accounting and eviction
+"""
+
+import sqlite3
+
+import pytest
+
+from httpcache import ResponseCache
+
+
+def url(pid):
+    return f"https://www.firstcry.com/hot-wheels/car/{pid}/product-detail"
+
+
+def stored_bytes(cache):
+    return cache._connect().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "http_cache.sqlite")
+
+
+def test_running_total_follows_puts_replacements_and_clear(path):
+    cache, other = ResponseCache(path), ResponseCache(path)  # e.g. the monitor and the bot
+    for pid in range(10000, 10050):
+        cache.put(url(pid), "400001", bytes(range(256)) * (pid % 7 + 1))
+    for pid in range(10000, 10050, 3):
+        other.put(url(pid), "400001", b"replaced" * 10)
+    assert cache.stats() == {"entries": 50, "bytes": stored_bytes(cache)}
+    assert other.stats() == cache.stats()
+    assert other.clear() == 50
+    assert cache.stats() == {"entries": 0, "bytes": 0}
+
+
+def test_eviction_keeps_the_file_under_its_limit(path):
+    cache = ResponseCache(path, max_bytes=20_000)
+    for pid in range(10000, 10400):
+        cache.put(url(pid), "400001", bytes(range(256)) * 4 + str(pid).encode())
+        assert cache.stats()["bytes"] <= 20_000
+    assert cache.stats()["bytes"] == stored_bytes(cache)
+    assert cache.get(url(10399), "400001") is not None
+    assert cache.get(url(10000), "400001") is None  # least recently used went first
+
+
+def test_total_is_seeded_from_a_cache_file_that_predates_it(path):
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE responses (url TEXT NOT NULL, pincode TEXT NOT NULL, body BLOB NOT NULL, encoding TEXT,
+            size INTEGER NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL,
+            PRIMARY KEY (url, pincode));
+        INSERT INTO responses VALUES ('firstcry.com/product/10001', '400001', x'00', NULL, 1234, 0, 9e9, 0);
+    """)
+    db.commit()
+    db.close()
+    cache = ResponseCache(path)
+    assert cache.stats() == {"entries": 1, "bytes": 1234}
+    assert ResponseCache(path).stats()["bytes"] == 1234
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test batch processing of watchlist issues against a local fake GitHub API
+"""
+
+import os
+import sys
+
+import yaml
+import pytest
+
+pytest.importorskip("github")
+from github import Auth, Github
+
+from fake_github import FakeGitHub
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import issue_handler
+
+CONFIG = {
+    "products": [
+        {"id": "prod1", "title": "Bone Shaker", "url": "https://www.firstcry.com/p/1", "pincode": "400001"},
+        {"id": "prod2", "title": "Twin Mill", "url": "https://www.firstcry.com/p/2", "pincode": "400001",
+         "subscribers": ["42"]},
+    ],
+    "delay_between_requests": 3,
+}
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeGitHub().start()
+    fake.set_file("config.yaml", yaml.safe_dump(CONFIG, sort_keys=False))
+    client = Github(auth=Auth.Token("test"), base_url=fake.base_url,
+                    seconds_between_requests=0, seconds_between_writes=0)
+    yield fake, client.get_repo(fake.repo)
+    fake.stop()
+
+
+def test_batch_commits_once_and_replies_per_issue(github):
+    fake, repo = github
+    added = [fake.add_issue(f"/add\nTitle: Car {n}\nURL: https://www.firstcry.com/p/{10 + n}\nPincode: 110001")
+             for n in range(20)]
+    duplicate = fake.add_issue("/add\nTitle: Bone Shaker again\nURL: https://www.firstcry.com/p/1\nPincode: 400001")
+    removed = fake.add_issue("/remove\nTitle: bone shaker")
+    missing = fake.add_issue("/remove\nTitle: Not There")
+    listed = fake.add_issue("/list")
+    chatter = fake.add_issue("Love this project!")
+    incomplete = fake.add_issue("/add\nTitle: No URL")
+
+    assert issue_handler.handle_batch(repo) == 25
+
+    assert len(fake.commits) == 1
+    assert fake.commits[0][0].startswith("Update config via 21 issue(s): #1, #2")
+    cfg = yaml.safe_load(fake.file_text("config.yaml"))
+    titles = [p["title"] for p in cfg["products"]]
+    assert titles == ["Twin Mill"] + [f"Car {n}" for n in range(20)]
+    assert cfg["products"][0]["subscribers"] == ["42"]
+    assert cfg["delay_between_requests"] == 3
+    # New ids continue after the highest existing one
+    assert [p["id"] for p in cfg["products"][1:3]] == ["prod3", "prod4"]
+    with open("config.yaml", encoding="utf-8") as f:
+        assert yaml.safe_load(f) == cfg
+
+    for number in added + [duplicate, removed, missing, listed]:
+        assert len(fake.comments[number]) == 1
+        assert fake.issues[number]["state"] == "closed"
+    assert fake.comments[duplicate][0].startswith("ℹ️ Already watching")
+    assert fake.comments[missing][0].startswith("⚠️")
+    # /list sees the commands before it in the batch
+    assert "Car 19" in fake.comments[listed][0] and "Bone Shaker" not in fake.comments[listed][0]
+    for number in (chatter, incomplete):
+        assert fake.comments[number] == [] and fake.issues[number]["state"] == "open"
+
+
+def test_batch_retries_when_config_changed_upstream(github):
+    fake, repo = github
+    fake.add_issue("/add\nTitle: Deora\nURL: https://www.firstcry.com/p/3\nPincode: 560001")
+    fake.conflicts = 1
+
+    issue_handler.handle_batch(repo)
+
+    assert len(fake.commits) == 1
+    assert "Deora" in fake.file_text("config.yaml")
+    assert fake.comments[1] == ["✅ Added product: **Deora** [560001]"]
+
+
+def test_batch_without_commands_does_not_commit(github):
+    fake, repo = github
+    fake.add_issue("/list")
+
+    issue_handler.handle_batch(repo)
+
+    assert fake.commits == []
+    assert fake.comments[1][0].startswith("📋 Current Watchlist:")
+
+
+def test_batch_applies_commands_to_the_watchlist_store(github):
+    fake, repo = github
+    from watchstore import WatchlistStore
+    store = WatchlistStore("watchlist.sqlite")
+    store.import_products(CONFIG["products"])
+    fake.set_file("config.yaml", yaml.safe_dump(dict(CONFIG, watchlist_db="watchlist.sqlite"), sort_keys=False))
+    fake.add_issue("/add\nTitle: Deora\nURL: https://www.firstcry.com/p/3\nPincode: 560001")
+    fake.add_issue("/remove\nTitle: bone shaker")
+    fake.add_issue("/add\nTitle: Rodger Dodger\nURL: https://www.firstcry.com/p/4\nPincode: 560001")
+    fake.add_issue("/list")
+
+    issue_handler.handle_batch(repo)
+
+    assert fake.commits == []
+    assert [(p["id"], p["title"]) for p in store.export_products()] == [
+        ("prod2", "Twin Mill"), ("prod3", "Deora"), ("prod4", "Rodger Dodger")]
+    assert fake.comments[2] == ["❌ Removed product: **bone shaker**"]
+    assert "Deora" in fake.comments[4][0] and "Bone Shaker" not in fake.comments[4][0]
+
+
+def test_batch_refuses_commands_when_the_store_is_elsewhere(github):
+    fake, repo = github
+    fake.set_file("config.yaml", yaml.safe_dump(dict(CONFIG, watchlist_db="watchlist.sqlite"), sort_keys=False))
+    fake.add_issue("/add\nTitle: Deora\nURL: https://www.firstcry.com/p/3\nPincode: 560001")
+    incomplete = fake.add_issue("/add\nTitle: No URL")
+
+    issue_handler.handle_batch(repo)
+
+    assert fake.commits == []
+    assert fake.comments[1][0].startswith("⚠️ This watchlist is kept in `watchlist.sqlite`")
+    assert fake.issues[1]["state"] == "closed"
+    assert fake.comments[incomplete] == [] and fake.issues[incomplete]["state"] == "open"
+    assert not os.path.exists("watchlist.sqlite")
+
+
+def test_add_matches_urls_by_product_not_by_text():
+    watchlist = issue_handler.Watchlist(CONFIG)
+    url = "https://www.firstcry.com/hot-wheels/twin-mill/10002/product-detail"
+    assert watchlist.add("Twin Mill", url, "400001") is not None
+    for same in (url + "?ref2=q_ard_hotwheels", url + "#reviews", "http://firstcry.com/hot-wheels/tm/10002",
+                 "https://www.firstcry.com/p/1?utm_source=share"):
+        assert issue_handler.apply_command(watchlist, f"/add\nTitle: Again\nURL: {same}\nPincode: 400001") == (
+            f"ℹ️ Already watching {same} [400001]", False)
+    assert watchlist.add("Twin Mill", url, "110001") is not None
+    assert watchlist.remove("twin mill") == 3  # with the Twin Mill already in CONFIG
+    assert watchlist.add("Twin Mill", url + "?ref=x", "400001") is not None  # no longer watched
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Test monitor.py's checks, listing resolution and scheduling
+"""
+
+import threading
+
+import pytest
+import yaml
+
+import control
+import monitor
+import firstcry_scraper
+from firstcry_scraper import FirstCryScraper
+
+URL = "https://www.firstcry.com/hot-wheels/car/10001/product-detail"
+
+
+class Scraper:
+    """fetch_html with a fixed page and fetch_listing with fixed listing pages"""
+
+    def __init__(self, html="<html></html>", listing=()):
+        self.html = html
+        self.listing = list(listing)
+        self.fetched = []
+
+    def fetch_html(self, url, pincode, fresh=False):
+        self.fetched.append((url, pincode))
+        return self.html
+
+    def fetch_listing(self, pincode, page=1, sort="popularity"):
+        self.fetched.append(("listing", pincode, page))
+        return self.listing[page - 1] if page <= len(self.listing) else []
+
+
+def watchlist(count, pincode="400001"):
+    return {"products": [{"id": f"prod{n + 1}", "title": str(10001 + n), "url": URL.replace("10001", str(10001 + n)),
+                          "pincode": pincode} for n in range(count)]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(monitor.time, "monotonic", lambda: now[0])
+    return now
+
+
+class SlowScraper(Scraper):
+    """Every request takes `seconds` on the fake clock; listing pages never hold the watched products"""
+
+    def __init__(self, clock, seconds):
+        super().__init__(listing=[[{"url": URL.replace("10001", str(pid)), "in_stock": True}]
+                                  for pid in range(90000, 90100)])
+        self.clock = clock
+        self.seconds = seconds
+
+    def fetch_html(self, url, pincode, fresh=False):
+        self.clock[0] += self.seconds
+        return super().fetch_html(url, pincode, fresh)
+
+    def fetch_listing(self, pincode, page=1, sort="popularity"):
+        self.clock[0] += self.seconds
+        return super().fetch_listing(pincode, page, sort)
+
+
+def unparseable(*args):
+    raise ValueError("Document is empty")
+
+
+# ---------- Parse failures ----------
+def test_check_product_reports_a_page_it_cannot_parse_as_a_failed_check(monkeypatch):
+    monkeypatch.setattr(monitor, "check_stock", unparseable)
+    state = {}
+    results = monitor.check_product(watchlist(1), state, Scraper(), None, URL)
+    assert [r["in_stock"] for r in results] == [None]
+    assert state == {}  # nothing recorded, nothing alerted
+
+
+def test_listing_page_that_cannot_be_parsed_is_a_failed_fetch(monkeypatch):
+    scraper = FirstCryScraper()
+    monkeypatch.setattr(scraper, "_get", lambda url, pincode, fresh=False: type("Response", (), {"content": b"<"}))
+    monkeypatch.setattr(firstcry_scraper, "parse_listing", unparseable)
+    assert scraper.fetch_listing("400001") is None
+    pairs = list(monitor.watched_pairs(watchlist(4)))
+    resolved, rest = monitor.resolve_from_listings(scraper, pairs)
+    assert resolved == [] and rest == pairs
+
+
+# ---------- Deadline ----------
+def test_listing_pages_stop_before_the_deadline(clock):
+    deadline = clock[0] + 60
+    scraper = SlowScraper(clock, 3)
+    pairs = list(monitor.watched_pairs(watchlist(200)))
+    resolved, rest = monitor.resolve_from_listings(scraper, pairs, deadline=deadline)
+    assert resolved == [] and rest == pairs
+    assert clock[0] <= deadline - monitor.DEADLINE_RESERVE
+    assert len(scraper.fetched) == (60 - monitor.DEADLINE_RESERVE) // 3
+
+
+def test_cycle_with_listings_stays_within_its_deadline(clock):
+    deadline = clock[0] + 60
+    scraper = SlowScraper(clock, 3)
+    monitor.run_cycle(watchlist(200), {}, scraper, None, deadline=deadline, listings=True)
+    # The reserve is left for whatever was in flight: here the one product page started last
+    assert clock[0] <= deadline
+
+
+def test_new_listings_crawl_leaves_the_reserve(clock, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    deadline = clock[0] + 60
+    scraper = SlowScraper(clock, 3)
+    diff = monitor.check_new_listings({}, scraper, "400001", deadline)
+    assert not diff.complete
+    assert clock[0] <= deadline - monitor.DEADLINE_RESERVE
+
+
+# ---------- Scheduling ----------
+def record(checked, checks=10, restocks=0, in_stock=False):
+    return {"checked": checked, "checks": checks, "restocks": restocks, "in_stock": in_stock}
+
+
+def test_priority_favours_stale_restocking_and_widely_watched_products():
+    now = 100_000
+    base = monitor.check_priority(record(now - 600), [], now)
+    assert monitor.check_priority(None, [], now) == monitor.check_priority({}, [], now) == float("inf")
+    assert monitor.check_priority(record(now - 1200), [], now) == pytest.approx(2 * base)
+    assert monitor.check_priority(record(now - 600, restocks=5), [], now) > base
+    assert monitor.check_priority(record(now - 600, in_stock=True), [], now) < base
+    assert monitor.check_priority(record(now - 600), ["1", "2", "3"], now) == pytest.approx(3 * base)
+    assert monitor.check_priority(record(now + 60), [], now) == 0  # clock skew: never negative
+
+
+def test_prioritise_orders_by_score():
+    now = 100_000
+    items = list(monitor.watched_pairs(watchlist(4)))
+    keys = [f"{product_key}_{pincode}" for (product_key, pincode), _, _ in items]
+    state = {keys[0]: record(now - 60), keys[1]: record(now - 3600), keys[2]: record(now - 600, restocks=9)}
+    ordered = [f"{k}_{p}" for (k, p), _, _ in monitor.prioritise(items, state, now)]
+    assert ordered == [keys[3], keys[1], keys[2], keys[0]]  # never checked first
+
+
+@pytest.mark.parametrize("inflight, expected", [(1, 7), (3, 5)])
+def test_until_deadline_leaves_room_for_inflight_checks_and_the_reserve(clock, inflight, expected):
+    deadline = clock[0] + 20
+    taken = []
+    for item in monitor.until_deadline(range(100), deadline, inflight=inflight, reserve=5):
+        taken.append(item)
+        clock[0] += 2  # each check takes 2 s
+    assert taken == list(range(expected))
+    assert clock[0] + 2 * (inflight - 1) <= deadline
+
+
+def test_until_deadline_past_the_deadline_yields_nothing(clock):
+    assert list(monitor.until_deadline(range(3), clock[0] + 1)) == []
+
+
+def test_compact_state_drops_unwatched_records_and_keeps_unmigrated_legacy_keys():
+    items = list(monitor.watched_pairs(watchlist(2)))
+    (first_key, pincode), first, _ = items[0]
+    (second_key, _), second, _ = items[1]
+    state = {f"{first_key}_{pincode}": record(1), f"{first.get('id')}_{pincode}": record(1),
+             f"{second.get('id')}_{pincode}": record(1), f"10999_{pincode}": record(1)}
+    assert monitor.compact_state(state, items) == 2
+    # The first was migrated, so its legacy key goes; the second still needs its legacy record
+    assert set(state) == {f"{first_key}_{pincode}", f"{second.get('id')}_{pincode}"}
+
+
+# ---------- Daemon ----------
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """A MonitorDaemon in tmp_path over a stub scraper whose product pages are in stock; alerts are recorded"""
+    monkeypatch.chdir(tmp_path)
+    with open(monitor.CONFIG_FILE, "w", encoding="utf-8") as f:
+        yaml.safe_dump(dict(watchlist(3), delay_between_requests=0), f)
+    scraper = Scraper('<html><body><button>Add to Cart</button></body></html>')
+    scraper.rate_limiter = firstcry_scraper.RateLimiter(0)
+    scraper.cache = scraper.egress = None
+    monkeypatch.setattr(monitor, "_scraper", scraper)
+    alerts = []
+    monkeypatch.setattr(monitor, "notify_all", lambda channels, subject, *args, **kwargs: alerts.append(subject))
+    daemon = monitor.MonitorDaemon(interval=3600)
+    daemon.alerts = alerts
+    return daemon
+
+
+def test_product_pairs_are_looked_up_like_watched_pairs(tmp_path):
+    cfg = watchlist(3)
+    cfg["products"].append(dict(cfg["products"][0], pincode="110001"))
+    store_cfg = {"watchlist_db": str(tmp_path / "watchlist.sqlite")}
+    monitor.open_watchlist(store_cfg).import_products(cfg["products"])
+    for source in (cfg, store_cfg):
+        everything = list(monitor.watched_pairs(source, "1"))
+        assert list(monitor.product_pairs(source, URL + "?ref=x", None, "1")) == [everything[0], everything[3]]
+        assert list(monitor.product_pairs(source, URL, "110001", "1")) == [everything[3]]
+        assert list(monitor.product_pairs(source, URL, "560001", "1")) == []
+
+
+def test_forced_check_through_the_control_socket(daemon, tmp_path):
+    run_dir = str(tmp_path / "run")
+    server = control.ControlServer("monitor", daemon.commands(), run_dir).start()
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    try:
+        results = control.send("monitor", "check", run_dir=run_dir, url=URL)
+        assert [r["in_stock"] for r in results] == [True]
+        # The first cycle already alerted every product, so the forced check found nothing new
+        assert len(daemon.alerts) == 3
+        stats = control.send("monitor", "stats", run_dir=run_dir)
+        assert stats["cycles"] == 1 and stats["state_records"] == 3
+        with pytest.raises(control.ControlError, match="not on the watchlist"):
+            control.send("monitor", "check", run_dir=run_dir, url=URL.replace("10001", "10999"))
+        assert control.send("monitor", "stop", run_dir=run_dir) == {"stopping": True}
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        daemon.stop()
+        server.stop()
+    assert monitor.load_state()["10001_400001"]["checks"] == 2
+
+
+def test_forced_check_alerts_a_restock_between_cycles(daemon):
+    daemon.cycle()
+    key = "10002_400001"
+    daemon.state[key]["in_stock"] = False  # sold out since
+    results = daemon.check(URL.replace("10001", "10002"), "400001")
+    assert [r["in_stock"] for r in results] == [True]
+    assert len(daemon.alerts) == 4 and monitor.load_state()[key]["in_stock"]
+    # A pincode it isn't watched at is fetched and reported, not stored
+    assert [r["in_stock"] for r in daemon.check(URL, "560001")] == [True]
+    assert "10001_560001" not in daemon.state
+
+
+def test_reload_picks_up_config_changes(daemon):
+    with open(monitor.CONFIG_FILE, "w", encoding="utf-8") as f:
+        yaml.safe_dump(dict(watchlist(5), delay_between_requests=2), f)
+    assert daemon.reload() == {"watched": 5, "delay_between_requests": 2}
+    assert daemon.scraper.rate_limiter.interval == 2
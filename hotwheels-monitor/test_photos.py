@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test the photo file_id cache and the monitor's photo alerts: reuse, and re-upload of a stale file_id
+"""
+
+import pytest
+
+import monitor
+from fake_telegram import FakeTelegram
+from photos import PhotoCache
+
+TOKEN = "123456:PHOTOS"
+IMAGE_URL = "https://cdn.fcglcdn.com/brainbees/images/products/219x265/10001a.webp"
+MESSAGE = "✅ Twin Mill is AVAILABLE!"
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # photo_cache.json lands here
+    fake = FakeTelegram().start()
+    monkeypatch.setattr(monitor, "TELEGRAM_API_URL", fake.base_url[:-len("/bot")])
+    monkeypatch.setattr(monitor, "TELEGRAM_BATCH_INTERVAL", 0)
+    downloads = []
+
+    def fetch_image(url, session=None, timeout=10):
+        downloads.append(url)
+        return b"\xff\xd8 jpeg bytes"
+
+    monkeypatch.setattr("photos.fetch_image", fetch_image)
+    fake.downloads = downloads
+    yield fake
+    fake.stop()
+
+
+def sends(fake, method):
+    return [params for _, m, params in fake.calls if m == method]
+
+
+def test_cache_is_per_bot_and_merges_with_other_processes(tmp_path):
+    path = str(tmp_path / "photo_cache.json")
+    monitor_cache, bot_cache = PhotoCache(path), PhotoCache(path)
+    monitor_cache.put(TOKEN, IMAGE_URL, "file-1")
+    bot_cache.put(TOKEN, IMAGE_URL + "?2", "file-2")
+    reloaded = PhotoCache(path)
+    assert reloaded.get(TOKEN, IMAGE_URL) == "file-1" and reloaded.get(TOKEN, IMAGE_URL + "?2") == "file-2"
+    assert reloaded.get("654321:OTHER", IMAGE_URL) is None  # file_ids only work for the bot that uploaded
+    reloaded.forget(TOKEN, IMAGE_URL)
+    assert PhotoCache(path).get(TOKEN, IMAGE_URL) is None and PhotoCache(path).get(TOKEN, IMAGE_URL + "?2")
+
+
+def test_photo_is_uploaded_once_then_sent_by_file_id(fake):
+    assert monitor.send_telegram_batch(TOKEN, ["1", "2", "3"], MESSAGE, IMAGE_URL) == []
+    assert monitor.send_telegram_batch(TOKEN, ["4"], MESSAGE, IMAGE_URL) == []
+    assert fake.downloads == [IMAGE_URL] and fake.photo_uploads == 1 and fake.photo_reuses == 3
+    assert [str(p["chat_id"]) for p in sends(fake, "sendPhoto")] == ["1", "2", "3", "4"]
+    assert all(p["caption"] == MESSAGE for p in sends(fake, "sendPhoto")) and not sends(fake, "sendMessage")
+
+
+def test_stale_file_id_is_forgotten_and_the_photo_uploaded_again(fake):
+    PhotoCache().put(TOKEN, IMAGE_URL, "expired-file-id")
+    assert monitor.send_telegram_batch(TOKEN, ["1", "2"], MESSAGE, IMAGE_URL) == []
+    assert fake.photo_uploads == 1 and fake.photo_reuses == 1
+    assert PhotoCache().get(TOKEN, IMAGE_URL) == "fake-photo-1"
+    assert len(sends(fake, "sendPhoto")) == 2 and not sends(fake, "sendMessage")
+
+
+def test_alert_goes_out_as_text_without_a_photo(fake, monkeypatch):
+    monkeypatch.setattr("photos.fetch_image", lambda url, session=None, timeout=10: None)
+    assert monitor.send_telegram_batch(TOKEN, ["1"], MESSAGE, IMAGE_URL) == []
+    # Captions are capped, so a longer alert is text too
+    assert monitor.send_telegram_batch(TOKEN, ["2"], "x" * (monitor.TELEGRAM_CAPTION_LIMIT + 1), IMAGE_URL) == []
+    assert [p["chat_id"] for p in sends(fake, "sendMessage")] == ["1", "2"] and not fake.photo_uploads
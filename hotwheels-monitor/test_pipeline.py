@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the fetch/parse pipeline: every job answered once, back-pressure and failures
+"""
+
+import time
+import threading
+
+import pytest
+
+from firstcry_scraper import FirstCryScraper
+from pipeline import FetchParsePipeline
+
+
+def parse(body, suffix=""):
+    """Runs in the parser process"""
+    if body.startswith(b"bad"):
+        raise ValueError("unparseable page")
+    return body.decode() + suffix
+
+
+class Pages:
+    """fetch_bytes with a per-URL delay; 'none' fails the fetch, 'raise' raises"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.lock = threading.Lock()
+        self.fetched = 0
+
+    def fetch_bytes(self, url, pincode):
+        with self.lock:
+            self.fetched += 1
+        time.sleep(self.delays.get(url, 0))
+        if url == "none":
+            return None
+        if url == "raise":
+            raise ConnectionError("reset")
+        return url.encode()
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    scraper = FirstCryScraper()
+    pages = Pages()
+    monkeypatch.setattr(scraper, "fetch_bytes", pages.fetch_bytes)
+    scraper.pages = pages
+    return scraper
+
+
+def test_results_arrive_in_completion_order_once_per_job(scraper):
+    scraper.pages.delays = {"slow": 0.3}
+    jobs = [(n, url, "400001") for n, url in enumerate(["slow", "a", "b", "c"])]
+    with FetchParsePipeline(scraper, fetchers=4, parsers=1) as pipeline:
+        results = list(pipeline.run(iter(jobs), parse, "!"))
+    assert sorted(results) == [(0, "slow!"), (1, "a!"), (2, "b!"), (3, "c!")]
+    assert results[-1] == (0, "slow!")
+
+
+def test_failed_fetches_and_parses_come_back_as_none(scraper):
+    jobs = [("ok", "good", "400001"), ("missing", "none", "400001"), ("error", "raise", "400001"),
+            ("parse", "bad page", "400001")]
+    with FetchParsePipeline(scraper, fetchers=2, parsers=1) as pipeline:
+        results = dict(pipeline.run(iter(jobs), parse))
+    assert results == {"ok": "good", "missing": None, "error": None, "parse": None}
+
+
+def test_fetching_waits_while_max_pending_pages_are_unconsumed(scraper):
+    jobs = ((n, f"page{n}", "400001") for n in range(50))
+    with FetchParsePipeline(scraper, fetchers=4, parsers=1, max_pending=3) as pipeline:
+        results = pipeline.run(jobs, parse)
+        received = [next(results)]
+        time.sleep(0.3)  # a slow consumer: the fetchers fill the slots, then stop
+        assert scraper.pages.fetched <= len(received) + 3
+        received += list(results)
+    assert len(received) == 50 and scraper.pages.fetched == 50
+
+
+def test_no_jobs_yields_nothing(scraper):
+    with FetchParsePipeline(scraper, fetchers=2, parsers=1) as pipeline:
+        assert list(pipeline.run(iter([]), parse)) == []
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test price parsing and ProductTable filtering, sorting and lookups
+"""
+
+import pytest
+
+from products import PRICE_UNKNOWN, ProductTable, format_price, parse_price
+
+
+def car(pid, price, in_stock=True):
+    return {"id": str(pid), "title": f"Car {pid}", "price": price, "in_stock": in_stock,
+            "url": f"https://www.firstcry.com/hot-wheels/car/{pid}/product-detail"}
+
+
+@pytest.mark.parametrize("text, paise", [
+    ("₹1,299", 129900), ("₹ 2,680.5", 268050), ("Rs. 199.99", 19999), ("MRP ₹349 (20% off)", 34900),
+    (299, 29900), ("Price not available", PRICE_UNKNOWN), ("", PRICE_UNKNOWN), (None, PRICE_UNKNOWN),
+])
+def test_parse_price(text, paise):
+    assert parse_price(text) == paise
+
+
+def test_format_price_round_trips():
+    for text in ("₹1,299", "₹199.99", "₹12,34,567.50"):
+        assert parse_price(format_price(parse_price(text))) == parse_price(text)
+    assert format_price(129900) == "₹1,299" and format_price(5) == "₹0.05"
+    assert format_price(PRICE_UNKNOWN) == "Price not available"
+
+
+@pytest.fixture
+def table():
+    return ProductTable.from_dicts([
+        car(10001, "₹499"), car(10002, "₹1,299", in_stock=False), car(10003, None), car(10004, "₹199"),
+        car(10005, "₹1,299"), car(10006, "Price not available", in_stock=False),
+    ])
+
+
+def test_select_filters_stock_and_price_in_listing_order(table):
+    assert table.select() == [0, 1, 2, 3, 4, 5]
+    assert table.select(in_stock=True) == [0, 2, 3, 4]
+    # Unknown prices never pass a price cap
+    assert table.select(max_price=50000) == [0, 3]
+    assert table.select(in_stock=True, max_price=129900) == [0, 3, 4]
+
+
+def test_sort_puts_unknown_prices_last_and_keeps_ties_in_listing_order(table):
+    assert table.select(sort="price") == [3, 0, 1, 4, 2, 5]
+    assert table.select(sort="-price") == [1, 4, 0, 3, 2, 5]
+    assert table.select(in_stock=True, sort="price") == [3, 0, 4, 2]
+    assert table.select(sort="newest") == table.select()
+
+
+def test_rows_read_like_listing_dicts_and_are_found_by_canonical_url(table):
+    row = table.row_of("https://www.firstcry.com/hot-wheels/car/10005/product-detail?ref=x")
+    assert row == 4
+    product = table[row]
+    assert product["title"] == "Car 10005" and product.price_text == "₹1,299" and product.get("in_stock")
+    table.set_stock(row, False)
+    assert not table[row].in_stock and 4 not in table.select(in_stock=True)
+    assert table.row_of("https://www.firstcry.com/hot-wheels/car/10999/product-detail") is None
+    table.append(car(10999, "₹99"))
+    assert table.row_of("https://www.firstcry.com/hot-wheels/car/10999/product-detail") == 6
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test title search: typo distance, ranking, and keeping the index in step with the listings
+"""
+
+import pytest
+
+from products import ProductTable
+from search import TitleIndex, edit_distance
+
+
+def listing(*titles, sold_out=()):
+    return ProductTable.from_dicts([{"id": str(n), "title": title, "url": f"https://www.firstcry.com/car/{10001 + n}",
+                                     "price": "₹199", "in_stock": n not in sold_out}
+                                    for n, title in enumerate(titles)])
+
+
+def titles(table, rows):
+    return [table.titles[row] for row in rows]
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("yoshi", "yoshi", 0), ("yoshy", "yoshi", 1), ("yosi", "yoshi", 1), ("yoshii", "yoshi", 1),
+    ("yohsi", "yoshi", 1), ("lamborgini", "lamborghini", 1), ("lambrogini", "lamborghini", 2),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 2) == distance
+
+
+def test_edit_distance_stops_past_its_limit():
+    assert edit_distance("yoshi", "batmobile", 1) == 2
+    assert edit_distance("kart", "koenigsegg", 2) == 3
+
+
+@pytest.fixture
+def table():
+    return listing("Hot Wheels Mario Kart Yoshi", "Hot Wheels Yoshimitsu Racer", "Hot Wheels Yoshy Custom",
+                   "Hot Wheels Twin Mill", "Hot Wheels Lamborghini Countach Red", sold_out={0})
+
+
+@pytest.fixture
+def index(table):
+    index = TitleIndex()
+    index.add_listing("400001", table)
+    return index
+
+
+def test_exact_beats_prefix_beats_typo_and_stock_breaks_ties(index, table):
+    assert titles(table, index.search("400001", "yoshi", table)) == [
+        "Hot Wheels Mario Kart Yoshi", "Hot Wheels Yoshimitsu Racer", "Hot Wheels Yoshy Custom"]
+    # Same score: in stock first, then shorter titles
+    assert titles(table, index.search("400001", "hot wheels", table, limit=3)) == [
+        "Hot Wheels Twin Mill", "Hot Wheels Yoshy Custom", "Hot Wheels Yoshimitsu Racer"]
+
+
+def test_every_query_word_must_match(index, table):
+    assert titles(table, index.search("400001", "lamborgini countach", table)) == [
+        "Hot Wheels Lamborghini Countach Red"]
+    assert index.search("400001", "lamborghini yoshi", table) == []
+    assert index.search("400001", "zzzz", table) == [] and index.search("400001", "", table) == []
+    assert index.search("110001", "yoshi", table) == []  # that pincode's listing isn't cached
+
+
+def test_pincodes_only_see_their_own_listing(index, table):
+    delhi = listing("Hot Wheels Bone Shaker", "Hot Wheels Twin Mill")
+    index.add_listing("110001", delhi)
+    assert titles(delhi, index.search("110001", "twin mill", delhi)) == ["Hot Wheels Twin Mill"]
+    assert index.search("110001", "yoshi", delhi) == []
+    assert index.search("400001", "bone shaker", table) == []
+
+
+def test_refresh_drops_titles_no_listing_holds_any_more(index, table):
+    index.add_listing("110001", listing("Hot Wheels Twin Mill"))
+    refreshed = listing("Hot Wheels Twin Mill", "Hot Wheels Deora II")
+    index.add_listing("400001", refreshed)
+    assert len(index) == 2
+    assert index.search("400001", "yoshi", refreshed) == []
+    assert not any(word in index.postings for word in ("yoshi", "yoshimitsu", "lamborghini"))
+    assert not any("yoshi" in ws for ws in index.grams.values())
+    # Still listed for Delhi, so still indexed there
+    assert index.search("110001", "twin", None) == [0]
+    # Dropped ids are reused rather than growing the index
+    slots = len(index.titles)
+    index.add_listing("560001", listing("Hot Wheels Bone Shaker", "Hot Wheels Batmobile"))
+    assert len(index.titles) == slots and len(index) == 4
+    assert index.search("560001", "batmobil", None) == [1]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the hash ring, worker leases and shared stock state in sharding.py
+"""
+
+import pytest
+
+import monitor
+import sharding
+from sharding import HashRing, ShardStore, ShardWorker
+
+KEYS = [f"{pid}_400001" for pid in range(1000, 1500)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sharding.time, "time", lambda: now[0])
+    monkeypatch.setattr(sharding.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ShardStore(str(tmp_path / "shards.db"))
+
+
+def test_ring_gives_every_key_one_owner_and_spreads_them():
+    ring = HashRing(["w1", "w2", "w3"])
+    owners = [ring.owner(key) for key in KEYS]
+    assert set(owners) == {"w1", "w2", "w3"}
+    assert min(owners.count(w) for w in ("w1", "w2", "w3")) > len(KEYS) / 6
+    assert owners == [HashRing(["w3", "w1", "w2"]).owner(key) for key in KEYS]
+    assert HashRing([]).owner(KEYS[0]) is None
+
+
+def test_ring_moves_only_the_departed_workers_keys():
+    before = HashRing(["w1", "w2", "w3"])
+    after = HashRing(["w1", "w2"])
+    for key in KEYS:
+        if before.owner(key) != "w3":
+            assert after.owner(key) == before.owner(key)
+
+
+def test_lease_expires_unless_renewed(store, clock):
+    store.heartbeat("w1", 60)
+    store.heartbeat("w2", 60)
+    clock[0] += 30
+    store.heartbeat("w1", 60)
+    assert store.live_workers() == ["w1", "w2"]
+    clock[0] += 31
+    assert store.live_workers() == ["w1"]
+    store.release("w1")
+    assert store.live_workers() == []
+
+
+def test_shards_hand_over_when_a_worker_stops_or_dies(store, clock):
+    a, b, c = (ShardWorker(store, w, lease_seconds=60) for w in ("a", "b", "c"))
+    for worker in (a, b, c):
+        worker.refresh()
+    a.refresh()
+    b.refresh()
+    assert all([a.owns(k), b.owns(k), c.owns(k)].count(True) == 1 for k in KEYS)
+
+    b.stop()  # clean shutdown: gone at the next refresh
+    clock[0] += 21
+    assert all(a.owns(k) or c.owns(k) for k in KEYS)
+    assert a.workers == ["a", "c"]
+
+    clock[0] += 61  # c stopped renewing: its lease runs out
+    assert all(a.owns(k) for k in KEYS)
+    assert a.workers == ["a"]
+
+
+def test_swap_returns_the_previous_record_once(store):
+    assert store.swap("k", {"in_stock": True}) == {}
+    assert store.swap("k", {"in_stock": False}) == {"in_stock": True}
+    assert store.get("k") == {"in_stock": False}
+
+
+def test_swap_falls_back_to_the_legacy_key(store):
+    store.import_state({"prod1_400001": {"in_stock": True, "checks": 4}})
+    assert store.swap("1234_400001", {"in_stock": True}, legacy_key="prod1_400001") == {"in_stock": True, "checks": 4}
+    assert store.swap("1234_400001", {"in_stock": False}, legacy_key="prod1_400001") == {"in_stock": True}
+
+
+def test_sharded_run_does_not_realert_a_product_in_stock_under_its_legacy_key(store):
+    store.import_state({"prod1_400001": {"in_stock": True, "checks": 4}})
+    product = {"id": "prod1", "title": "Bone Shaker", "url": "https://www.firstcry.com/p/1234/product-detail"}
+    alerts = []
+    result = monitor.record_check(store, (("1234", "400001"), product, ["42"]), True,
+                                  lambda *args: alerts.append(args))
+    assert result["in_stock"] and not alerts
+    assert store.get("1234_400001")["checks"] == 5
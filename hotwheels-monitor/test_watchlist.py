@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test canonical product keys, the subscription index and subscribe() in watchlist.py
+"""
+
+from watchlist import SubscriptionIndex, canonical_key, find_entry, subscribe
+
+URL = "https://www.firstcry.com/hot-wheels/twin-mill/10001/product-detail"
+
+
+def entry(url=URL, pincode="400001", **fields):
+    return dict({"id": "prod1", "title": "Twin Mill", "url": url, "pincode": pincode}, **fields)
+
+
+def test_canonical_key_ignores_query_tracking_and_slug():
+    for url in (URL, URL + "?ref2=q_ard_hotwheels&utm_source=x", URL + "/#reviews", URL.replace("twin-mill", "tm"),
+                "http://firstcry.com/hot-wheels/twin-mill/10001"):
+        assert canonical_key(url) == "10001"
+    assert canonical_key("https://www.FirstCry.com/Some/Page/?x=1") == "firstcry.com/some/page"
+
+
+def test_duplicate_entries_merge_their_subscribers_once_per_pair():
+    index = SubscriptionIndex.from_products([
+        entry(subscribers=["1", "2"]),
+        entry(URL + "?ref=share", subscribers=[2, "3"]),
+        entry(pincode="110001", subscribers=["2"]),
+    ])
+    assert [(pair, subscribers) for pair, _, subscribers in index.pairs()] == [
+        (("10001", "400001"), ["1", "2", "3"]),
+        (("10001", "110001"), ["2"]),
+    ]
+    assert len(index) == 2
+
+
+def test_entries_without_subscribers_alert_the_owner():
+    index = SubscriptionIndex.from_products([entry(), entry(pincode="110001", subscribers=["5"])], default_chat=99)
+    assert [subscribers for _, _, subscribers in index.pairs()] == [["99"], ["5"]]
+    assert index.for_chat("99") == [entry()]
+    assert index.for_chat(5) == [entry(pincode="110001", subscribers=["5"])]
+    assert next(SubscriptionIndex.from_products([entry()]).pairs())[2] == []
+
+
+def test_pairs_for_finds_one_products_pincodes():
+    index = SubscriptionIndex.from_products([entry(), entry(URL.replace("10001", "10002")), entry(pincode="110001")])
+    assert [pair for pair, _, _ in index.pairs_for(URL + "?ref=x")] == [("10001", "400001"), ("10001", "110001")]
+    assert [pair for pair, _, _ in index.pairs_for(URL, 110001)] == [("10001", "110001")]
+    assert list(index.pairs_for(URL, "560001")) == [] and list(index.pairs_for(URL.replace("10001", "10003"))) == []
+
+
+def test_subscribe_creates_then_extends_an_entry():
+    products = []
+    product = {"title": "Twin Mill", "url": URL, "image_url": "https://cdn.fcglcdn.com/10001.jpg"}
+    assert subscribe(products, product, "400001", 7)
+    assert products == [dict(entry(subscribers=["7"]), image_url=product["image_url"])]
+    assert not subscribe(products, dict(product, url=URL + "?ref=x"), "400001", "7")
+    assert subscribe(products, product, "400001", "8")
+    assert products[0]["subscribers"] == ["7", "8"]
+    assert find_entry(products, URL + "#x", 400001) is products[0]
+
+
+def test_subscribing_to_an_owner_only_entry_keeps_the_owner():
+    products = [entry()]
+    assert subscribe(products, {"title": "Twin Mill", "url": URL}, "400001", "7", default_chat="99")
+    assert products[0]["subscribers"] == ["99", "7"]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite watchlist store: YAML round trip, ids and concurrent subscriptions
+"""
+
+import threading
+
+import pytest
+import yaml
+
+import monitor
+from watchstore import WatchlistStore, open_store
+
+PRODUCTS = [
+    {"id": "prod1", "title": "Bone Shaker", "url": "https://www.firstcry.com/hot-wheels/a/10001/product-detail",
+     "pincode": "400001"},
+    {"id": "prod7", "title": "Twin Mill", "url": "https://www.firstcry.com/hot-wheels/b/10002/product-detail",
+     "pincode": "400001", "subscribers": ["42", "7"], "note": "kept as extra"},
+    {"title": "Deora", "url": "https://www.firstcry.com/hot-wheels/c/10003/product-detail", "pincode": "110001",
+     "image_url": "https://cdn.fcglcdn.com/10003.jpg"},
+]
+
+
+def product(pid):
+    return {"title": f"Car {pid}", "url": f"https://www.firstcry.com/hot-wheels/car/{pid}/product-detail"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return WatchlistStore(str(tmp_path / "watchlist.sqlite"))
+
+
+def test_import_export_round_trip(store):
+    assert store.import_products(PRODUCTS) == 3
+    assert store.export_products() == PRODUCTS
+
+
+def test_duplicate_yaml_entries_merge_their_subscribers(store):
+    store.import_products(PRODUCTS + [dict(PRODUCTS[1], url=PRODUCTS[1]["url"] + "?ref=x", subscribers=["99"])])
+    assert len(store) == 3
+    assert store.find(PRODUCTS[1]["url"], "400001")["subscribers"] == ["42", "7", "99"]
+
+
+def test_new_ids_are_never_reused_after_a_removal(store):
+    store.import_products(PRODUCTS)
+    store.subscribe(product(20001), "400001", "5")
+    assert store.find(product(20001)["url"], "400001")["id"] == "prod8"  # after the imported prod7
+    store.remove(product(20001)["url"], "400001")
+    store.subscribe(product(20002), "400001", "5")
+    store.add(dict(product(20003), pincode="400001"), new_id=True)
+    ids = [entry.get("id") for entry in store.entries()]
+    assert ids == ["prod1", "prod7", None, "prod9", "prod10"]
+
+
+def test_menu_add_after_a_remove_gets_a_fresh_id(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open(monitor.CONFIG_FILE, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"products": [], "watchlist_db": str(tmp_path / "watchlist.sqlite")}, f)
+    answers = iter(["1", "Car 1", product(30001)["url"], "400001",
+                    "1", "Car 2", product(30002)["url"], "400001",
+                    "2", "1",
+                    "1", "Car 3", product(30003)["url"], "400001",
+                    "5"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monitor.menu()
+    store = open_store(monitor.load_yaml())
+    assert [(entry["title"], entry["id"]) for entry in store.entries()] == [("Car 2", "prod2"), ("Car 3", "prod3")]
+
+
+
+def test_id_counter_survives_reopening(store):
+    store.subscribe(product(20001), "400001", "5")
+    store.subscribe(product(20002), "400001", "5")
+    store.remove(product(20002)["url"], "400001")
+    reopened = WatchlistStore(store.path)
+    reopened.subscribe(product(20003), "400001", "5")
+    assert [e["id"] for e in reopened.entries()] == ["prod1", "prod3"]
+
+
+def test_concurrent_subscriptions_are_not_lost(store):
+    start = threading.Barrier(8)
+
+    def subscribe(chat):
+        start.wait()
+        for pid in range(20001, 20011):
+            store.subscribe(product(pid), "400001", str(chat))
+
+    threads = [threading.Thread(target=subscribe, args=(chat,)) for chat in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    entries = list(store.entries())
+    assert len(entries) == 10
+    assert all(sorted(e["subscribers"]) == [str(chat) for chat in range(8)] for e in entries)
+    assert len({e["id"] for e in entries}) == 10
+    assert len(store.for_chat("3")) == 10
+
+
+def test_remove_titled_ignores_case_and_drops_subscribers(store):
+    store.import_products(PRODUCTS)
+    assert store.remove_titled("twin mill") == 1
+    assert store.for_chat("42") == [] and len(store) == 2
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test serviceability zone learning, sharing and re-probing in zones.py
+"""
+
+import pytest
+
+from zones import MIN_AGREEMENT, REPROBE_EVERY, ZoneMap
+
+PRODUCTS = [str(10001 + n) for n in range(8)]
+MUMBAI = ["400001", "400002", "400003"]
+DELHI = ["110001"]
+
+
+def watchlist(pincodes):
+    return [((product, pincode), {"title": product, "url": product, "pincode": pincode}, [])
+            for product in PRODUCTS for pincode in pincodes]
+
+
+def by_city(product, pincode):
+    """In stock in Mumbai for odd products, in Delhi for even ones"""
+    return (int(product) % 2 == 1) == (pincode in MUMBAI)
+
+
+def run_cycle(zones, items, truth=by_city, failing=()):
+    """One cycle: the (product, pincode) pairs fetched and every verdict handed out"""
+    to_check, followers = zones.plan(items)
+    checks = [(item, None if item[0] in failing else truth(*item[0])) for item in to_check]
+    verdicts = {item[0]: in_stock for item, in_stock in zones.propagate(checks, followers)}
+    zones.learn()
+    return [item[0] for item in to_check], verdicts
+
+
+@pytest.fixture
+def zones(tmp_path):
+    return ZoneMap(str(tmp_path / "zones.json"))
+
+
+def learned(zones, items, truth=by_city):
+    for _ in range(MIN_AGREEMENT):
+        fetched, _ = run_cycle(zones, items, truth)
+        assert len(fetched) == len(items)  # nothing is shared before a zone is trusted
+
+
+def test_agreeing_pincodes_form_a_zone_and_share_verdicts(zones):
+    items = watchlist(MUMBAI + DELHI)
+    learned(zones, items)
+    assert zones.zones(MUMBAI + DELHI) == {"400001": "400001", "400002": "400001", "400003": "400001",
+                                           "110001": "110001"}
+    fetched_total = 0
+    for _ in range(REPROBE_EVERY):
+        fetched, verdicts = run_cycle(zones, items)
+        fetched_total += len(fetched)
+        assert verdicts == {pair: by_city(*pair) for pair, _, _ in items}
+    # Leaders every cycle, and each follower once per rotation
+    per_rotation = len(PRODUCTS) * (REPROBE_EVERY * 2 + len(MUMBAI) - 1)
+    assert fetched_total == per_rotation
+    assert zones.totals["mispredictions"] == 0
+
+
+def test_pincodes_that_disagree_are_never_zoned(zones):
+    items = watchlist(MUMBAI + DELHI)
+    for _ in range(MIN_AGREEMENT * 3):
+        fetched, _ = run_cycle(zones, items)
+    assert zones.zones(["400001", "110001"]) == {"400001": "400001", "110001": "110001"}
+    assert sum(pincode == "110001" for _, pincode in fetched) == len(PRODUCTS)
+
+
+def test_a_split_pincode_is_caught_by_its_reprobe_and_checked_itself(zones):
+    items = watchlist(MUMBAI)
+    learned(zones, items)
+
+    def split(product, pincode):
+        # 400003 now ships from elsewhere: the opposite of the rest of Mumbai
+        return by_city(product, pincode) != (pincode == "400003")
+
+    for _ in range(REPROBE_EVERY):
+        run_cycle(zones, items, split)
+    assert zones.totals["mispredictions"] >= 1
+    assert zones.zones(MUMBAI)["400003"] == "400003"
+
+    # Out of the zone: checked every cycle, and it needs twice the agreement to rejoin
+    for _ in range(MIN_AGREEMENT * 2 - 1):
+        fetched, verdicts = run_cycle(zones, items, by_city)
+        assert all(("400003" == p) <= ((k, p) in fetched) for k, p in verdicts)
+        assert zones.zones(MUMBAI)["400003"] == "400003"
+    run_cycle(zones, items, by_city)
+    assert zones.zones(MUMBAI)["400003"] == "400001"
+
+
+def test_a_failed_leader_check_shares_nothing(zones):
+    items = watchlist(MUMBAI)
+    learned(zones, items)
+    leader = (PRODUCTS[0], "400001")
+    fetched, verdicts = run_cycle(zones, items, failing={leader})
+    assert verdicts[leader] is None
+    followers = [(PRODUCTS[0], p) for p in MUMBAI[1:]]
+    assert all(pair in fetched or pair not in verdicts for pair in followers)
+
+
+def test_learned_zones_survive_save_and_load(zones):
+    items = watchlist(MUMBAI + DELHI)
+    learned(zones, items)
+    zones.save()
+    loaded = ZoneMap.load(zones.path)
+    assert loaded.zones(MUMBAI + DELHI) == zones.zones(MUMBAI + DELHI)
+    assert loaded.cycle == MIN_AGREEMENT and loaded.totals == zones.totals
@@ -0,0 +1,106 @@
+"""
+Watchlist helpers
+Canonical product keys and the (product, pincode) -> subscribers index
+"""
+
+import re
+
+# FirstCry product URLs end in the numeric product id, optionally followed by /product-detail
+PRODUCT_ID_RE = re.compile(r"/(\d{5,})(?:/product-detail)?/?(?:[?#].*)?$")
+
+
+def canonical_key(url):
+    """Stable identity for a product URL: FirstCry's numeric id, else the normalised URL"""
+    url = (url or "").strip()
+    match = PRODUCT_ID_RE.search(url)
+    if match:
+        return match.group(1)
+    return re.sub(r"^https?://(www\.)?", "", url.split("?")[0].split("#")[0]).rstrip("/").lower()
+
+
+def entry_subscribers(entry, default_chat=None):
+    """Chat ids alerted for a watchlist entry; entries without subscribers go to the owner chat"""
+    subscribers = [str(s) for s in entry.get("subscribers") or []]
+    if not subscribers and default_chat:
+        subscribers = [str(default_chat)]
+    return subscribers
+
+
+class SubscriptionIndex:
+    """Inverted index from canonical (product, pincode) to subscriber chat ids"""
+
+    def __init__(self, default_chat=None):
+        self.default_chat = str(default_chat) if default_chat else None
+        self.entries = {}
+        self.subscribers = {}
+        self.pincodes = {}  # product key -> its pincodes, in the order they were added
+
+    @classmethod
+    def from_products(cls, products, default_chat=None):
+        index = cls(default_chat)
+        for entry in products:
+            index.add(entry)
+        return index
+
+    def add(self, entry):
+        """Index a watchlist entry; duplicates of a known pair only add subscribers"""
+        pair = (canonical_key(entry.get("url")), str(entry.get("pincode")))
+        self.entries.setdefault(pair, entry)
+        self.pincodes.setdefault(pair[0], {})[pair[1]] = None
+        chats = self.subscribers.setdefault(pair, {})
+        for chat_id in entry_subscribers(entry, self.default_chat):
+            chats[chat_id] = None  # dict keeps subscription order
+        return pair
+
+    def pairs(self):
+        """Yield (pair, representative entry, subscriber list) once per unique pair"""
+        for pair, entry in self.entries.items():
+            yield pair, entry, list(self.subscribers[pair])
+
+    def pairs_for(self, url, pincode=None):
+        """Like pairs(), for one product at every pincode it is watched at (or only `pincode`)"""
+        key = canonical_key(url)
+        pincodes = self.pincodes.get(key, {})
+        for at in (pincodes if pincode is None else [str(pincode)] if str(pincode) in pincodes else []):
+            yield (key, at), self.entries[(key, at)], list(self.subscribers[(key, at)])
+
+    def for_chat(self, chat_id):
+        """Entries whose alerts reach the given chat"""
+        chat_id = str(chat_id)
+        return [self.entries[pair] for pair, chats in self.subscribers.items() if chat_id in chats]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def find_entry(products, url, pincode):
+    """Watchlist entry for the same canonical product and pincode, if any"""
+    key, pincode = canonical_key(url), str(pincode)
+    for entry in products:
+        if str(entry.get("pincode")) == pincode and canonical_key(entry.get("url")) == key:
+            return entry
+    return None
+
+
+def subscribe(products, product, pincode, chat_id, default_chat=None):
+    """Add chat_id to the entry for (product, pincode), creating it if needed; False if already subscribed"""
+    chat_id = str(chat_id)
+    entry = find_entry(products, product["url"], pincode)
+    if entry is None:
+        products.append({
+            "id": f"prod{len(products) + 1}",
+            "title": product["title"],
+            "url": product["url"],
+            "pincode": pincode,
+            "subscribers": [chat_id],
+        })
+        if product.get("image_url"):
+            products[-1]["image_url"] = product["image_url"]  # alerts go out with the product photo
+        return True
+    # Owner-only entries keep alerting the owner once someone else subscribes
+    entry["subscribers"] = entry_subscribers(entry, default_chat)
+    subscribers = entry["subscribers"]
+    if chat_id in [str(s) for s in subscribers]:
+        return False
+    subscribers.append(chat_id)
+    return True
@@ -0,0 +1,315 @@
+"""
+SQLite watchlist store
+An optional home for the watchlist once config.yaml's products list gets
+large: entries keyed by canonical (product, pincode), subscribers in their own
+indexed table, add/remove/subscribe as single transactions instead of
+rewriting the file, and cursor-paged iteration for the monitor. WAL mode lets
+the monitor read while the bot writes. Set `watchlist_db:` in config.yaml to
+use it; the products list imports into an empty store and round-trips
+through export.
+
+    python watchstore.py import config.yaml watchlist.sqlite
+    python watchstore.py export watchlist.sqlite watchlist.yaml
+"""
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+
+from watchlist import canonical_key, entry_subscribers
+
+# Entries fetched per page while streaming
+PAGE_SIZE = 500
+# Entry fields with their own column; anything else in a YAML entry is kept as JSON
+COLUMNS = ("id", "title", "url", "pincode", "image_url")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    rowid INTEGER PRIMARY KEY,
+    product_key TEXT NOT NULL,
+    pincode TEXT NOT NULL,
+    id TEXT,
+    title TEXT,
+    url TEXT NOT NULL,
+    image_url TEXT,
+    extra TEXT,
+    UNIQUE (product_key, pincode)
+);
+CREATE TABLE IF NOT EXISTS subscribers (
+    entry INTEGER NOT NULL REFERENCES entries (rowid) ON DELETE CASCADE,
+    chat_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (entry, chat_id)
+);
+CREATE INDEX IF NOT EXISTS subscribers_chat ON subscribers (chat_id);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+# "prod<N>" ids the bot gives new entries
+ID_RE = re.compile(r"prod(\d+)$")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(cfg):
+    """The store named by cfg['watchlist_db'] (shared per path), or None for the YAML products list"""
+    path = (cfg or {}).get("watchlist_db")
+    if not path:
+        return None
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = WatchlistStore(path)
+            if cfg.get("products") and not len(store):
+                count = store.import_products(cfg["products"])
+                logging.info("Imported %d config.yaml products into %s", count, path)
+    return store
+
+
+class WatchlistStore:
+    """Watchlist entries and subscribers in SQLite, safe to share between threads and processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        self._transaction(self._seed_ids)
+
+    def _connect(self):
+        """This thread's connection; a forked child opens its own"""
+        db = getattr(self.local, "db", None)
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+
+    def _transaction(self, fn, *args):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db, *args)
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    # ---------- Reads ----------
+    def _entries(self, db, rows):
+        """YAML-shaped entry dicts for (rowid, id, title, url, pincode, image_url, extra) rows"""
+        rowids = [row[0] for row in rows]
+        subscribers = {}
+        if rowids:
+            marks = ",".join("?" * len(rowids))
+            for entry, chat_id in db.execute(f"SELECT entry, chat_id FROM subscribers WHERE entry IN ({marks}) "
+                                             "ORDER BY entry, position", rowids):
+                subscribers.setdefault(entry, []).append(chat_id)
+        entries = []
+        for rowid, *values, extra in rows:
+            entry = {name: value for name, value in zip(COLUMNS, values) if value is not None}
+            if rowid in subscribers:
+                entry["subscribers"] = subscribers[rowid]
+            if extra:
+                entry.update(json.loads(extra))
+            entries.append(entry)
+        return entries
+
+    def entries(self, page_size=PAGE_SIZE):
+        """Yield every entry in insertion order, one page of rows in memory at a time"""
+        db = self._connect()
+        last = 0
+        while True:
+            rows = db.execute(f"SELECT rowid, {', '.join(COLUMNS)}, extra FROM entries WHERE rowid > ? "
+                              "ORDER BY rowid LIMIT ?", (last, page_size)).fetchall()
+            if not rows:
+                return
+            yield from self._entries(db, rows)
+            last = rows[-1][0]
+
+    def pairs(self, default_chat=None, page_size=PAGE_SIZE):
+        """Yield (pair, entry, subscriber list) per watched pair, like SubscriptionIndex.pairs"""
+        for entry in self.entries(page_size):
+            yield ((canonical_key(entry["url"]), str(entry["pincode"])), entry,
+                   entry_subscribers(entry, default_chat))
+
+    def pairs_for(self, url, pincode=None, default_chat=None):
+        """Like pairs(), for one product at every pincode it is watched at (or only `pincode`)"""
+        query = f"SELECT rowid, {', '.join(COLUMNS)}, extra FROM entries WHERE product_key = ?"
+        args = [canonical_key(url)]
+        if pincode is not None:
+            query += " AND pincode = ?"
+            args.append(str(pincode))
+        db = self._connect()
+        for entry in self._entries(db, db.execute(query + " ORDER BY rowid", args).fetchall()):
+            yield (args[0], str(entry["pincode"])), entry, entry_subscribers(entry, default_chat)
+
+    def find(self, url, pincode):
+        """Entry for the same canonical product and pincode, if any"""
+        db = self._connect()
+        rows = db.execute(f"SELECT rowid, {', '.join(COLUMNS)}, extra FROM entries "
+                          "WHERE product_key = ? AND pincode = ?", (canonical_key(url), str(pincode))).fetchall()
+        return self._entries(db, rows)[0] if rows else None
+
+    def for_chat(self, chat_id, default_chat=None):
+        """Entries whose alerts reach the given chat (the owner also gets entries without subscribers)"""
+        chat_id = str(chat_id)
+        query = ("SELECT rowid, {columns}, extra FROM entries WHERE rowid IN "
+                 "(SELECT entry FROM subscribers WHERE chat_id = ?)")
+        if default_chat and str(default_chat) == chat_id:
+            query += " OR rowid NOT IN (SELECT entry FROM subscribers)"
+        db = self._connect()
+        return self._entries(db, db.execute(query.format(columns=", ".join(COLUMNS)) + " ORDER BY rowid",
+                                            (chat_id,)).fetchall())
+
+    # ---------- Writes ----------
+    def _seed_ids(self, db):
+        """Start the id counter past every rowid and prod<N> id in a store that predates it"""
+        if db.execute("SELECT 1 FROM counters WHERE name = 'next_id'").fetchone():
+            return
+        highest = db.execute("SELECT COALESCE(MAX(rowid), 0) FROM entries").fetchone()[0]
+        for (pid,) in db.execute("SELECT id FROM entries WHERE id GLOB 'prod[0-9]*'"):
+            match = ID_RE.match(pid)
+            if match:
+                highest = max(highest, int(match.group(1)))
+        db.execute("INSERT INTO counters VALUES ('next_id', ?)", (highest + 1,))
+
+    def _next_id(self, db):
+        """A prod<N> id never handed out before, even if entries were removed since"""
+        value = db.execute("SELECT value FROM counters WHERE name = 'next_id'").fetchone()[0]
+        db.execute("UPDATE counters SET value = ? WHERE name = 'next_id'", (value + 1,))
+        return f"prod{value}"
+
+    def _insert(self, db, entry):
+        extra = {k: v for k, v in entry.items() if k not in COLUMNS and k != "subscribers"}
+        cursor = db.execute(
+            "INSERT INTO entries (product_key, pincode, id, title, url, image_url, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (canonical_key(entry["url"]), str(entry["pincode"]), entry.get("id"), entry.get("title"), entry["url"],
+             entry.get("image_url"), json.dumps(extra) if extra else None))
+        match = ID_RE.match(str(entry.get("id") or ""))
+        if match:
+            # Imported ids are taken too
+            db.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_id'", (int(match.group(1)) + 1,))
+        return cursor.lastrowid
+
+    def _add_subscriber(self, db, rowid, chat_id):
+        """False if chat_id already subscribes to the entry"""
+        cursor = db.execute("INSERT OR IGNORE INTO subscribers SELECT ?, ?, COALESCE(MAX(position), 0) + 1 "
+                            "FROM subscribers WHERE entry = ?", (rowid, str(chat_id), rowid))
+        return cursor.rowcount > 0
+
+    def _subscribe(self, db, entry, chat_id, default_chat, new_id=False):
+        """Insert or merge one entry; chat_id is the bot user subscribing, None for YAML entries"""
+        chats = entry_subscribers(entry) + ([str(chat_id)] if chat_id else [])
+        row = db.execute("SELECT rowid FROM entries WHERE product_key = ? AND pincode = ?",
+                         (canonical_key(entry["url"]), str(entry["pincode"]))).fetchone()
+        if row is None:
+            if (chat_id or new_id) and not entry.get("id"):
+                entry = dict(entry, id=self._next_id(db))
+            rowid = self._insert(db, entry)
+            for chat in chats:
+                self._add_subscriber(db, rowid, chat)
+            return True
+        rowid = row[0]
+        if chat_id is None:
+            # Duplicate YAML entries alert everyone either of them would, as SubscriptionIndex merges them
+            chats = entry_subscribers(entry, default_chat)
+        # Owner-only entries keep alerting the owner once someone else subscribes
+        owner_only = db.execute("SELECT 1 FROM subscribers WHERE entry = ? LIMIT 1", (rowid,)).fetchone() is None
+        if owner_only and chats and default_chat:
+            self._add_subscriber(db, rowid, default_chat)
+        added = False
+        for chat in chats:
+            added = self._add_subscriber(db, rowid, chat) or added
+        return added
+
+    def subscribe(self, product, pincode, chat_id, default_chat=None):
+        """Add chat_id to the entry for (product, pincode), creating it if needed; False if already subscribed"""
+        entry = {"title": product["title"], "url": product["url"], "pincode": pincode}
+        if product.get("image_url"):
+            entry["image_url"] = product["image_url"]  # alerts go out with the product photo
+        return self._transaction(self._subscribe, entry, chat_id, default_chat)
+
+    def add(self, entry, default_chat=None, new_id=False):
+        """Add a YAML-shaped entry; a duplicate (product, pincode) only merges its subscribers
+
+        With new_id, an entry without an id gets the next prod<N>, as bot subscriptions do.
+        """
+        return self._transaction(self._subscribe, entry, None, default_chat, new_id)
+
+    def remove(self, url, pincode):
+        """Drop the entry for (product, pincode) with its subscribers; False if there was none"""
+        cursor = self._connect().execute("DELETE FROM entries WHERE product_key = ? AND pincode = ?",
+                                         (canonical_key(url), str(pincode)))
+        return cursor.rowcount > 0
+
+    def remove_titled(self, title):
+        """Drop every entry with this title (any case) and their subscribers; returns how many there were"""
+        cursor = self._connect().execute("DELETE FROM entries WHERE title = ? COLLATE NOCASE", (title,))
+        return cursor.rowcount
+
+    def import_products(self, products, default_chat=None, replace=False):
+        """Load a config.yaml products list in one transaction; returns the number of entries read"""
+        def load(db):
+            if replace:
+                db.execute("DELETE FROM entries")
+            count = 0
+            for entry in products or []:
+                if entry.get("url") and entry.get("pincode") is not None:
+                    self._subscribe(db, entry, None, default_chat)
+                    count += 1
+            return count
+        return self._transaction(load)
+
+    def export_products(self):
+        """The watchlist as a config.yaml products list"""
+        return list(self.entries())
+
+
+# ---------- CLI ----------
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Move the watchlist between config.yaml and a SQLite store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("import", help="Add a YAML file's products to the store")
+    load.add_argument("yaml_file")
+    load.add_argument("db")
+    load.add_argument("--replace", action="store_true", help="Empty the store first")
+    dump = sub.add_parser("export", help="Write the store as a YAML products list")
+    dump.add_argument("db")
+    dump.add_argument("yaml_file", nargs="?", help="Default: stdout")
+    args = parser.parse_args()
+
+    store = WatchlistStore(args.db)
+    if args.command == "import":
+        with open(args.yaml_file, encoding="utf-8") as f:
+            products = (yaml.safe_load(f) or {}).get("products") or []
+        count = store.import_products(products, os.getenv("TELEGRAM_CHAT_ID"), replace=args.replace)
+        print(f"✅ Imported {count} entries; {len(store)} (product, pincode) pairs in {args.db}")
+    else:
+        text = yaml.safe_dump({"products": store.export_products()}, sort_keys=False, allow_unicode=True)
+        if args.yaml_file:
+            with open(args.yaml_file, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"✅ Exported {len(store)} entries to {args.yaml_file}")
+        else:
+            sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
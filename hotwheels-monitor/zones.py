@@ -0,0 +1,186 @@
+"""
+Serviceability zones
+Pincodes delivered from the same fulfilment centre always get the same answer,
+so checking each of them is wasted requests. The zone map learns which watched
+pincodes agree from the monitor's own results: two pincodes that gave the same
+verdict for every product they share, several cycles in a row, are put in one
+zone. A cycle then checks one pincode per product and zone and hands its
+verdict to the others, while every member is still checked itself on a
+rotation; a member that disagrees with its zone (a misprediction) leaves it,
+and has to agree for twice as long before it is trusted again.
+"""
+
+import os
+import json
+import zlib
+import logging
+import itertools
+
+import metrics
+
+ZONES_FILE = "zones.json"
+# Cycles in a row two pincodes must agree on every shared product before they share a zone
+MIN_AGREEMENT = 3
+# Each zone member is checked itself once every this many cycles
+REPROBE_EVERY = 4
+# Cap on the doubling after splits: a pincode that split this often needs 3 * 2**6 cycles to rejoin
+MAX_SPLITS = 6
+
+
+def pair_key(a, b):
+    return f"{a}|{b}" if a < b else f"{b}|{a}"
+
+
+class ZoneMap:
+    """Learned pincode zones and the state of the current cycle, persisted as JSON"""
+
+    def __init__(self, path=ZONES_FILE):
+        self.path = path
+        self.cycle = 0
+        self.pairs = {}   # pair_key -> {"agreed": cycles in a row, "splits": n}
+        self.totals = {"checks": 0, "propagated": 0, "reprobes": 0, "mispredictions": 0}
+        self._reset()
+
+    def _reset(self):
+        self.verdicts = {}   # (product_key, pincode) -> in_stock, as fetched this cycle
+        self.probes = []     # (product_key, pincode, leader pincode, zone pincode)
+        self.propagated = 0
+        self.zone_of = {}
+
+    @classmethod
+    def load(cls, path=ZONES_FILE):
+        zones = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            zones.cycle = data.get("cycle", 0)
+            zones.pairs = data.get("pairs", {})
+            zones.totals.update(data.get("totals", {}))
+        return zones
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"cycle": self.cycle, "pairs": self.pairs, "totals": self.totals}, f)
+        os.replace(tmp, self.path)
+
+    # ---------- Zones ----------
+    def trusted(self, a, b):
+        record = self.pairs.get(pair_key(a, b))
+        return bool(record) and record["agreed"] >= MIN_AGREEMENT * 2 ** record["splits"]
+
+    def zones(self, pincodes):
+        """pincode -> the pincode its zone is named after (the lowest one in it)"""
+        heads, zone_of = [], {}
+        for pincode in sorted(set(pincodes)):
+            head = next((h for h in heads if self.trusted(pincode, h)), None)
+            if head is None:
+                heads.append(pincode)
+                head = pincode
+            zone_of[pincode] = head
+        return zone_of
+
+    def due(self, product_key, pincode):
+        """Whether this zone member is re-checked this cycle; spread evenly over the rotation"""
+        return (self.cycle + zlib.crc32(f"{product_key}_{pincode}".encode())) % REPROBE_EVERY == 0
+
+    # ---------- Cycle ----------
+    def plan(self, items):
+        """Split (pair, entry, subscribers) items into those to check and followers per leader pair
+
+        Per product, the first pincode of each zone leads; the other members follow it
+        unless they are due for a re-probe, in which case they are checked as well.
+        """
+        self._reset()
+        items = list(items)
+        zone_of = self.zone_of = self.zones(pincode for (_, pincode), _, _ in items)
+        groups = {}
+        for item in sorted(items, key=lambda item: item[0][1]):
+            product_key, pincode = item[0]
+            groups.setdefault((product_key, zone_of[pincode]), []).append(item)
+
+        skipped = set()
+        followers = {}
+        for (product_key, zone), members in groups.items():
+            leader = members[0][0]
+            for item in members[1:]:
+                pincode = item[0][1]
+                if self.due(product_key, pincode):
+                    self.probes.append((product_key, pincode, leader[1], zone))
+                else:
+                    followers.setdefault(leader, []).append(item)
+                    skipped.add(item[0])
+        return [item for item in items if item[0] not in skipped], followers
+
+    def propagate(self, checks, followers):
+        """Pass (item, in_stock) checks through, each leader's followed by its followers with the same verdict"""
+        for item, in_stock in checks:
+            self.verdicts[item[0]] = in_stock
+            yield item, in_stock
+            if in_stock is None:
+                continue  # nothing to share; the followers wait for the next cycle
+            for follower in followers.get(item[0], ()):
+                self.propagated += 1
+                yield follower, in_stock
+
+    def learn(self):
+        """Fold this cycle's fetched verdicts into the pair records and count mispredictions"""
+        mispredictions = 0
+        split = set()
+        for product_key, pincode, leader, zone in self.probes:
+            got, expected = self.verdicts.get((product_key, pincode)), self.verdicts.get((product_key, leader))
+            if got is None or expected is None or got == expected:
+                continue
+            mispredictions += 1
+            logging.info("Zone misprediction: %s at %s is %s, its zone said %s", product_key, pincode,
+                         "in stock" if got else "out of stock", "in stock" if expected else "out of stock")
+            if zone != pincode and pair_key(pincode, zone) not in split:
+                # One split per pair and cycle, however many products showed it
+                split.add(self._split(pincode, zone))
+
+        by_product = {}
+        for (product_key, pincode), in_stock in self.verdicts.items():
+            if in_stock is not None:
+                by_product.setdefault(product_key, {})[pincode] = in_stock
+        agreed = {}
+        for verdicts in by_product.values():
+            for a, b in itertools.combinations(sorted(verdicts), 2):
+                key = pair_key(a, b)
+                agreed[key] = agreed.get(key, True) and verdicts[a] == verdicts[b]
+        for key, same in agreed.items():
+            if key in split:
+                continue
+            record = self.pairs.setdefault(key, {"agreed": 0, "splits": 0})
+            if not same:
+                if self.trusted(*key.split("|")):
+                    record["splits"] = min(MAX_SPLITS, record["splits"] + 1)
+                record["agreed"] = 0
+            else:
+                record["agreed"] += 1
+        # Pincodes that never agreed carry nothing worth keeping
+        self.pairs = {key: r for key, r in self.pairs.items() if r["agreed"] or r["splits"]}
+
+        for name, value in (("checks", len(self.verdicts)), ("propagated", self.propagated),
+                            ("reprobes", len(self.probes)), ("mispredictions", mispredictions)):
+            self.totals[name] += value
+        metrics.CYCLE_ZONE_PROPAGATED.set(self.propagated)
+        metrics.ZONE_REPROBES.inc(len(self.probes))
+        metrics.ZONE_MISPREDICTIONS.inc(mispredictions)
+        self.cycle += 1
+        return mispredictions
+
+    def _split(self, pincode, zone):
+        key = pair_key(pincode, zone)
+        record = self.pairs.setdefault(key, {"agreed": 0, "splits": 0})
+        record["splits"] = min(MAX_SPLITS, record["splits"] + 1)
+        record["agreed"] = 0
+        return key
+
+    def summary(self):
+        zone_of = self.zone_of
+        t = self.totals
+        saved = t["propagated"] / ((t["checks"] + t["propagated"]) or 1)
+        missed = t["mispredictions"] / (t["reprobes"] or 1)
+        return (f"{len(zone_of)} pincodes in {len(set(zone_of.values()))} zones; {self.propagated} checks "
+                f"answered by a zone this cycle, {saved:.0%} of requests saved and {missed:.1%} of "
+                f"{t['reprobes']} re-probes mispredicted so far")